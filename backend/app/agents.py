@@ -1,61 +1,28 @@
-from langchain.prompts import ChatPromptTemplate
 from langchain.tools import Tool
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
 from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import json
 import logging
+import re
+import time
 import aiohttp
+from .llm_client import LLMClient
+from .history import ChatHistoryManager, estimate_tokens
+from .executors import run_blocking
+from .metrics import timed
+from .docs_index import get_docs_index, loaded_docs_index, docs_vehicle
+from .flight_phases import scope_from_question
 
 logger = logging.getLogger(__name__)
 
-# Decision Agent Prompt
-DECISION_PROMPT = """You are a decision-making agent in a UAV flight-log assistant. Your job is to evaluate the response from the Primary LLM and decide if further action is needed.
-
-You have access to the following tools:
-
-{tools}
-
-Tool names: {tool_names}
-
-You will be given:
-1. The original user question
-2. The response from the Primary LLM
-
-Your task is to output a routing decision in the following format:
-```
-route: <embedding | tool:retrieve_snippets | tool:detect_anomalies | chat>
-reason: <brief justification>
-```
-
-Decision Guidelines:
-1. Use `embedding` if:
-   - The answer is confident and complete
-   - All information comes from embedded data
-   - No anomalies are mentioned or questions dont need deep analysis
-
-2. Use `tool:retrieve_snippets` if:
-   - The answer is vague or hesitant
-   - Specific timestamps or events are requested
-   - More detailed data is needed
-
-3. Use `tool:detect_anomalies` if:
-   - The answer mentions potential issues
-   - The question is about problems or errors
-   - Anomalies are suspected but not confirmed
-
-IMPORTANT: Your response must be in the exact format shown above, with the route and reason on separate lines.
-
-User question: {question}
-Primary LLM response: {primary_response}
-
-{agent_scratchpad}"""
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
 
 SYSTEM_PROMPT = """You are FlightDataAgent, an AI assistant for UAV flight-log analysis. Your behavior depends on whether a flight log is loaded:
 
 WITHOUT FLIGHT LOG:
 - Chat normally about general topics and answer questions about platform and general UAV topics
-- You can search the official ArduPilot Plane log message documentation (https://ardupilot.org/plane/docs/logmessages.html) to help answer questions about log messages or UAV telemetry fields.
+- You can search the ArduPilot log message documentation (Plane, Copter, Rover and Tracker) by writing search_ardupilot_docs(<query>) to help answer questions about log messages or UAV telemetry fields.
 - If asked about flight data, explain that you need a flight log to be loaded first
 - Be helpful and friendly, but clear about your limitations
 
@@ -75,391 +42,413 @@ Remember: Be confident in answering from your embedded knowledge. Use tools only
 
 Current fileKey: {fileKey}"""
 
-async def search_ardupilot_docs(query: str) -> dict:
-    """Search the ArduPilot Plane log message documentation for relevant info."""
-    # For now, use web_search tool (could be replaced with a custom scraper or offline index)
-    from . import functions
-    results = await functions.web_search(
-        search_term=f"site:https://ardupilot.org/plane/docs/logmessages.html {query}",
-        explanation="Search ArduPilot Plane log message documentation for relevant info."
-    )
-    return results
-
-class ResponseEvaluator:
-    """Evaluates LLM responses and decides on tool usage."""
-    def __init__(self, llm: ChatGoogleGenerativeAI):
-        self.llm = llm
-        self.prompt = ChatPromptTemplate.from_template(DECISION_PROMPT)
-    
-    async def evaluate(self, question: str, primary_response: str, tools: List[Tool]) -> Tuple[str, str]:
-        try:
-            response = await self.llm.ainvoke(
-                self.prompt.format(
-                    question=question,
-                    primary_response=primary_response,
-                    tools="\n".join([f"{tool.name}: {tool.description}" for tool in tools]),
-                    tool_names=", ".join([tool.name for tool in tools]),
-                    agent_scratchpad=""
-                )
-            )
-            content = response.content.lower()
-            if "route:" in content:
-                route = content.split("route:")[1].split("\n")[0].strip()
-                reason = content.split("reason:")[1].strip() if "reason:" in content else ""
-                return route, reason
-            else:
-                logger.warning("Unexpected response format from evaluator")
-                return "embedding", "Defaulting to embedding response"
-        except Exception as e:
-            logger.error(f"Error in response evaluation: {e}", exc_info=True)
-            return "embedding", "Error in evaluation, defaulting to embedding response"
-
-class FlightLogAgents:
-    def __init__(self, api_key: str):
-        self.decision_llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0,
-            google_api_key=api_key
-        )
-        self.tools = [
-            Tool(
-                name="retrieve_snippets",
-                func=self.retrieve_snippets,
-                description="Fetch top-k relevant MAVLink snippets for factual questions."
-            ),
-            Tool(
-                name="detect_anomalies",
-                func=self.detect_anomalies,
-                description="Run server-side checks and return any flagged events."
-            )
-        ]
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            input_key="input",
-            output_key="output",
-            return_messages=True
-        )
-        self.evaluator = ResponseEvaluator(self.decision_llm)
-    
-    def retrieve_snippets(self, fileKey: str, question: str, k: int = 3) -> Dict[str, Any]:
-        from .tools import retrieve_snippets
-        return retrieve_snippets(fileKey, question, k)
-    
-    def detect_anomalies(self, fileKey: str) -> Dict[str, Any]:
-        from .tools import detect_anomalies
-        return detect_anomalies(fileKey)
-    
-    async def process_question(self, question: str, primary_response: str, fileKey: str = None) -> str:
+# Per-stage latency budgets (seconds) for a chat turn
+STAGE_TIMEOUTS = {
+    "draft": 30.0,
+    "tool": 10.0,
+    "synthesis": 30.0,
+    "summary": 20.0,
+}
+
+ANSWER_GUIDELINES = """Provide a clear, concise response that:
+1. Directly answers the question
+2. Uses simple, clear language
+3. Keeps the response under 300 words
+4. Maintains a helpful, friendly tone
+5. Focuses on the most relevant information
+
+IMPORTANT:
+- NEVER output raw tool code or commands
+- NEVER mention that you're using tools
+- NEVER show raw data or technical details
+- ALWAYS present information in a natural, conversational way
+- ALWAYS use consistent units (convert to standard units)
+- ALWAYS validate numbers before presenting them
+- If there are issues, explain them briefly without being overly concerned
+- Format the response as if explaining to a colleague"""
+
+# Single call that both answers and picks a route, replacing the separate
+# primary, evaluator and refinement calls
+ROUTED_ANSWER_PROMPT = """{conversation}
+Answer the last user message, then decide whether the answer needs a deeper look at the flight log.
+
+{guidelines}
+
+Route guidelines:
+- "answer" if your answer is confident and complete
+- "tool:retrieve_snippets" if specific timestamps or events are requested or more detailed data is needed
+- "tool:detect_anomalies" if the question is about problems, errors or anomalies
+- "tool:query_region" if the question is about where the vehicle was: distance from home, an area or coordinates
+
+Respond with a JSON object only, without code fences:
+{{"route": "<answer | tool:retrieve_snippets | tool:detect_anomalies | tool:query_region>", "answer": "<your answer for the user>"}}"""
+
+SNIPPET_ANSWER_PROMPT = """User question: {question}
+Raw data from flight log: {snippet}
+First validate this data: identify the message type (e.g., GLOBAL_POSITION_INT, VFR_HUD), the units of measurement, the timestamp and the actual values. Then answer the question from the validated values.
+
+{guidelines}"""
+
+TOOL_SYNTHESIS_PROMPT = """User question: {question}
+Initial analysis: {draft}
+Flight log data from {tool_name}: {tool_output}
+First validate this data: identify the message or anomaly types, units, timestamps, severity and actual values. Then answer the question from the validated data. If there are no issues, state that clearly.
+
+{guidelines}"""
+
+# Streaming answers skip the routing call, so the tool output is part of the one streamed prompt
+STREAMED_ANSWER_PROMPT = """{conversation}
+Flight log data that may help with the last user message:
+Relevant telemetry snippets: {snippets}
+Flagged anomalies: {anomalies}
+Time spent inside the region named in the message: {regions}
+Use this data only where it is relevant, and validate units, timestamps and values before using them.
+
+{guidelines}"""
+
+# Answer prompt when the router (router.QueryRouter) has already picked the tool
+ROUTED_TOOL_PROMPT = """{conversation}
+Flight log data from {tool_name} for the last user message: {tool_output}
+First validate this data: identify the message or anomaly types, units, timestamps and actual values. Then answer from the validated data. If there are no issues, state that clearly.
+
+{guidelines}"""
+
+# Tool behind each router route; chat questions are answered without one. A facts
+# question reaches the LLM only when the facts table could not answer it.
+ROUTE_TOOLS = {
+    "facts": "retrieve_snippets",
+    "retrieval": "retrieve_snippets",
+    "anomaly": "detect_anomalies",
+    "region": "query_region",
+    "chat": None,
+}
+
+def parse_routed_answer(content: str) -> Tuple[str, str]:
+    """Parse the JSON reply of ROUTED_ANSWER_PROMPT into (route, answer).
+
+    Falls back to treating the whole reply as the answer if it is not valid JSON.
+    """
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        data = json.loads(text[start:end + 1])
+        route = str(data.get("route", "answer")).strip().lower()
+        answer = str(data.get("answer", "")).strip()
+        if answer:
+            return ("answer" if route == "embedding" else route), answer
+    except (ValueError, AttributeError):
+        pass
+    logger.warning("Unexpected routed answer format, using the raw response")
+    return "answer", content
+
+async def search_ardupilot_docs(query: str, vehicle_type: str = None, k: int = 5) -> dict:
+    """Search the bundled ArduPilot log message documentation (no network needed).
+
+    Args:
+        query: Question or log message/field name
+        vehicle_type: Vehicle type of the loaded log, selecting its doc set; None searches all
+        k: Number of entries to return
+    """
+    index = loaded_docs_index() or await run_blocking("cpu", get_docs_index)
+    results = await run_blocking("model", index.search, query, vehicle_type, k)
+    return {
+        "query": query,
+        "vehicle": docs_vehicle(vehicle_type) or "all",
+        "results": [{"message": r["message"], "field": r["field"], "description": r["text"], "url": r["url"]} for r in results]
+    }
+
+def format_docs(entries: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"- {e['text']}" for e in entries)
+
+class FlightLogAgentOrchestrator:
+    def __init__(self, api_key: str, llm=None):
         """
-        Evaluate the primary_response (already generated by the LLM in main.py) and decide whether to return it directly or use tools for deeper analysis.
+        Args:
+            api_key: Google API key for the Gemini model
+            llm: Chat model to use instead of Gemini (anything with ainvoke/astream)
         """
-        try:
-            # Step 1: Evaluate response
-            route, reason = await self.evaluator.evaluate(
-                question=question,
-                primary_response=primary_response,
-                tools=self.tools
+        if llm is None:
+            llm = ChatGoogleGenerativeAI(
+                model="gemini-2.0-flash",
+                temperature=0,
+                google_api_key=api_key
             )
-            logger.info(f"Evaluation result - Route: {route}, Reason: {reason}")
-            
-            # Step 2: Process decision
-            if route == "embedding":
-                logger.info("Using embedding response directly")
-                return primary_response
-            elif route.startswith("tool:"):
-                tool_name = route.split(":")[1]
-                logger.info(f"Executing tool: {tool_name}")
-                try:
-                    if tool_name == "retrieve_snippets":
-                        result = self.retrieve_snippets(fileKey, question)
-                        synthesis_prompt = (
-                            f"User question: {question}\n"
-                            f"Initial analysis: {primary_response}\n"
-                            f"(Used the tool 'retrieve_snippets' to do a deeper analysis.)\n"
-                            f"Tool output: {json.dumps(result, indent=2)}\n"
-                            "Provide a clear, final answer for the user, but do not mention the raw tool output."
-                        )
-                        # Synthesize final answer using decision_llm
-                        synthesis = await self.decision_llm.ainvoke(synthesis_prompt)
-                        return f"Used the tool 'retrieve_snippets' to do a deeper analysis.\n\n{synthesis.content}"
-                    elif tool_name == "detect_anomalies":
-                        anomalies = self.detect_anomalies(fileKey)
-                        analysis_prompt = (
-                            f"User question: {question}\n"
-                            f"Initial analysis: {primary_response}\n"
-                            f"(Used the tool 'detect_anomalies' to do a deeper analysis.)\n"
-                            f"Tool output: {json.dumps(anomalies, indent=2)}\n"
-                            "Provide a clear, final answer for the user, but do not mention the raw tool output."
-                        )
-                        analysis = await self.decision_llm.ainvoke(analysis_prompt)
-                        return f"Used the tool 'detect_anomalies' to do a deeper analysis.\n\n{analysis.content}"
-                    else:
-                        logger.error(f"Unknown tool requested: {tool_name}")
-                        return f"[Error: Unknown tool {tool_name}]"
-                except Exception as e:
-                    logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
-                    return f"[Error executing {tool_name}: {str(e)}]"
-            else:  # chat
-                logger.info("Using chat response")
-                return primary_response
-        except Exception as e:
-            logger.error(f"Error in multi-agent processing: {e}", exc_info=True)
-            return "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
-
-class FlightLogAgentOrchestrator:
-    def __init__(self, api_key: str):
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0,
-            google_api_key=api_key
-        )
+        # Shared concurrency limit, rate limit, retries and request coalescing
+        self.llm = LLMClient(llm)
         self.tools = [
             Tool(
                 name="retrieve_snippets",
                 func=self.retrieve_snippets,
+                coroutine=self.aretrieve_snippets,
                 description="Fetch top-k relevant MAVLink snippets for factual questions."
             ),
             Tool(
                 name="detect_anomalies",
                 func=self.detect_anomalies,
+                coroutine=self.adetect_anomalies,
                 description="Run server-side checks and return any flagged events."
+            ),
+            Tool(
+                name="query_region",
+                func=self.query_region,
+                coroutine=self.aquery_region,
+                description="Find when the vehicle was within a distance of home or of coordinates, or inside a box or polygon."
             )
         ]
-        self.evaluator = ResponseEvaluator(self.llm)
+        self.history = ChatHistoryManager(summarizer=lambda prompt: self._invoke(prompt, "summary"))
         self.general_tools = [
             Tool(
                 name="search_ardupilot_docs",
-                func=lambda query: search_ardupilot_docs(query),
-                description="Search the official ArduPilot Plane log message documentation for information about log messages, telemetry fields, or UAV data."
+                func=lambda query: get_docs_index().search(query),
+                coroutine=search_ardupilot_docs,
+                description="Search the ArduPilot log message documentation for information about log messages, telemetry fields, or UAV data."
             )
         ]
 
-    def retrieve_snippets(self, fileKey: str, question: str, k: int = 3) -> dict:
+    def retrieve_snippets(self, fileKey: str, question: str, k: int = 3, phase: Optional[str] = None) -> dict:
         from .tools import retrieve_snippets
-        return retrieve_snippets(fileKey, question, k)
+        return retrieve_snippets(fileKey, question, k, phase)
 
-    def detect_anomalies(self, fileKey: str) -> dict:
+    def detect_anomalies(self, fileKey: str, phase: Optional[str] = None) -> dict:
         from .tools import detect_anomalies
-        return detect_anomalies(fileKey)
+        return detect_anomalies(fileKey, phase)
+
+    def query_region(self, fileKey: str, question: str) -> dict:
+        from .tools import query_region
+        return query_region(fileKey, question)
+
+    async def aretrieve_snippets(self, fileKey: str, question: str, k: int = 3, phase: Optional[str] = None) -> dict:
+        return await run_blocking("model", self.retrieve_snippets, fileKey, question, k, phase)
+
+    async def adetect_anomalies(self, fileKey: str, phase: Optional[str] = None) -> dict:
+        return await run_blocking("io", self.detect_anomalies, fileKey, phase)
+
+    async def aquery_region(self, fileKey: str, question: str) -> dict:
+        return await run_blocking("cpu", self.query_region, fileKey, question)
 
-    async def answer_question(self, message: str, fileKey: str = None, chatHistory: list = None, embedding_snippet: str = None) -> str:
-        chatHistory = chatHistory or []
+    async def _invoke(self, prompt: str, stage: str) -> str:
+        """Call the LLM within the latency budget of a pipeline stage."""
+        with timed(f"agent.{stage}"):
+            response = await asyncio.wait_for(self.llm.ainvoke(prompt), STAGE_TIMEOUTS[stage])
+        return response.content if hasattr(response, 'content') else str(response)
+
+    async def _run_tool(self, tool_name: str, fileKey: str, message: str) -> Any:
+        # "during takeoff" / "while in AUTO" restricts the tools to that part of the flight
+        phase = scope_from_question(message)
+        if tool_name == "retrieve_snippets":
+            call = self.aretrieve_snippets(fileKey, message, phase=phase)
+        elif tool_name == "query_region":
+            call = self.aquery_region(fileKey, message)
+        else:
+            call = self.adetect_anomalies(fileKey, phase)
+        with timed(f"agent.tool.{tool_name}"):
+            return await asyncio.wait_for(call, STAGE_TIMEOUTS["tool"])
+
+    async def _routed_prompt(self, conversation: str, fileKey: str, message: str, route: str) -> Optional[str]:
+        """Prompt answering the message with the output of the route's tool, or None if the tool failed."""
+        tool_name = ROUTE_TOOLS.get(route)
+        if tool_name is None:
+            return conversation
+        try:
+            output = await self._run_tool(tool_name, fileKey, message)
+        except Exception as e:
+            logger.warning(f"Tool {tool_name} failed for the routed answer: {e!r}")
+            return None
+        if output is None or output == {}:
+            return None
+        return ROUTED_TOOL_PROMPT.format(
+            conversation=conversation,
+            tool_name=tool_name,
+            tool_output=json.dumps(output, indent=2),
+            guidelines=ANSWER_GUIDELINES
+        )
+
+    async def _conversation(self, message: str, fileKey: str = None, chatHistory: list = None, vehicle_type: str = None) -> str:
+        """Render the system prompt, compacted chat history and new message as one prompt.
+
+        Log messages or fields named in the question are looked up in the bundled
+        ArduPilot docs for the log's vehicle and added to the system prompt.
+        """
         system_prompt = SYSTEM_PROMPT.format(fileKey=fileKey if fileKey else "None")
+        # Until the startup build finishes, the keyword-only fallback is built off the event loop
+        index = loaded_docs_index() or await run_blocking("cpu", get_docs_index)
+        docs = index.name_matches(message, vehicle_type)
+        if docs:
+            system_prompt += f"\n\nArduPilot log message documentation:\n{format_docs(docs)}"
+        reserved = estimate_tokens(system_prompt) + estimate_tokens(message)
+        turns = await self.history.compact(chatHistory, reserved_tokens=reserved)
         history_msgs = [{"role": "system", "content": system_prompt}]
-        for turn in chatHistory:
+        for turn in turns:
             role = turn.get("role", "user")
             content = turn.get("content", "")
             history_msgs.append({"role": role, "content": content})
         history_msgs.append({"role": "user", "content": message})
+        prompt = "".join([f"{msg['role']}: {msg['content']}\n" for msg in history_msgs])
+        logger.info(f"Prompt history: {len(chatHistory or [])} turns -> {len(turns)}, ~{estimate_tokens(prompt)} tokens")
+        return prompt
+
+    async def answer_question(self, message: str, fileKey: str = None, chatHistory: list = None, embedding_snippet: str = None, vehicle_type: str = None, route: Dict[str, Any] = None) -> str:
+        """Answer a chat turn.
 
-        # If we have an embedding snippet, validate and refine it
+        route is the decision of router.QueryRouter; when it is confident, only that
+        route's tool runs and one LLM call writes the answer. Otherwise the LLM drafts
+        an answer and picks the route itself, while the tool of the router's guess is
+        prefetched; the prefetch is cancelled if the draft does not ask for that tool.
+        """
+
+        # If we have an embedding snippet, validate and answer from it in a single call
         if embedding_snippet:
-            # First, validate the data
-            validation_prompt = (
-                f"Raw data from flight log: {embedding_snippet}\n"
-                "Validate this data and extract key information:\n"
-                "1. What type of message is this? (e.g., GLOBAL_POSITION_INT, VFR_HUD)\n"
-                "2. What are the units of measurement?\n"
-                "3. What is the timestamp?\n"
-                "4. What are the actual values?\n"
-                "Format as JSON with keys: message_type, units, timestamp, values"
-            )
-            validation = await self.llm.ainvoke(validation_prompt)
-            
-            # Then, refine the response with validated data
-            refinement_prompt = (
-                f"User question: {message}\n"
-                f"Validated data: {validation.content}\n"
-                f"Raw data: {embedding_snippet}\n"
-                "Provide a clear, concise response that:\n"
-                "1. Directly answers the question\n"
-                "2. Uses simple, clear language\n"
-                "3. Keeps the response under 300 words\n"
-                "4. Maintains a helpful, friendly tone\n"
-                "5. Focuses on the most relevant information\n\n"
-                "IMPORTANT:\n"
-                "- NEVER output raw tool code or commands\n"
-                "- NEVER mention that you're using tools\n"
-                "- NEVER show raw data or technical details\n"
-                "- ALWAYS present information in a natural, conversational way\n"
-                "- ALWAYS use consistent units (convert to standard units)\n"
-                "- ALWAYS validate numbers before presenting them\n"
-                "- Format the response as if explaining to a colleague"
-            )
-            refined = await self.llm.ainvoke(refinement_prompt)
-            return refined.content if hasattr(refined, 'content') else str(refined)
+            try:
+                return await self._invoke(
+                    SNIPPET_ANSWER_PROMPT.format(question=message, snippet=embedding_snippet, guidelines=ANSWER_GUIDELINES),
+                    "synthesis"
+                )
+            except Exception as e:
+                logger.error(f"Error answering from embedding snippet: {e}", exc_info=True)
+                return FALLBACK_RESPONSE
 
         # If no fileKey, just chat and allow ArduPilot doc search tool
         if not fileKey:
-            prompt = "".join([f"{msg['role']}: {msg['content']}\n" for msg in history_msgs])
             try:
-                response = await self.llm.ainvoke(prompt)
-                content = response.content if hasattr(response, 'content') else str(response)
+                content = await self._invoke(await self._conversation(message, fileKey, chatHistory, vehicle_type), "draft")
                 if "search_ardupilot_docs" in content.lower():
-                    import re
                     m = re.search(r"search_ardupilot_docs\((.*?)\)", content, re.IGNORECASE)
-                    query = m.group(1) if m else message
-                    doc_results = await search_ardupilot_docs(query)
+                    query = m.group(1).strip("'\" ") if m else message
+                    doc_results = await search_ardupilot_docs(query, vehicle_type)
                     synthesis_prompt = (
                         f"User question: {message}\n"
                         f"ArduPilot doc search results: {doc_results}\n"
-                        "Provide a clear, concise response that:\n"
-                        "1. Directly answers the question\n"
-                        "2. Uses simple, clear language\n"
-                        "3. Keeps the response under 300 words\n"
-                        "4. Maintains a helpful, friendly tone\n"
-                        "5. Focuses on the most relevant information\n\n"
-                        "IMPORTANT:\n"
-                        "- NEVER output raw tool code or commands\n"
-                        "- NEVER mention that you're using tools\n"
-                        "- NEVER show raw data or technical details\n"
-                        "- ALWAYS present information in a natural, conversational way\n"
-                        "- Format the response as if explaining to a colleague"
+                        f"{ANSWER_GUIDELINES}"
                     )
-                    synthesis = await self.llm.ainvoke(synthesis_prompt)
-                    return synthesis.content if hasattr(synthesis, 'content') else str(synthesis)
+                    return await self._invoke(synthesis_prompt, "synthesis")
                 return content
             except Exception as e:
                 logger.error(f"Error in LLM chat (no flight log): {e}", exc_info=True)
                 return f"[Error communicating with LLM: {e}]"
 
-        # If fileKey is present, do LLM call and tool routing
+        # If fileKey is present, draft a routed answer while the likely tool runs concurrently
         try:
-            prompt = "".join([f"{msg['role']}: {msg['content']}\n" for msg in history_msgs])
-            response = await self.llm.ainvoke(prompt)
-            primary_response = response.content if hasattr(response, 'content') else str(response)
-            route, reason = await self.evaluator.evaluate(
+            started = time.perf_counter()
+            conversation = await self._conversation(message, fileKey, chatHistory, vehicle_type)
+            if route is not None and route.get("confident"):
+                prompt = await self._routed_prompt(conversation, fileKey, message, route["route"])
+                if prompt is not None:
+                    logger.info(f"Router picked {route['route']} (confidence {route['confidence']:.2f}), skipping LLM routing")
+                    return await self._invoke(prompt, "synthesis")
+            draft_prompt = ROUTED_ANSWER_PROMPT.format(conversation=conversation, guidelines=ANSWER_GUIDELINES)
+            tool_names = [tool.name for tool in self.tools]
+            # Only the tool the router guesses is prefetched; chat-like questions prefetch nothing
+            guess = ROUTE_TOOLS.get(route["route"]) if route is not None else None
+            prefetch = asyncio.ensure_future(self._run_tool(guess, fileKey, message)) if guess in tool_names else None
+            try:
+                route, answer = parse_routed_answer(await self._invoke(draft_prompt, "draft"))
+            except BaseException:
+                if prefetch is not None:
+                    prefetch.cancel()
+                raise
+            logger.info(f"Routed answer - Route: {route} ({time.perf_counter() - started:.2f}s)")
+
+            tool_name = route.split(":", 1)[1] if route.startswith("tool:") else None
+            if prefetch is not None and tool_name != guess:
+                prefetch.cancel()
+            if tool_name not in tool_names:
+                return answer
+
+            try:
+                output = await (prefetch if tool_name == guess else self._run_tool(tool_name, fileKey, message))
+            except Exception as e:
+                output = e
+            if output is None or isinstance(output, BaseException) or output == {}:
+                logger.warning(f"Tool {tool_name} unavailable ({output!r}), returning draft answer")
+                return answer
+            synthesis_prompt = TOOL_SYNTHESIS_PROMPT.format(
                 question=message,
-                primary_response=primary_response,
-                tools=self.tools
+                draft=answer,
+                tool_name=tool_name,
+                tool_output=json.dumps(output, indent=2),
+                guidelines=ANSWER_GUIDELINES
             )
-            logger.info(f"Evaluation result - Route: {route}, Reason: {reason}")
-            
-            if route == "embedding":
-                # Refine the embedding response with validation
-                refinement_prompt = (
-                    f"User question: {message}\n"
-                    f"Raw response: {primary_response}\n"
-                    "Provide a clear, concise response that:\n"
-                    "1. Directly answers the question\n"
-                    "2. Uses simple, clear language\n"
-                    "3. Keeps the response under 300 words\n"
-                    "4. Maintains a helpful, friendly tone\n"
-                    "5. Focuses on the most relevant information\n\n"
-                    "IMPORTANT:\n"
-                    "- NEVER output raw tool code or commands\n"
-                    "- NEVER mention that you're using tools\n"
-                    "- NEVER show raw data or technical details\n"
-                    "- ALWAYS present information in a natural, conversational way\n"
-                    "- ALWAYS use consistent units (convert to standard units)\n"
-                    "- ALWAYS validate numbers before presenting them\n"
-                    "- Format the response as if explaining to a colleague"
-                )
-                refined = await self.llm.ainvoke(refinement_prompt)
-                return refined.content if hasattr(refined, 'content') else str(refined)
-            
-            elif route.startswith("tool:"):
-                tool_name = route.split(":")[1]
-                try:
-                    if tool_name == "retrieve_snippets":
-                        result = self.retrieve_snippets(fileKey, message)
-                        # First validate the data
-                        validation_prompt = (
-                            f"Tool output: {json.dumps(result, indent=2)}\n"
-                            "Validate this data and extract key information:\n"
-                            "1. What type of message is this? (e.g., GLOBAL_POSITION_INT, VFR_HUD)\n"
-                            "2. What are the units of measurement?\n"
-                            "3. What is the timestamp?\n"
-                            "4. What are the actual values?\n"
-                            "Format as JSON with keys: message_type, units, timestamp, values"
-                        )
-                        validation = await self.llm.ainvoke(validation_prompt)
-                        
-                        synthesis_prompt = (
-                            f"User question: {message}\n"
-                            f"Validated data: {validation.content}\n"
-                            f"Initial analysis: {primary_response}\n"
-                            "Provide a clear, concise response that:\n"
-                            "1. Directly answers the question\n"
-                            "2. Uses simple, clear language\n"
-                            "3. Keeps the response under 300 words\n"
-                            "4. Maintains a helpful, friendly tone\n"
-                            "5. Focuses on the most relevant information\n\n"
-                            "IMPORTANT:\n"
-                            "- NEVER output raw tool code or commands\n"
-                            "- NEVER mention that you're using tools\n"
-                            "- NEVER show raw data or technical details\n"
-                            "- ALWAYS present information in a natural, conversational way\n"
-                            "- ALWAYS use consistent units (convert to standard units)\n"
-                            "- ALWAYS validate numbers before presenting them\n"
-                            "- Format the response as if explaining to a colleague"
-                        )
-                        synthesis = await self.llm.ainvoke(synthesis_prompt)
-                        return synthesis.content if hasattr(synthesis, 'content') else str(synthesis)
-                    
-                    elif tool_name == "detect_anomalies":
-                        anomalies = self.detect_anomalies(fileKey)
-                        # First validate the anomalies
-                        validation_prompt = (
-                            f"Tool output: {json.dumps(anomalies, indent=2)}\n"
-                            "Validate these anomalies and categorize them:\n"
-                            "1. What types of anomalies are present?\n"
-                            "2. What are the timestamps?\n"
-                            "3. What are the severity levels?\n"
-                            "4. What are the potential causes?\n"
-                            "Format as JSON with keys: anomaly_types, timestamps, severity, causes"
-                        )
-                        validation = await self.llm.ainvoke(validation_prompt)
-                        
-                        analysis_prompt = (
-                            f"User question: {message}\n"
-                            f"Validated anomalies: {validation.content}\n"
-                            f"Initial analysis: {primary_response}\n"
-                            "Provide a clear, concise response that:\n"
-                            "1. Directly answers the question\n"
-                            "2. Uses simple, clear language\n"
-                            "3. Keeps the response under 300 words\n"
-                            "4. Maintains a helpful, friendly tone\n"
-                            "5. Focuses on the most relevant information\n\n"
-                            "IMPORTANT:\n"
-                            "- NEVER output raw tool code or commands\n"
-                            "- NEVER mention that you're using tools\n"
-                            "- NEVER show raw data or technical details\n"
-                            "- ALWAYS present information in a natural, conversational way\n"
-                            "- If there are issues, explain them briefly without being overly concerned\n"
-                            "- If there are no issues, state that clearly\n"
-                            "- Format the response as if explaining to a colleague"
-                        )
-                        analysis = await self.llm.ainvoke(analysis_prompt)
-                        return analysis.content if hasattr(analysis, 'content') else str(analysis)
-                    
-                    else:
-                        logger.error(f"Unknown tool requested: {tool_name}")
-                        return f"[Error: Unknown tool {tool_name}]"
-                except Exception as e:
-                    logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
-                    return f"[Error executing {tool_name}: {str(e)}]"
-            else:
-                # Refine the chat response
-                refinement_prompt = (
-                    f"User question: {message}\n"
-                    f"Raw response: {primary_response}\n"
-                    "Provide a clear, concise response that:\n"
-                    "1. Directly answers the question\n"
-                    "2. Uses simple, clear language\n"
-                    "3. Keeps the response under 300 words\n"
-                    "4. Maintains a helpful, friendly tone\n"
-                    "5. Focuses on the most relevant information\n\n"
-                    "IMPORTANT:\n"
-                    "- NEVER output raw tool code or commands\n"
-                    "- NEVER mention that you're using tools\n"
-                    "- NEVER show raw data or technical details\n"
-                    "- ALWAYS present information in a natural, conversational way\n"
-                    "- Format the response as if explaining to a colleague"
-                )
-                refined = await self.llm.ainvoke(refinement_prompt)
-                return refined.content if hasattr(refined, 'content') else str(refined)
+            try:
+                return await self._invoke(synthesis_prompt, "synthesis")
+            except asyncio.TimeoutError:
+                logger.warning(f"Synthesis exceeded its {STAGE_TIMEOUTS['synthesis']}s budget, returning draft answer")
+                return answer
         except Exception as e:
             logger.error(f"Error in agent orchestration: {e}", exc_info=True)
-            return "I apologize, but I'm having trouble processing your request right now. Please try again in a moment." 
\ No newline at end of file
+            return FALLBACK_RESPONSE
+
+    async def _stream(self, prompt: str):
+        """Yield answer token events from the LLM, each chunk within the synthesis budget."""
+        stream = self.llm.astream(prompt).__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), STAGE_TIMEOUTS["synthesis"])
+            except StopAsyncIteration:
+                return
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if content:
+                yield {"type": "token", "content": content}
+
+    async def stream_answer(self, message: str, fileKey: str = None, chatHistory: list = None, embedding_snippet: str = None, vehicle_type: str = None, route: Dict[str, Any] = None):
+        """Stream a chat turn as {"type": "status"} and {"type": "token"} events.
+
+        Unlike answer_question there is no routing call: with a flight log the
+        tools run first and their output goes into the single prompt that is
+        streamed back token by token. A confident router decision runs only
+        that route's tool.
+        """
+        try:
+            if embedding_snippet:
+                yield {"type": "status", "message": "Validating flight log data..."}
+                prompt = SNIPPET_ANSWER_PROMPT.format(question=message, snippet=embedding_snippet, guidelines=ANSWER_GUIDELINES)
+                async for event in self._stream(prompt):
+                    yield event
+                return
+
+            conversation = await self._conversation(message, fileKey, chatHistory, vehicle_type)
+            if not fileKey:
+                async for event in self._stream(conversation):
+                    yield event
+                return
+
+            if route is not None and route.get("confident"):
+                if ROUTE_TOOLS.get(route["route"]):
+                    yield {"type": "status", "message": "Searching the flight log..."}
+                prompt = await self._routed_prompt(conversation, fileKey, message, route["route"])
+                if prompt is not None:
+                    if ROUTE_TOOLS.get(route["route"]):
+                        yield {"type": "status", "message": "Writing the answer..."}
+                    async for event in self._stream(prompt):
+                        yield event
+                    return
+
+            yield {"type": "status", "message": "Searching the flight log and running anomaly checks..."}
+            tool_names = [tool.name for tool in self.tools]
+            results = await asyncio.gather(
+                *[self._run_tool(name, fileKey, message) for name in tool_names],
+                return_exceptions=True
+            )
+            outputs = {}
+            for name, result in zip(tool_names, results):
+                if isinstance(result, BaseException):
+                    logger.warning(f"Tool {name} failed while streaming: {result!r}")
+                    result = []
+                outputs[name] = result
+
+            yield {"type": "status", "message": "Writing the answer..."}
+            prompt = STREAMED_ANSWER_PROMPT.format(
+                conversation=conversation,
+                snippets=json.dumps(outputs.get("retrieve_snippets", [])),
+                anomalies=json.dumps(outputs.get("detect_anomalies", [])),
+                regions=json.dumps(outputs.get("query_region") or "no region named"),
+                guidelines=ANSWER_GUIDELINES
+            )
+            async for event in self._stream(prompt):
+                yield event
+        except Exception as e:
+            logger.error(f"Error in streaming orchestration: {e}", exc_info=True)
+            yield {"type": "error", "message": FALLBACK_RESPONSE}
@@ -0,0 +1,147 @@
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple, Union
+from .columns import message_columns
+
+# Time alignment of message fields recorded on different, irregular clocks.
+# Every function takes sorted source timestamps; message_series() sorts them
+# when a log is not monotonic.
+
+def asof_indices(source_t: np.ndarray, target_t: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """Index of the last source sample at or before each target time, -1 if there is none.
+
+    Args:
+        source_t: Sorted source timestamps
+        target_t: Target timestamps (any order)
+        tolerance: Treat source samples older than this (seconds) as missing
+    """
+    idx = np.searchsorted(source_t, target_t, side="right") - 1
+    if tolerance is not None:
+        stale = target_t - source_t[np.clip(idx, 0, None)] > tolerance if source_t.size else np.ones(idx.shape, bool)
+        idx = np.where(stale, -1, idx)
+    return idx
+
+def nearest_indices(source_t: np.ndarray, target_t: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """Index of the closest source sample to each target time, -1 if none within tolerance."""
+    if source_t.size == 0:
+        return np.full(np.shape(target_t), -1)
+    right = np.clip(np.searchsorted(source_t, target_t), 0, source_t.size - 1)
+    left = np.clip(right - 1, 0, None)
+    idx = np.where(np.abs(target_t - source_t[left]) <= np.abs(source_t[right] - target_t), left, right)
+    if tolerance is not None:
+        idx = np.where(np.abs(source_t[idx] - target_t) > tolerance, -1, idx)
+    return idx
+
+def take(values: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """values[idx] with NaN where idx is -1."""
+    if values.size == 0:
+        return np.full(idx.shape, np.nan)
+    return np.where(idx >= 0, values[np.clip(idx, 0, None)], np.nan)
+
+def asof(source_t: np.ndarray, values: np.ndarray, target_t: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """Latest value at or before each target time (a backward as-of join)."""
+    return take(values, asof_indices(source_t, target_t, tolerance))
+
+def nearest(source_t: np.ndarray, values: np.ndarray, target_t: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """Value of the closest sample to each target time."""
+    return take(values, nearest_indices(source_t, target_t, tolerance))
+
+def interpolate(source_t: np.ndarray, values: np.ndarray, target_t: np.ndarray, tolerance: Optional[float] = None) -> np.ndarray:
+    """Linear interpolation onto target times; NaN outside the source range.
+
+    NaN source values are skipped; with a tolerance, target times further than
+    that from any valid source sample are NaN too.
+    """
+    valid = ~np.isnan(values)
+    source_t, values = source_t[valid], values[valid]
+    if source_t.size == 0:
+        return np.full(np.shape(target_t), np.nan)
+    result = np.interp(target_t, source_t, values, left=np.nan, right=np.nan)
+    if tolerance is not None:
+        idx = nearest_indices(source_t, target_t, tolerance)
+        result = np.where(idx >= 0, result, np.nan)
+    return result
+
+METHODS = {"asof": asof, "nearest": nearest, "linear": interpolate}
+
+def fixed_rate_clock(start: float, end: float, rate: float) -> np.ndarray:
+    """Timestamps from start to end (inclusive) at rate Hz."""
+    if rate <= 0:
+        raise ValueError("rate must be positive")
+    count = int(np.floor((end - start) * rate + 1e-9)) + 1
+    return start + np.arange(max(count, 0)) / rate
+
+def parse_field(spec: Union[str, Tuple[str, str]]) -> Tuple[str, str]:
+    """("GPS", "Spd") from "GPS.Spd" or a (msg_type, field) tuple."""
+    if isinstance(spec, tuple):
+        return spec
+    msg_type, _, field = spec.rpartition(".")
+    if not msg_type:
+        raise ValueError(f"Expected MSG.field, got {spec!r}")
+    return msg_type, field
+
+def message_series(parsed_data: Dict[str, Any], spec: Union[str, Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """(timestamps, values) of one message field, sorted by time; empty arrays if absent."""
+    msg_type, field = parse_field(spec)
+    cols = message_columns(parsed_data, msg_type, [field])
+    if field not in cols:
+        return np.empty(0), np.empty(0)
+    t, v = cols["_timestamp"], cols[field]
+    if t.size > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind="stable")
+        t, v = t[order], v[order]
+    return t, v
+
+def align(
+    parsed_data: Dict[str, Any],
+    fields: List[Union[str, Tuple[str, str]]],
+    clock: Union[str, np.ndarray, None] = None,
+    method: str = "asof",
+    tolerance: Optional[float] = None
+) -> Dict[str, np.ndarray]:
+    """Align message fields from any message types onto one clock.
+
+    Args:
+        parsed_data: The dict returned by MAVLinkParser.parse
+        fields: Fields as "MSG.field" (or (msg_type, field) tuples)
+        clock: A message type whose timestamps to use, an array of timestamps,
+            or None for the timestamps of the first field
+        method: "asof" (latest value so far), "nearest" or "linear"
+        tolerance: Maximum distance (seconds) to a source sample, beyond which values are NaN
+
+    Returns:
+        Dict[str, np.ndarray]: "_timestamp" plus one column per field, keyed as given
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown alignment method: {method}")
+    series = {spec if isinstance(spec, str) else ".".join(spec): message_series(parsed_data, spec) for spec in fields}
+    if clock is None:
+        target = next(iter(series.values()))[0] if series else np.empty(0)
+    elif isinstance(clock, str):
+        target = message_columns(parsed_data, clock, []).get("_timestamp", np.empty(0))
+        if target.size > 1 and np.any(np.diff(target) < 0):
+            target = np.sort(target, kind="stable")
+    else:
+        target = np.asarray(clock, dtype=np.float64)
+
+    aligned = {"_timestamp": target}
+    for key, (t, v) in series.items():
+        if t is target:
+            aligned[key] = v
+        else:
+            aligned[key] = METHODS[method](t, v, target, tolerance)
+    return aligned
+
+def resample(
+    parsed_data: Dict[str, Any],
+    fields: List[Union[str, Tuple[str, str]]],
+    rate: float,
+    method: str = "linear",
+    tolerance: Optional[float] = None
+) -> Dict[str, np.ndarray]:
+    """Resample fields onto a fixed-rate clock over the time span they all cover."""
+    spans = [(t[0], t[-1]) for t, _ in (message_series(parsed_data, f) for f in fields) if t.size]
+    if len(spans) < len(fields) or not spans:
+        return align(parsed_data, fields, np.empty(0), method, tolerance)
+    start, end = max(s for s, _ in spans), min(e for _, e in spans)
+    clock = fixed_rate_clock(start, end, rate) if end >= start else np.empty(0)
+    return align(parsed_data, fields, clock, method, tolerance)
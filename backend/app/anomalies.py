@@ -0,0 +1,299 @@
+import json
+import logging
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from .alignment import message_series, asof
+from .columns import message_columns
+from .metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+# Declarative anomaly rules evaluated over the parsed telemetry columns.
+#
+# check:
+#   above       - any field (absolute value if "abs") above threshold
+#   nonzero     - any field different from zero
+#   fall_below  - field below threshold after it was first at or above it
+#   rate        - |d(field)/dt| above threshold (units per second)
+#   position_rate - horizontal speed between consecutive lat/lon fixes above threshold (m/s); 0,0 is no fix
+#   sag         - field dropped more than threshold (fraction) below its running peak
+#   diverge     - |first field - second field| above threshold
+# scale multiplies the raw field values; valid_range masks out "unknown" sentinel values;
+# time_field/time_scale select the clock used for rates (default: _timestamp seconds).
+# Fields written "MSG.field" come from another message type, sampled as-of the rule's
+# message timestamps (NaN when older than align_tolerance seconds); require maps fields
+# to the (lo, hi) range they must be in for a sample to be checked.
+ANOMALY_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "altitude_jump",
+        "msg_type": "GLOBAL_POSITION_INT",
+        "fields": ["relative_alt"],
+        "check": "rate",
+        "scale": 1e-3,
+        "time_field": "time_boot_ms",
+        "time_scale": 1e-3,
+        "threshold": 30.0,
+        "severity": "warning",
+        "description": "Altitude changed faster than {threshold} m/s"
+    },
+    {
+        "name": "gps_position_jump",
+        "msg_type": "GLOBAL_POSITION_INT",
+        "fields": ["lat", "lon"],
+        "check": "position_rate",
+        "scale": 1e-7,
+        "time_field": "time_boot_ms",
+        "time_scale": 1e-3,
+        "valid_range": (-1800000000, 1800000000),
+        "threshold": 100.0,
+        "severity": "warning",
+        "description": "GPS position jumped faster than {threshold} m/s"
+    },
+    {
+        "name": "gps_fix_lost",
+        "msg_type": "GPS_RAW_INT",
+        "fields": ["fix_type"],
+        "check": "fall_below",
+        "threshold": 3,
+        "severity": "critical",
+        "description": "GPS fix dropped below 3D fix"
+    },
+    {
+        "name": "gps_fix_lost",
+        "msg_type": "GPS",
+        "fields": ["Status"],
+        "check": "fall_below",
+        "threshold": 3,
+        "severity": "critical",
+        "description": "GPS fix dropped below 3D fix"
+    },
+    {
+        "name": "battery_voltage_sag",
+        "msg_type": "SYS_STATUS",
+        "fields": ["voltage_battery"],
+        "check": "sag",
+        "scale": 1e-3,
+        "valid_range": (1, 65534),
+        "threshold": 0.15,
+        "severity": "warning",
+        "description": "Battery voltage sagged more than 15% below its peak"
+    },
+    {
+        "name": "battery_voltage_sag",
+        "msg_type": "BAT",
+        "fields": ["Volt"],
+        "check": "sag",
+        "valid_range": (0.1, 100.0),
+        "threshold": 0.15,
+        "severity": "warning",
+        "description": "Battery voltage sagged more than 15% below its peak"
+    },
+    {
+        "name": "gps_altitude_divergence",
+        "msg_type": "GLOBAL_POSITION_INT",
+        "fields": ["alt", "GPS_RAW_INT.alt"],
+        "check": "diverge",
+        "scale": 1e-3,
+        "require": {"GPS_RAW_INT.fix_type": (3, 255)},
+        "threshold": 30.0,
+        "severity": "warning",
+        "description": "EKF altitude and GPS altitude differ by more than {threshold} m"
+    },
+    {
+        "name": "attitude_rate_spike",
+        "msg_type": "ATTITUDE",
+        "fields": ["rollspeed", "pitchspeed", "yawspeed"],
+        "check": "above",
+        "abs": True,
+        "threshold": 3.5,
+        "severity": "warning",
+        "description": "Body rate above {threshold} rad/s"
+    },
+    {
+        "name": "sys_status_error",
+        "msg_type": "SYS_STATUS",
+        "fields": ["errors_comm", "errors_count1", "errors_count2", "errors_count3", "errors_count4"],
+        "check": "nonzero",
+        "severity": "warning",
+        "description": "SYS_STATUS reported nonzero error counters"
+    },
+    {
+        "name": "ekf_variance",
+        "msg_type": "EKF_STATUS_REPORT",
+        "fields": ["velocity_variance", "pos_horiz_variance", "pos_vert_variance", "compass_variance", "terrain_alt_variance"],
+        "check": "above",
+        "threshold": 0.8,
+        "severity": "critical",
+        "description": "EKF variance above {threshold}"
+    },
+]
+
+# Flagged samples closer together than this (seconds) are merged into one event
+MERGE_GAP = 2.0
+# Cross-message samples older than this (seconds) are treated as missing
+ALIGN_TOLERANCE = 2.0
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized great-circle distance in meters between arrays of degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def merge_intervals(times: np.ndarray, mask: np.ndarray, values: np.ndarray, gap: float = MERGE_GAP) -> List[Dict[str, Any]]:
+    """Collapse flagged samples into [start, end] intervals.
+
+    Args:
+        times: Sample timestamps in seconds (sorted)
+        mask: Boolean array of flagged samples
+        values: Severity magnitude per sample, the peak is reported per interval
+        gap: Maximum gap in seconds between flagged samples of the same interval
+
+    Returns:
+        List[Dict[str, Any]]: One dict per interval with start, end, samples and peak
+    """
+    idx = np.flatnonzero(mask)
+    if idx.size == 0:
+        return []
+    t = times[idx]
+    v = values[idx]
+    breaks = np.flatnonzero(np.diff(t) > gap) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [idx.size])) - 1
+    peaks = np.fmax.reduceat(v, starts)
+    return [
+        {"start": float(t[s]), "end": float(t[e]), "samples": int(e - s + 1), "peak": float(p)}
+        for s, e, p in zip(starts, ends, peaks)
+    ]
+
+def _evaluate_rule(rule: Dict[str, Any], cols: Dict[str, np.ndarray]):
+    """Return (mask, magnitude) arrays aligned with cols["_timestamp"]."""
+    scale = rule.get("scale", 1.0)
+    threshold = rule.get("threshold", 0.0)
+    data = []
+    for field in rule["fields"]:
+        values = cols[field]
+        if "valid_range" in rule:
+            lo, hi = rule["valid_range"]
+            values = np.where((values >= lo) & (values <= hi), values, np.nan)
+        data.append(values * scale if scale != 1.0 else values)
+    # Rates use the message's own clock when it has one; tlog receive times are jittery
+    time_field = rule.get("time_field")
+    if time_field in cols:
+        t = cols[time_field] * rule.get("time_scale", 1.0)
+    else:
+        t = cols["_timestamp"]
+    check = rule["check"]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if check == "above":
+            magnitude = np.fmax.reduce([np.abs(d) if rule.get("abs") else d for d in data])
+            return magnitude > threshold, magnitude
+        if check == "nonzero":
+            magnitude = np.fmax.reduce([np.abs(d) for d in data])
+            return magnitude > 0, magnitude
+        if check == "fall_below":
+            values = data[0]
+            reached = np.logical_or.accumulate(values >= threshold)
+            return reached & (values < threshold), threshold - values
+        if check == "rate":
+            dt = np.diff(t)
+            rate = np.abs(np.diff(data[0])) / np.where(dt > 0, dt, np.nan)
+            magnitude = np.concatenate(([0.0], rate))
+            return magnitude > threshold, magnitude
+        if check == "position_rate":
+            # lat = lon = 0 is the "no fix" sentinel; compare each fix with the previous real one
+            valid = np.flatnonzero(np.isfinite(data[0]) & np.isfinite(data[1]) & ((data[0] != 0) | (data[1] != 0)))
+            lat, lon, tv = data[0][valid], data[1][valid], t[valid]
+            dist = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+            dt = np.diff(tv)
+            magnitude = np.zeros(len(t))
+            magnitude[valid[1:]] = dist / np.where(dt > 0, dt, np.nan)
+            return magnitude > threshold, magnitude
+        if check == "sag":
+            values = data[0]
+            peak = np.fmax.accumulate(values)
+            drop = (peak - values) / peak
+            return drop > threshold, drop
+        if check == "diverge":
+            magnitude = np.abs(data[0] - data[1])
+            return magnitude > threshold, magnitude
+    raise ValueError(f"Unknown anomaly check: {check}")
+
+def _with_other_messages(parsed_data: Dict[str, Any], rule: Dict[str, Any], cols: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+    """Add the rule's "MSG.field" columns sampled as-of cols["_timestamp"], None if one is missing."""
+    other = [f for f in [*rule["fields"], *rule.get("require", {})] if "." in f]
+    if not other:
+        return cols
+    cols = dict(cols)
+    t = cols["_timestamp"]
+    if t.size > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind="stable")
+        cols = {k: v[order] for k, v in cols.items()}
+        t = cols["_timestamp"]
+    for field in other:
+        source_t, values = message_series(parsed_data, field)
+        if source_t.size == 0:
+            return None
+        cols[field] = asof(source_t, values, t, rule.get("align_tolerance", ALIGN_TOLERANCE))
+    return cols
+
+def detect_telemetry_anomalies(parsed_data: Dict[str, Any], rules: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Run the declarative anomaly rules over the parsed telemetry columns.
+
+    Returns:
+        List[Dict[str, Any]]: Merged anomaly events sorted by start time
+    """
+    events = []
+    for rule in rules if rules is not None else ANOMALY_RULES:
+        required = rule.get("require", {})
+        own = [f for f in [*rule["fields"], *required] if "." not in f]
+        wanted = own + ([rule["time_field"]] if "time_field" in rule else [])
+        cols = message_columns(parsed_data, rule["msg_type"], wanted)
+        if not cols or any(f not in cols for f in own):
+            continue
+        try:
+            cols = _with_other_messages(parsed_data, rule, cols)
+            if cols is None:
+                continue
+            mask, magnitude = _evaluate_rule(rule, cols)
+            for field, (lo, hi) in required.items():
+                mask = mask & (cols[field] >= lo) & (cols[field] <= hi)
+        except Exception as e:
+            logger.warning(f"Anomaly rule {rule['name']} failed: {e}")
+            continue
+        description = rule["description"].format(threshold=rule.get("threshold"))
+        for interval in merge_intervals(cols["_timestamp"], mask, magnitude, rule.get("merge_gap", MERGE_GAP)):
+            events.append({
+                "timestamp": interval["start"],
+                "type": rule["name"],
+                "msg_type": rule["msg_type"],
+                "severity": rule["severity"],
+                "description": description,
+                **interval
+            })
+    events.sort(key=lambda e: e["start"])
+    return events
+
+@instrumented("collect_anomalies")
+def collect_anomalies(parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rule-based events plus the events flagged by the online detectors during parsing."""
+    events = detect_telemetry_anomalies(parsed_data) + parsed_data.get("online_anomalies", [])
+    events.sort(key=lambda e: e["start"])
+    return events
+
+def save_anomaly_report(fileKey: str, anomalies: List[Dict[str, Any]]) -> None:
+    outdir = Path("uploads/faiss_indexes")
+    outdir.mkdir(parents=True, exist_ok=True)
+    with open(outdir / f"{fileKey}_anomalies.json", "w") as f:
+        json.dump(anomalies, f)
+
+def load_anomaly_report(fileKey: str) -> Optional[List[Dict[str, Any]]]:
+    """Load the anomaly events computed at ingestion, or None if there are none on disk."""
+    path = Path("uploads/faiss_indexes") / f"{fileKey}_anomalies.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import re
+import time
+import logging
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words that flip the meaning of otherwise near-identical questions
+# ("max altitude" vs "min altitude"); semantic hits must agree on them.
+_GUARD_WORDS = {
+    "max", "maximum", "highest", "top", "peak", "min", "minimum", "lowest", "least",
+    "first", "last", "start", "end", "before", "after", "average", "mean", "total",
+    "not", "no", "without", "takeoff", "landing", "arm", "armed", "disarm", "disarmed",
+}
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+def _guard_tokens(normalized: str) -> frozenset:
+    return frozenset(w for w in normalized.split() if w in _GUARD_WORDS or any(c.isdigit() for c in w))
+
+def history_key(chat_history: Optional[List[Dict[str, str]]]) -> str:
+    """Digest of the user and assistant turns before a question ("" for none).
+
+    Follow-ups such as "and why?" mean something else in every conversation, so
+    answers are only reused for the same question after the same turns. System
+    messages (e.g. the "Flight log loaded" note) are left out.
+    """
+    turns = [(t.get("role", ""), t.get("content", "")) for t in chat_history or [] if t.get("role") != "system"]
+    if not turns:
+        return ""
+    return hashlib.sha1(json.dumps(turns).encode()).hexdigest()
+
+class ResponseCache:
+    """Two-level cache of LLM answers, keyed by fileKey and the conversation so far (history_key).
+
+    Level 1 is an exact match on the normalised question. Level 2 reuses the
+    answer of a cached question whose embedding is within ``similarity_threshold``
+    (cosine) of the new one. Entries expire after ``ttl`` seconds and the least
+    recently used entry is evicted beyond ``max_entries``.
+    """
+    def __init__(
+        self,
+        encode: Optional[Callable[[List[str]], Any]] = None,
+        max_entries: int = 512,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.93,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self._encode = encode
+        self._embed = lru_cache(maxsize=256)(self._embed_uncached)
+        # (fileKey, history key, normalized question) -> {"answer", "expires", "embedding", "guard"}
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _embed_uncached(self, normalized: str) -> Optional[np.ndarray]:
+        if self._encode is None:
+            return None
+        try:
+            vector = np.asarray(self._encode([normalized]), dtype=np.float32)[0]
+        except Exception as e:
+            logger.warning(f"Semantic cache encoding failed: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def embed(self, question: str) -> Optional[np.ndarray]:
+        """Embed a question ahead of get/put, e.g. from a worker thread, so lookups stay cheap."""
+        return self._embed(normalize_question(question))
+
+    def _live(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] <= self.clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, fileKey: str, question: str, context: str = "") -> Optional[str]:
+        """Return a cached answer for this log and conversation (history_key), or None on a miss."""
+        normalized = normalize_question(question)
+        key = (fileKey, context, normalized)
+        entry = self._live(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return entry["answer"]
+
+        query = self._embed(normalized)
+        if query is not None:
+            guard = _guard_tokens(normalized)
+            candidates = [
+                k for k, e in list(self._entries.items())
+                if k[:2] == (fileKey, context) and e["embedding"] is not None and e["guard"] == guard and self._live(k) is not None
+            ]
+            if candidates:
+                scores = np.stack([self._entries[k]["embedding"] for k in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(candidates[best])
+                    self.stats["semantic_hits"] += 1
+                    logger.info(f"Semantic cache hit ({scores[best]:.3f}): '{question}' ~ '{candidates[best][2]}'")
+                    return self._entries[candidates[best]]["answer"]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, fileKey: str, question: str, answer: str, context: str = "") -> None:
+        normalized = normalize_question(question)
+        key = (fileKey, context, normalized)
+        self._entries[key] = {
+            "answer": answer,
+            "expires": self.clock() + self.ttl,
+            "embedding": self._embed(normalized),
+            "guard": _guard_tokens(normalized)
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, fileKey: str) -> int:
+        """Drop every cached answer for a log, e.g. when it is re-ingested."""
+        stale = [k for k in self._entries if k[0] == fileKey]
+        for k in stale:
+            del self._entries[k]
+        self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,160 @@
+import gzip
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi.responses import JSONResponse
+from .columns import message_columns, numeric_fields
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC is optional; raw typed arrays always work
+    pa = None
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+RAW_MEDIA_TYPE = "application/octet-stream"
+FORMATS = ("raw", "arrow")
+# Value columns may be narrowed to float32; _timestamp (epoch seconds) always stays float64
+DTYPES = {"float64": "<f8", "float32": "<f4"}
+# Raw column offsets are multiples of this so the browser can view them as typed arrays in place
+ALIGNMENT = 8
+
+def columns_schema(parsed_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Message types of a log with their row counts and numeric fields."""
+    return {
+        msg_type: {"rows": len(msgs), "fields": numeric_fields(msgs)}
+        for msg_type, msgs in parsed_data.get("messages", {}).items() if msgs
+    }
+
+def select_columns(parsed_data: Dict[str, Any], msg_type: str, fields: Optional[List[str]] = None,
+                   dtype: str = "float64") -> "OrderedDict[str, np.ndarray]":
+    """Little-endian columns of one message type, _timestamp first.
+
+    Raises:
+        KeyError: The message type or one of the fields is not in the log
+        ValueError: Unknown dtype
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype: {dtype}")
+    cols = message_columns(parsed_data, msg_type, fields)
+    if not cols:
+        raise KeyError(f"{msg_type} not in log")
+    missing = [f for f in fields or [] if f not in cols]
+    if missing:
+        raise KeyError(f"{msg_type} has no numeric field {', '.join(missing)}")
+    selected = OrderedDict(_timestamp=cols["_timestamp"].astype("<f8", copy=False))
+    for name, values in cols.items():
+        if name != "_timestamp":
+            selected[name] = values.astype(DTYPES[dtype], copy=False)
+    return selected
+
+def encode_raw(columns: Dict[str, np.ndarray]) -> Tuple[bytes, List[Dict[str, Any]]]:
+    """Concatenate columns into one buffer.
+
+    Returns:
+        Tuple[bytes, List[Dict[str, Any]]]: (body, layout) where layout lists name,
+        dtype, byte offset and length (elements) of every column
+    """
+    parts, layout, offset = [], [], 0
+    for name, values in columns.items():
+        data = values.tobytes()
+        layout.append({"name": name, "dtype": "float32" if values.dtype.itemsize == 4 else "float64",
+                       "offset": offset, "length": int(values.size)})
+        padding = -len(data) % ALIGNMENT
+        parts.append(data + b"\0" * padding)
+        offset += len(data) + padding
+    return b"".join(parts), layout
+
+def encode_arrow(columns: Dict[str, np.ndarray], msg_type: str) -> bytes:
+    """Serialize columns as one Arrow IPC stream record batch."""
+    if pa is None:
+        raise RuntimeError("Arrow output needs pyarrow installed")
+    table = pa.table({name: pa.array(values) for name, values in columns.items()},
+                     metadata={"msg_type": msg_type})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive byte range of a single-range "bytes=" header, None to send everything.
+
+    Raises:
+        ValueError: The range cannot be satisfied (respond 416)
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end:
+        raise ValueError(f"Range not satisfiable: {header}")
+    return start, end
+
+class ColumnarEncoder:
+    """Encodes message columns for the frontend, caching the bodies per fileKey.
+
+    Range requests for single columns of the same selection and repeat loads
+    reuse the encoded (and gzipped) body.
+    """
+    def __init__(self, max_entries: int = 64, compresslevel: int = 6):
+        self.max_entries = max_entries
+        self.compresslevel = compresslevel
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def encode(self, fileKey: str, parsed_data: Dict[str, Any], msg_type: str, fields: Optional[List[str]] = None,
+               fmt: str = "raw", dtype: str = "float64", compress: bool = False) -> Dict[str, Any]:
+        """Encoded columns of one message type.
+
+        Returns:
+            Dict[str, Any]: body, media_type, rows and layout (raw format only);
+            body is gzipped when compress is set
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        key = (fileKey, msg_type, tuple(fields) if fields else None, fmt, dtype, compress)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._cache[key]
+            self.stats["misses"] += 1
+
+        columns = select_columns(parsed_data, msg_type, fields, dtype)
+        if fmt == "arrow":
+            body, layout, media_type = encode_arrow(columns, msg_type), None, ARROW_MEDIA_TYPE
+        else:
+            (body, layout), media_type = encode_raw(columns), RAW_MEDIA_TYPE
+        if compress:
+            body = gzip.compress(body, compresslevel=self.compresslevel)
+        result = {"body": body, "media_type": media_type, "rows": int(columns["_timestamp"].size), "layout": layout}
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def invalidate(self, fileKey: str) -> None:
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == fileKey]:
+                del self._cache[key]
+
+def layout_header(layout: Optional[List[Dict[str, Any]]]) -> str:
+    """Compact JSON for the X-Columns response header."""
+    return json.dumps(layout, separators=(",", ":"))
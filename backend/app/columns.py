@@ -0,0 +1,53 @@
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+def _is_numeric(value) -> bool:
+    return isinstance(value, (int, float, bool)) and not isinstance(value, str)
+
+def numeric_fields(msgs: List[Dict[str, Any]]) -> List[str]:
+    """Return the names of the scalar numeric fields of a message type."""
+    if not msgs:
+        return []
+    return [name for name, value in msgs[0].items() if _is_numeric(value)]
+
+def message_columns(parsed_data: Dict[str, Any], msg_type: str, fields: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """Get NumPy columns for a message type from parsed log data.
+
+    Columns are built once from the list-of-dicts representation in
+    ``parsed_data["messages"]`` and cached in ``parsed_data["columns"]``, so
+    repeated analyses over the same log only pay the conversion cost once.
+    ``_timestamp`` is always included. Fields that the message type does not have are
+    left out; missing or non-numeric values inside a column become NaN.
+
+    Args:
+        parsed_data: The dict returned by ``MAVLinkParser.parse``
+        msg_type: Message type name, e.g. ``GLOBAL_POSITION_INT``
+        fields: Field names to return (default: every numeric field)
+
+    Returns:
+        Dict[str, np.ndarray]: float64 column per field, empty if the type is absent
+    """
+    msgs = parsed_data.get("messages", {}).get(msg_type) or []
+    if not msgs:
+        return {}
+    cache = parsed_data.setdefault("columns", {}).setdefault(msg_type, {})
+    wanted = list(fields) if fields is not None else numeric_fields(msgs)
+    if "_timestamp" not in wanted:
+        wanted.append("_timestamp")
+
+    nan = float("nan")
+    for field in wanted:
+        if field in cache:
+            continue
+        if field not in msgs[0] or not _is_numeric(msgs[0][field]):
+            continue
+        values = (m.get(field, nan) for m in msgs)
+        try:
+            cache[field] = np.fromiter(values, dtype=np.float64, count=len(msgs))
+        except (TypeError, ValueError):
+            # Mixed types in one field; fall back to a tolerant conversion
+            cache[field] = np.array(
+                [v if _is_numeric(v) else nan for v in (m.get(field, nan) for m in msgs)],
+                dtype=np.float64
+            )
+    return {field: cache[field] for field in wanted if field in cache}
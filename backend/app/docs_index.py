@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import math
+import re
+import threading
+import xml.etree.ElementTree as ET
+import numpy as np
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+LOGMETADATA_DIR = Path(__file__).resolve().parents[2] / "src" / "assets" / "logmetadata"
+EMBEDDINGS_DIR = Path("uploads/docs_index")
+
+# Vehicle names returned by MAVLinkParser._get_vehicle_type -> bundled doc file.
+# QuadPlane VTOLs run the Plane firmware; ArduSub has no bundled docs, Copter is closest.
+VEHICLE_DOCS = {
+    "Fixed Wing": "plane", "Flapping Wing": "plane", "Airship": "plane", "Free Balloon": "plane",
+    "Kite": "plane", "Parafoil": "plane", "VTOL Duorotor": "plane", "VTOL Quadrotor": "plane",
+    "VTOL Tiltrotor": "plane",
+    "Quadcopter": "copter", "Hexacopter": "copter", "Octocopter": "copter", "Tricopter": "copter",
+    "Dodecarotor": "copter", "Helicopter": "copter", "Coaxial Helicopter": "copter", "Submarine": "copter",
+    "Ground Rover": "rover", "Surface Boat": "rover",
+    "Antenna Tracker": "tracker",
+}
+DOC_VEHICLES = ("plane", "copter", "rover", "tracker")
+
+def docs_vehicle(vehicle_type: Optional[str]) -> Optional[str]:
+    """Doc set for a vehicle type name, or None to search all of them."""
+    if not vehicle_type:
+        return None
+    if vehicle_type in DOC_VEHICLES:
+        return vehicle_type
+    return VEHICLE_DOCS.get(vehicle_type)
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def load_logmetadata(directory: Path = LOGMETADATA_DIR) -> List[Dict[str, Any]]:
+    """Read the logmetadata XML files into doc entries.
+
+    Every log message gives one entry describing the message and its fields, and
+    every field one entry of its own. Entries identical across vehicles are
+    merged and list all the vehicles they apply to.
+    """
+    entries: Dict[tuple, Dict[str, Any]] = {}
+    for vehicle in DOC_VEHICLES:
+        path = directory / f"{vehicle}.xml"
+        if not path.exists():
+            logger.warning(f"Log message documentation not found: {path}")
+            continue
+        for fmt in ET.parse(path).getroot().iter("logformat"):
+            message = fmt.get("name", "")
+            description = (fmt.findtext("description") or "").strip()
+            url = (fmt.findtext("url") or "").strip()
+            fields = []
+            for field in fmt.iter("field"):
+                name = field.get("name", "")
+                field_description = (field.findtext("description") or "").strip()
+                bits = (field.findtext("bits") or "").strip()
+                fields.append(name)
+                text = f"{message}.{name}: {field_description}" + (f" (bits: {bits})" if bits else "")
+                key = ("field", message, name, text)
+                entry = entries.setdefault(key, {"message": message, "field": name, "text": text, "url": url, "vehicles": []})
+                entry["vehicles"].append(vehicle)
+            text = f"{message}: {description}. Fields: {', '.join(fields)}"
+            key = ("message", message, None, text)
+            entry = entries.setdefault(key, {"message": message, "field": None, "text": text, "url": url, "vehicles": []})
+            entry["vehicles"].append(vehicle)
+    return list(entries.values())
+
+class DocsIndex:
+    """Hybrid keyword (BM25) and vector index over the ArduPilot log message docs.
+
+    Built once from the bundled XML; the entry embeddings are cached on disk,
+    keyed by a hash of the entry texts, so later startups only read them back.
+    Without an ``encode`` function the index is keyword-only.
+    """
+    def __init__(self, entries: List[Dict[str, Any]], encode: Optional[Callable[[List[str]], Any]] = None,
+                 cache_dir: Optional[Path] = EMBEDDINGS_DIR, k1: float = 1.2, b: float = 0.75):
+        self.entries = entries
+        self.encode = encode
+        self.k1 = k1
+        self.b = b
+        # Exact message/field names ("CTUN", "NSats", "GPS.Spd") are the strongest signal:
+        # name -> [(entry, boost)]
+        self._by_name: Dict[str, List[tuple]] = defaultdict(list)
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._lengths = np.zeros(len(entries))
+        for i, entry in enumerate(entries):
+            message = entry["message"].lower()
+            if entry["field"]:
+                self._by_name[message].append((i, 5.0))
+                self._by_name[entry["field"].lower()].append((i, 6.0))
+                self._by_name[f"{message}.{entry['field'].lower()}"].append((i, 12.0))
+            else:
+                self._by_name[message].append((i, 10.0))
+            counts = Counter(_tokens(entry["text"]))
+            self._lengths[i] = sum(counts.values())
+            for token, count in counts.items():
+                self._postings[token][i] = count
+        self._avg_length = float(self._lengths.mean()) if entries else 1.0
+        self._vehicle_masks = {
+            v: np.array([v in e["vehicles"] for e in entries], dtype=bool) for v in DOC_VEHICLES
+        }
+        self.vectors = self._load_vectors(cache_dir) if encode is not None else None
+
+    def _load_vectors(self, cache_dir: Optional[Path]) -> Optional[np.ndarray]:
+        digest = hashlib.sha1("\n".join(e["text"] for e in self.entries).encode("utf-8")).hexdigest()[:16]
+        path = cache_dir / f"embeddings_{digest}.npy" if cache_dir else None
+        if path is not None and path.exists():
+            return np.load(path)
+        try:
+            vectors = np.asarray(self.encode([e["text"] for e in self.entries]), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Doc index embeddings unavailable, using keyword search only: {e}")
+            return None
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, vectors)
+        return vectors
+
+    def _keyword_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.entries))
+        n = len(self.entries)
+        for token in set(_tokens(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            ids = np.fromiter(postings.keys(), dtype=np.int64)
+            tf = np.fromiter(postings.values(), dtype=np.float64)
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[ids] / self._avg_length)
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+        for word in set(re.findall(r"[A-Za-z0-9_.]+", query)):
+            for i, boost in self._by_name.get(word.lower().strip("."), []):
+                scores[i] += boost
+        return scores
+
+    def name_matches(self, query: str, vehicle_type: Optional[str] = None, k: int = 3) -> List[Dict[str, Any]]:
+        """Entries whose message or field name appears verbatim in the query (dictionary lookups only)."""
+        vehicle = docs_vehicle(vehicle_type)
+        scores: Dict[int, float] = defaultdict(float)
+        for word in set(re.findall(r"[A-Za-z0-9_.]+", query)):
+            # Short lowercase words ("in", "as") collide with field names; require a name-like token
+            if len(word) < 3 and not word.isupper():
+                continue
+            for i, boost in self._by_name.get(word.lower().strip("."), []):
+                if vehicle is None or vehicle in self.entries[i]["vehicles"]:
+                    scores[i] += boost
+        best = sorted(scores, key=lambda i: -scores[i])[:k]
+        return [self.entries[i] for i in best if scores[i] >= 10.0]
+
+    def search(self, query: str, vehicle_type: Optional[str] = None, k: int = 5) -> List[Dict[str, Any]]:
+        """Top-k doc entries for a query, fusing keyword and vector ranks (RRF).
+
+        Args:
+            query: Free-text question or message/field name
+            vehicle_type: Vehicle type name (see VEHICLE_DOCS) or doc set; None searches all
+            k: Number of entries to return
+
+        Returns:
+            List[Dict[str, Any]]: Entries with message, field, text, url, vehicles and score
+        """
+        if not self.entries:
+            return []
+        vehicle = docs_vehicle(vehicle_type)
+        allowed = self._vehicle_masks[vehicle] if vehicle else np.ones(len(self.entries), dtype=bool)
+
+        fused = np.zeros(len(self.entries))
+        keyword = np.where(allowed, self._keyword_scores(query), 0.0)
+        top = np.argsort(-keyword)[:50]
+        rankings = [top[keyword[top] > 0]]
+        if self.vectors is not None:
+            try:
+                q = np.asarray(self.encode([query]), dtype=np.float32)[0]
+                similarity = np.where(allowed, self.vectors @ (q / max(np.linalg.norm(q), 1e-12)), -1.0)
+                rankings.append(np.argsort(-similarity)[:50])
+            except Exception as e:
+                logger.warning(f"Doc query encoding failed, using keyword results: {e}")
+        for ranking in rankings:
+            fused[ranking] += 1.0 / (60 + np.arange(1, len(ranking) + 1))
+
+        results = []
+        for i in np.argsort(-fused)[:k]:
+            if fused[i] <= 0:
+                break
+            results.append({**self.entries[i], "score": float(fused[i])})
+        return results
+
+_docs_index: Optional[DocsIndex] = None
+_fallback_lock = threading.Lock()
+
+def load_docs_index(encode: Optional[Callable[[List[str]], Any]] = None, directory: Path = LOGMETADATA_DIR) -> DocsIndex:
+    """Build the process-wide doc index (call once at startup)."""
+    global _docs_index
+    entries = load_logmetadata(directory)
+    _docs_index = DocsIndex(entries, encode=encode)
+    logger.info(f"Loaded {len(entries)} log message doc entries (vector search: {_docs_index.vectors is not None})")
+    return _docs_index
+
+def get_docs_index() -> DocsIndex:
+    """The process-wide doc index, built keyword-only if startup did not load it (blocking)."""
+    if _docs_index is None:
+        with _fallback_lock:
+            if _docs_index is None:
+                return load_docs_index()
+    return _docs_index
+
+def loaded_docs_index() -> Optional[DocsIndex]:
+    """The process-wide doc index if it is built, without building it."""
+    return _docs_index
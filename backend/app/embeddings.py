@@ -2,10 +2,13 @@ from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import json
+import re
 from pathlib import Path
+from .metrics import instrumented, timed
 
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
+@instrumented("build_snippets")
 def build_snippets(parsed_data):
     snippets = []
     for msg_type, msgs in parsed_data.get("messages", {}).items():
@@ -28,23 +31,28 @@ def build_snippets(parsed_data):
                 # Default handling for other message types
                 snippet = f"[{msg_type} at {time}] {msg}"
             
-            snippets.append({"text": snippet, "msg_type": msg_type, "time": time})
+            # _timestamp lets tools scope retrieval to a flight phase (see flight_phases)
+            snippets.append({"text": snippet, "msg_type": msg_type, "time": time, "_timestamp": msg.get("_timestamp")})
     return snippets
 
+@instrumented("create_embeddings")
 def create_embeddings(snippets):
     texts = [s["text"] for s in snippets]
     embeddings = model.encode(texts, show_progress_bar=True)
     return np.array(embeddings).astype("float32")
 
 def save_faiss_index(fileKey, embeddings, snippets):
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+    with timed("save_faiss_index.add"):
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
     outdir = Path("uploads/faiss_indexes")
     outdir.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(outdir / f"{fileKey}.index"))
-    with open(outdir / f"{fileKey}_snippets.json", "w") as f:
-        json.dump(snippets, f)
+    with timed("save_faiss_index.write"):
+        faiss.write_index(index, str(outdir / f"{fileKey}.index"))
+        with open(outdir / f"{fileKey}_snippets.json", "w") as f:
+            json.dump(snippets, f)
 
+@instrumented("retrieve_relevant_snippets")
 def retrieve_relevant_snippets(fileKey, question, top_k=10):
     outdir = Path("uploads/faiss_indexes")
     index = faiss.read_index(str(outdir / f"{fileKey}.index"))
@@ -54,18 +62,27 @@ def retrieve_relevant_snippets(fileKey, question, top_k=10):
     D, I = index.search(q_emb, top_k)
     return [snippets[i] for i in I[0]]
 
+# Whole words only ("min" is not "minute", "land" is not "island"); anomaly words win
+# over retrieval words, so "any GPS errors?" goes to the anomaly checks
+ANOMALY_KEYWORDS = re.compile(r"\b(" + "|".join([
+    r"anomal(y|ies|ous)", r"errors?", r"warnings?", r"problems?", r"issues?", r"fail(s|ed|ure|ures)?",
+    r"failsafes?", r"inconsistent", r"lost", r"loss", r"spikes?", r"jumps?", r"critical", r"glitch(es)?"
+]) + r")\b")
+RETRIEVAL_KEYWORDS = re.compile(r"\b(" + "|".join([
+    r"highest", r"lowest", r"altitude", r"duration", r"when did", r"max(imum)?", r"min(imum)?", r"how long",
+    r"how fast", r"how far", r"flight time", r"temperature", r"list all", r"first instance", r"rc signal",
+    r"gps", r"mid-flight", r"battery", r"speed", r"distance", r"takeoff", r"land(ed|ing)?", r"modes?",
+    r"(dis)?arm(ed|ing)?"
+]) + r")\b")
+
 def classify_query_type(question: str) -> str:
-    """Classify the user question as 'retrieval', 'anomaly_tool', or 'unknown'."""
+    """Classify the user question as 'retrieval', 'anomaly_tool', or 'unknown'.
+
+    Keyword fallback of router.QueryRouter, used when no embedding is available.
+    """
     q = question.lower()
-    # Retrieval: factual, telemetry, or data lookup
-    retrieval_keywords = [
-        "highest", "altitude", "duration", "when did", "maximum", "min", "max", "how long", "flight time", "temperature", "list all", "first instance", "rc signal", "gps", "error", "critical", "mid-flight", "battery", "speed", "distance", "takeoff", "land", "mode", "arm", "disarm"
-    ]
-    anomaly_keywords = [
-        "anomaly", "anomalies", "error", "warning", "problem", "issue", "fail", "failsafe", "inconsistent", "lost", "spike", "jump"
-    ]
-    if any(word in q for word in retrieval_keywords):
-        return "retrieval"
-    if any(word in q for word in anomaly_keywords):
+    if ANOMALY_KEYWORDS.search(q):
         return "anomaly_tool"
-    return "unknown"
\ No newline at end of file
+    if RETRIEVAL_KEYWORDS.search(q):
+        return "retrieval"
+    return "unknown"
@@ -0,0 +1,200 @@
+"""Publish/subscribe of server events (log previews, indexing progress) to websocket clients.
+
+Subscribers listen to topics: "session:<id>" for the browser session that
+started an upload, "file:<fileKey>" for everyone viewing a log. publish()
+serializes an event once and only appends it to the queues of that topic's
+subscribers; one writer task per subscriber sends its queue, so a slow
+client delays nobody else.
+
+Each queue is bounded. Progress events are coalesced: a newer progress
+event for the same log replaces the one still waiting in the queue. When a
+queue is full, the oldest progress event is dropped for a new event;
+a subscriber whose queue is full of events that cannot be dropped is
+disconnected as too slow. Heartbeats keep idle connections open through
+proxies and expose dead sockets, which are removed when a send fails or
+times out.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, Iterable, Callable, Awaitable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 256
+HEARTBEAT_S = 20.0
+SEND_TIMEOUT_S = 10.0
+
+class Subscriber:
+    """One connected client: its topics, a bounded send queue and the writer task draining it."""
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], max_queue: int = QUEUE_SIZE):
+        self.send = send
+        self.max_queue = max_queue
+        self.topics: Set[str] = set()
+        # Items are [coalesce key or None, text]; pending maps coalesce keys to their queued item
+        self.queue: deque = deque()
+        self.pending: Dict[Any, list] = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+        self.last_sent = time.monotonic()
+
+    def offer(self, text: str, key: Any = None) -> str:
+        """Queue an event; returns "queued", "coalesced", "dropped" or "overflow"."""
+        if key is not None and key in self.pending:
+            self.pending[key][1] = text
+            return "coalesced"
+        if len(self.queue) >= self.max_queue:
+            if key is not None:
+                return "dropped"
+            # Make room by dropping the oldest progress event
+            victim = next((item for item in self.queue if item[0] is not None), None)
+            if victim is None:
+                return "overflow"
+            self.queue.remove(victim)
+            del self.pending[victim[0]]
+        item = [key, text]
+        self.queue.append(item)
+        if key is not None:
+            self.pending[key] = item
+        self.ready.set()
+        return "queued"
+
+    def take(self) -> Optional[str]:
+        if not self.queue:
+            self.ready.clear()
+            return None
+        key, text = self.queue.popleft()
+        if key is not None:
+            del self.pending[key]
+        return text
+
+class EventBus:
+    """Topic-based fan-out of JSON events to subscribers with bounded, coalescing queues."""
+
+    def __init__(self, max_queue: int = QUEUE_SIZE, heartbeat_s: float = HEARTBEAT_S,
+                 send_timeout_s: float = SEND_TIMEOUT_S):
+        self.max_queue = max_queue
+        self.heartbeat_s = heartbeat_s
+        self.send_timeout_s = send_timeout_s
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self.subscribers: Set[Subscriber] = set()
+        self.stats = {"published": 0, "queued": 0, "coalesced": 0, "dropped": 0, "overflow": 0,
+                      "sent": 0, "dead": 0}
+        self.heartbeat_task: Optional[asyncio.Task] = None
+
+    def connect(self, send: Callable[[str], Awaitable[None]], topics: Iterable[str] = ()) -> Subscriber:
+        """Register a client (send is e.g. websocket.send_text) and start its writer task."""
+        subscriber = Subscriber(send, self.max_queue)
+        self.subscribers.add(subscriber)
+        for topic in topics:
+            self.subscribe(subscriber, topic)
+        subscriber.task = asyncio.ensure_future(self._writer(subscriber))
+        return subscriber
+
+    def subscribe(self, subscriber: Subscriber, topic: str) -> None:
+        if subscriber.closed:
+            return
+        subscriber.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str) -> None:
+        subscriber.topics.discard(topic)
+        members = self.topics.get(topic)
+        if members is not None:
+            members.discard(subscriber)
+            if not members:
+                del self.topics[topic]
+
+    def disconnect(self, subscriber: Subscriber) -> None:
+        """Forget a subscriber and stop its writer; safe to call more than once."""
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, topic)
+        self.subscribers.discard(subscriber)
+        subscriber.queue.clear()
+        subscriber.pending.clear()
+        subscriber.ready.set()
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+
+    def publish(self, topics: Iterable[str], event: Dict[str, Any], coalesce: bool = False) -> int:
+        """Queue an event for every subscriber of any of the topics; returns how many were reached.
+
+        With coalesce, the event replaces a queued event of the same type and
+        fileKey (progress updates), and is the first to be dropped when a
+        queue is full.
+        """
+        members: Set[Subscriber] = set()
+        for topic in topics:
+            members |= self.topics.get(topic, set())
+        if not members:
+            return 0
+        self.stats["published"] += 1
+        text = json.dumps(event)
+        key = (event.get("type"), event.get("fileKey")) if coalesce else None
+        for subscriber in members:
+            outcome = subscriber.offer(text, key)
+            self.stats[outcome] += 1
+            if outcome == "overflow":
+                logger.warning("Disconnecting a websocket subscriber that is not keeping up")
+                self.disconnect(subscriber)
+        return len(members)
+
+    async def _writer(self, subscriber: Subscriber) -> None:
+        try:
+            while not subscriber.closed:
+                await subscriber.ready.wait()
+                text = subscriber.take()
+                if text is None:
+                    continue
+                await asyncio.wait_for(subscriber.send(text), self.send_timeout_s)
+                subscriber.last_sent = time.monotonic()
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Closed socket, or a send that did not finish within send_timeout_s
+            self.stats["dead"] += 1
+            logger.info(f"Dropping websocket subscriber: {type(e).__name__} {e}")
+        finally:
+            self.disconnect(subscriber)
+
+    def heartbeat(self) -> None:
+        """Queue a heartbeat for subscribers idle for a heartbeat interval (coalesced, never piles up)."""
+        now = time.monotonic()
+        text = json.dumps({"type": "heartbeat", "time": time.time()})
+        for subscriber in list(self.subscribers):
+            if now - subscriber.last_sent >= self.heartbeat_s:
+                subscriber.offer(text, ("heartbeat", None))
+
+    async def run_heartbeats(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_s)
+            self.heartbeat()
+
+    def start(self) -> None:
+        """Send heartbeats in the background; the task is kept so close() can end it."""
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.ensure_future(self.run_heartbeats())
+
+    async def close(self) -> None:
+        """Stop the heartbeats, disconnect every subscriber and wait for their writers to finish."""
+        tasks = [s.task for s in self.subscribers if s.task is not None]
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            tasks.append(self.heartbeat_task)
+            self.heartbeat_task = None
+        for subscriber in list(self.subscribers):
+            self.disconnect(subscriber)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        queued = [len(s.queue) for s in self.subscribers]
+        return {**self.stats, "subscribers": len(self.subscribers), "topics": len(self.topics),
+                "queue_max": max(queued, default=0), "queue_total": sum(queued)}
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from functools import partial
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Named pools for blocking work, so a slow job of one kind cannot starve the
+# event loop or the other kinds:
+#   io    - index/report reads and writes (faiss.read_index, json)
+#   model - SentenceTransformer.encode and faiss searches
+#   cpu   - numpy/pure-python work on parsed logs (snippets, anomaly rules)
+#   parse - MAVLink parsing in separate processes (pure python, holds the GIL)
+# "queue" bounds the jobs waiting for a worker; callers wait beyond it.
+EXECUTOR_POOLS = {
+    "io": {"kind": "thread", "workers": int(os.getenv("IO_POOL_WORKERS", "8")), "queue": 64},
+    "model": {"kind": "thread", "workers": int(os.getenv("MODEL_POOL_WORKERS", "2")), "queue": 32},
+    "cpu": {"kind": "thread", "workers": int(os.getenv("CPU_POOL_WORKERS", "2")), "queue": 16},
+    "parse": {"kind": "process", "workers": int(os.getenv("PARSE_POOL_WORKERS", "2")), "queue": 8},
+}
+
+class BoundedExecutor:
+    """A thread or process pool with a bounded queue and per-pool metrics."""
+    def __init__(self, name: str, kind: str = "thread", workers: int = 4, queue: int = 32):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "active": 0, "waiting": 0,
+                      "wait_s": 0.0, "run_s": 0.0, "max_wait_s": 0.0}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: forking a process that already runs threads (torch, faiss) is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"{self.name}-pool")
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.capacity)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool without blocking the event loop."""
+        slots = self._get_slots()
+        queued = time.perf_counter()
+        self.stats["waiting"] += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["submitted"] += 1
+        self.stats["active"] += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._get_executor(), _timed, partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(slots, None)
+            raise
+        # The slot is held until the job really finishes, even if the caller
+        # times out and stops waiting for it
+        future.add_done_callback(partial(self._release, slots))
+        try:
+            started, result = await asyncio.shield(future)
+        except BrokenExecutor:
+            # A worker died (e.g. out of memory); start a fresh pool for the next job
+            self.stats["failed"] += 1
+            logger.error(f"Executor pool '{self.name}' is broken, recreating it")
+            self.shutdown()
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        # Wait covers the bounded queue and the executor's own queue; worker clocks
+        # are only comparable for threads
+        finished = time.perf_counter()
+        wait = max(0.0, started - queued) if self.kind == "thread" else 0.0
+        self.stats["completed"] += 1
+        self.stats["wait_s"] += wait
+        self.stats["max_wait_s"] = max(self.stats["max_wait_s"], wait)
+        self.stats["run_s"] += finished - queued - wait
+        return result
+
+    def _release(self, slots: asyncio.Semaphore, future: Optional[asyncio.Future]) -> None:
+        self.stats["active"] -= 1
+        slots.release()
+        if future is not None and not future.cancelled():
+            # Retrieved here so an abandoned job's error is not reported as unhandled
+            future.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        done = self.stats["completed"] or 1
+        return {
+            **self.stats,
+            "kind": self.kind,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "mean_wait_ms": self.stats["wait_s"] / done * 1000,
+            "mean_run_ms": self.stats["run_s"] / done * 1000,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a periodic wake-up, i.e. how long handlers block it."""
+    def __init__(self, interval: float = 0.05, window: int = 1200):
+        self.interval = interval
+        self.lags: deque = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start measuring in the background; the task is kept so stop() can end it."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """Cancel the background task and wait for it to finish."""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def metrics(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "window_max_ms": 0.0, "max_ms": 0.0}
+        return {
+            "samples": len(lags),
+            "p50_ms": lags[len(lags) // 2] * 1000,
+            "p99_ms": lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000,
+            "window_max_ms": lags[-1] * 1000,
+            "max_ms": self.max_lag * 1000,
+        }
+
+def _timed(call: Callable):
+    return time.perf_counter(), call()
+
+_pools: Dict[str, BoundedExecutor] = {}
+
+def get_pool(name: str) -> BoundedExecutor:
+    if name not in _pools:
+        config = EXECUTOR_POOLS[name]
+        _pools[name] = BoundedExecutor(name, config["kind"], config["workers"], config["queue"])
+    return _pools[name]
+
+async def run_blocking(pool: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call in the named pool (see EXECUTOR_POOLS).
+
+    Functions sent to a process pool and their arguments must be picklable.
+    """
+    return await get_pool(pool).run(fn, *args, **kwargs)
+
+def executor_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.metrics() for name, pool in _pools.items()}
+
+def shutdown_executors() -> None:
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
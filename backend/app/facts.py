@@ -0,0 +1,194 @@
+import re
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from .columns import message_columns
+from .anomalies import haversine
+from .flight_phases import MAV_MODE_FLAG_SAFETY_ARMED, vehicle_heartbeats, mode_segments
+
+# Sources for each extreme-value fact, tried in order: (msg_type, field, scale, valid_range)
+FACT_SOURCES = {
+    "max_altitude": [("GLOBAL_POSITION_INT", "relative_alt", 1e-3, None), ("CTUN", "Alt", 1.0, None), ("BARO", "Alt", 1.0, None)],
+    "max_altitude_msl": [("GLOBAL_POSITION_INT", "alt", 1e-3, None), ("VFR_HUD", "alt", 1.0, None), ("GPS", "Alt", 1.0, None)],
+    "max_groundspeed": [("VFR_HUD", "groundspeed", 1.0, None), ("GPS_RAW_INT", "vel", 1e-2, (0, 65534)), ("GPS", "Spd", 1.0, None)],
+    "max_airspeed": [("VFR_HUD", "airspeed", 1.0, None), ("ARSP", "Airspeed", 1.0, None), ("CTUN", "As", 1.0, None)],
+    "min_battery_voltage": [("SYS_STATUS", "voltage_battery", 1e-3, (1, 65534)), ("BAT", "Volt", 1.0, (0.1, 100.0))],
+    "min_battery_remaining": [("SYS_STATUS", "battery_remaining", 1.0, (0, 100)), ("BAT", "RemPct", 1.0, (0, 100))],
+    "max_temperature": [("SCALED_PRESSURE", "temperature", 1e-2, None), ("BARO", "Temp", 1.0, None)],
+    "min_satellites": [("GPS_RAW_INT", "satellites_visible", 1.0, (0, 254)), ("GPS", "NSats", 1.0, None)],
+}
+
+FACT_LABELS = {
+    "max_altitude": ("maximum altitude above home", "m"),
+    "max_altitude_msl": ("maximum altitude above sea level", "m"),
+    "max_groundspeed": ("maximum ground speed", "m/s"),
+    "max_airspeed": ("maximum airspeed", "m/s"),
+    "min_battery_voltage": ("minimum battery voltage", "V"),
+    "min_battery_remaining": ("lowest battery level", "%"),
+    "max_temperature": ("highest temperature", "°C"),
+    "min_satellites": ("fewest visible GPS satellites", ""),
+    "max_distance_from_home": ("maximum distance from the start point", "m"),
+    "flight_duration": ("log duration", "s"),
+}
+
+def _extreme(parsed_data: Dict[str, Any], sources, use_max: bool) -> Optional[Dict[str, Any]]:
+    for msg_type, field, scale, valid_range in sources:
+        cols = message_columns(parsed_data, msg_type, [field])
+        if field not in cols:
+            continue
+        values = cols[field] * scale
+        if valid_range is not None:
+            lo, hi = valid_range
+            raw = cols[field]
+            values = np.where((raw >= lo) & (raw <= hi), values, np.nan)
+        if np.all(np.isnan(values)):
+            continue
+        i = int(np.nanargmax(values) if use_max else np.nanargmin(values))
+        return {"value": float(values[i]), "timestamp": float(cols["_timestamp"][i]), "source": f"{msg_type}.{field}"}
+    return None
+
+def _arming_events(hb: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    if not hb or hb["_timestamp"].size == 0:
+        return []
+    armed = (hb["base_mode"].astype(np.int64) & MAV_MODE_FLAG_SAFETY_ARMED) != 0
+    changes = np.flatnonzero(np.diff(armed.astype(np.int8))) + 1
+    events = []
+    if armed[0]:
+        events.append({"event": "armed", "timestamp": float(hb["_timestamp"][0])})
+    for i in changes:
+        events.append({"event": "armed" if armed[i] else "disarmed", "timestamp": float(hb["_timestamp"][i])})
+    return events
+
+def _mode_timeline(parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    modes = (parsed_data.get("flight_phases") or {}).get("modes")
+    if modes is None:
+        modes = mode_segments(parsed_data)
+    return [{"mode": s["mode"], "name": s["name"], "timestamp": s["start"]} for s in modes]
+
+def _max_distance_from_home(parsed_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    cols = message_columns(parsed_data, "GLOBAL_POSITION_INT", ["lat", "lon"])
+    if "lat" not in cols:
+        return None
+    valid = (cols["lat"] != 0) | (cols["lon"] != 0)
+    if not valid.any():
+        return None
+    lat = cols["lat"][valid] * 1e-7
+    lon = cols["lon"][valid] * 1e-7
+    dist = haversine(lat[0], lon[0], lat, lon)
+    i = int(np.argmax(dist))
+    return {"value": float(dist[i]), "timestamp": float(cols["_timestamp"][valid][i]), "source": "GLOBAL_POSITION_INT.lat/lon"}
+
+def compute_flight_facts(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute the flight facts table for a parsed log.
+
+    Every numeric fact is a dict with value, timestamp (when it happened) and
+    source (message field it was taken from). Missing telemetry simply leaves
+    the fact out.
+
+    Returns:
+        Dict[str, Any]: Fact name -> fact, plus "arming_events" and "mode_timeline" lists
+    """
+    facts: Dict[str, Any] = {}
+    for name, sources in FACT_SOURCES.items():
+        fact = _extreme(parsed_data, sources, use_max=name.startswith("max_"))
+        if fact is not None:
+            facts[name] = fact
+
+    distance = _max_distance_from_home(parsed_data)
+    if distance is not None:
+        facts["max_distance_from_home"] = distance
+
+    metadata = parsed_data.get("metadata", {})
+    if metadata.get("duration") is not None:
+        facts["flight_duration"] = {
+            "value": float(metadata["duration"]),
+            "timestamp": metadata.get("first_timestamp"),
+            "source": "metadata"
+        }
+
+    facts["arming_events"] = _arming_events(vehicle_heartbeats(parsed_data))
+    facts["mode_timeline"] = _mode_timeline(parsed_data)
+    return facts
+
+# Question patterns answered directly from the facts table. Keywords may be at
+# most two words apart, and the rest of the question must be _FILLER_WORDS
+FACT_QUESTIONS: List[Tuple[str, List[str]]] = [
+    ("max_altitude_msl", [r"\b(above|sea level|msl|amsl) (\w+ ){0,2}altitude\b", r"\baltitude (\w+ ){0,2}(sea level|msl|amsl)\b"]),
+    ("max_altitude", [r"\b(max(imum)?|highest|peak|top) (\w+ ){0,2}(altitude|height)\b", r"\b(altitude|height) (\w+ ){0,2}(max(imum)?|highest|peak)\b", r"\bhow high\b"]),
+    ("flight_duration", [r"\bhow long\b", r"\bduration\b", r"\bflight time\b", r"\btotal time\b"]),
+    ("max_groundspeed", [r"\b(max(imum)?|highest|top|fastest) (\w+ ){0,2}(ground ?speed|speed)\b", r"\bhow fast\b"]),
+    ("max_airspeed", [r"\b(max(imum)?|highest|top) (\w+ ){0,2}air ?speed\b"]),
+    ("min_battery_voltage", [r"\b(min(imum)?|lowest) (\w+ ){0,2}(battery )?voltage\b", r"\bbattery (\w+ ){0,2}(min(imum)?|lowest) (\w+ ){0,2}voltage\b"]),
+    ("min_battery_remaining", [r"\b(min(imum)?|lowest) (\w+ ){0,2}battery (level|remaining|percent(age)?)\b"]),
+    ("max_temperature", [r"\b(max(imum)?|highest|peak) (\w+ ){0,2}temperature\b"]),
+    ("min_satellites", [r"\b(min(imum)?|fewest|lowest) (\w+ ){0,2}satellites?\b"]),
+    ("max_distance_from_home", [r"\b(max(imum)?|farthest|furthest|how far) (\w+ ){0,2}(distance|from home|away)\b", r"\bhow far\b"]),
+    ("arming_events", [r"\b(arm(ed|ing|s)?|disarm(ed|ing|s)?)\b"]),
+    ("mode_timeline", [r"\b(flight )?modes?\b"]),
+]
+
+# Words a fact question may have besides its keywords. Anything else ("how long did
+# the battery sag last?", "why did it fail to arm?") asks for more than a fact
+_FILLER_WORDS = {
+    "what", "which", "when", "how", "was", "were", "is", "are", "did", "does", "do", "has", "had", "there",
+    "the", "a", "an", "of", "in", "on", "at", "for", "during", "this", "that", "it", "its", "we", "i", "my",
+    "me", "tell", "show", "give", "list", "all", "any", "and", "or", "to", "from", "time", "times", "value",
+    "flight", "log", "vehicle", "drone", "aircraft", "plane", "copter", "uav", "overall", "entire", "whole",
+    "reach", "reached", "get", "got", "go", "fly", "flew", "flown", "last", "lasted", "air", "airborne",
+    "recorded", "logged", "used", "change", "changes", "changed", "switch", "switched", "events",
+    "s", "over", "ground", "remaining", "left", "count", "number", "reading", "readings", "values",
+    "meters", "metres", "m", "feet", "ft", "seconds", "minutes", "volts", "v", "percent", "kmh", "ms",
+}
+
+def _format_offset(timestamp: Optional[float], start: Optional[float]) -> str:
+    if timestamp is None or start is None:
+        return ""
+    return f" at {timestamp - start:.1f} s into the log"
+
+def _format_fact(name: str, fact: Any, start: Optional[float]) -> Optional[str]:
+    if name == "arming_events":
+        if not fact:
+            return None
+        return "Arming events: " + ", ".join(f"{e['event']}{_format_offset(e['timestamp'], start)}" for e in fact) + "."
+    if name == "mode_timeline":
+        if not fact:
+            return None
+        return "Flight mode changes: " + ", ".join(f"{e['name']}{_format_offset(e['timestamp'], start)}" for e in fact) + "."
+    label, unit = FACT_LABELS[name]
+    if name == "flight_duration":
+        minutes, seconds = divmod(fact["value"], 60)
+        return f"The {label} is {int(minutes)} min {seconds:.0f} s ({fact['value']:.1f} s)."
+    value = f"{fact['value']:.0f}" if name == "min_satellites" else f"{fact['value']:.2f}"
+    return f"The {label} was {value}{(' ' + unit) if unit else ''}{_format_offset(fact['timestamp'], start)}."
+
+def answer_from_facts(question: str, facts: Optional[Dict[str, Any]], start: Optional[float] = None) -> Optional[str]:
+    """Answer a question directly from the facts table.
+
+    Args:
+        question: The user question
+        facts: The table returned by compute_flight_facts
+        start: First timestamp of the log, used to report times as offsets
+
+    Returns:
+        Optional[str]: The answer, or None if the question does not match a known fact
+    """
+    if not facts:
+        return None
+    q = " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+    covered = [False] * len(q)
+    matched = []
+    for name, patterns in FACT_QUESTIONS:
+        if name not in facts:
+            continue
+        spans = [m.span() for p in patterns for m in re.finditer(p, q)]
+        if not spans:
+            continue
+        for begin, end in spans:
+            covered[begin:end] = [True] * (end - begin)
+        # "altitude above sea level" also matches the generic altitude patterns
+        if not (name == "max_altitude" and "max_altitude_msl" in matched):
+            matched.append(name)
+    rest = "".join(" " if c else ch for ch, c in zip(q, covered)).split()
+    if not matched or any(word not in _FILLER_WORDS for word in rest):
+        return None
+    lines = [line for line in (_format_fact(name, facts[name], start) for name in matched) if line]
+    return " ".join(lines) if lines else None
@@ -0,0 +1,284 @@
+"""Flight mode segments, flight phases and an interval index over both.
+
+Mode segments are the run-length encoded custom_mode of the vehicle's
+HEARTBEATs (MODE messages in DataFlash logs), named with pymavlink's mode
+table for the vehicle type. Phases (armed on the ground, takeoff, climb,
+cruise, descent, landing) are labelled per GLOBAL_POSITION_INT sample from
+the relative altitude, a windowed climb rate and the arming state, then
+run-length encoded. Both are stored as plain segment lists in
+parsed_data["flight_phases"] and saved next to the snippet index, so tools
+can restrict themselves to "during takeoff" or "while in AUTO" through
+FlightIndex without rescanning the telemetry.
+"""
+import json
+import logging
+import re
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from pymavlink import mavutil
+from .columns import message_columns
+
+logger = logging.getLogger(__name__)
+
+MAV_MODE_FLAG_SAFETY_ARMED = 128
+MAV_TYPE_GCS = 6
+MAV_AUTOPILOT_INVALID = 8
+# Vehicle names of DataFlash logs (mavlink_parser.FIRMWARE_VEHICLES) -> MAV_TYPE for the mode table
+DATAFLASH_MAV_TYPES = {"Fixed Wing": 1, "Quadcopter": 2, "Antenna Tracker": 5, "Ground Rover": 10, "Submarine": 12}
+
+PHASES = ("armed", "takeoff", "climb", "cruise", "descent", "landing")
+# Above this relative altitude (m) the vehicle counts as airborne
+AIRBORNE_ALT_M = 1.5
+# Takeoff lasts from leaving the ground up to this altitude; landing from below it to touchdown
+TAKEOFF_ALT_M = 10.0
+LANDING_ALT_M = 10.0
+# Climb rate (m/s) separating climb and descent from cruise, averaged over +/- RATE_WINDOW_S
+CLIMB_RATE_MS = 0.5
+RATE_WINDOW_S = 2.0
+# Phase segments shorter than this are merged into the previous one
+MIN_PHASE_S = 3.0
+
+FLIGHT_INDEX_DIR = Path("uploads/faiss_indexes")
+
+def vehicle_heartbeats(parsed_data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """HEARTBEAT columns without the ground station's own heartbeats."""
+    cols = message_columns(parsed_data, "HEARTBEAT", ["type", "autopilot", "base_mode", "custom_mode"])
+    if "base_mode" not in cols:
+        return {}
+    keep = np.ones(cols["_timestamp"].shape, dtype=bool)
+    if "type" in cols:
+        keep &= cols["type"] != MAV_TYPE_GCS
+    if "autopilot" in cols:
+        keep &= cols["autopilot"] != MAV_AUTOPILOT_INVALID
+    return {name: values[keep] for name, values in cols.items()}
+
+def mode_name(mav_type: Optional[int], mode: int) -> str:
+    """Name of a custom_mode for a MAV_TYPE (e.g. 10 on a plane is "AUTO"), "MODE <n>" if unknown."""
+    mapping = mavutil.mode_mapping_bynumber(mav_type) if mav_type is not None else None
+    return (mapping or {}).get(mode, f"MODE {mode}")
+
+def _run_starts(values: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+
+def mode_segments(parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flight mode changes as segments: mode number, name, start and end timestamps."""
+    hb = vehicle_heartbeats(parsed_data)
+    if hb and "custom_mode" in hb and hb["_timestamp"].size:
+        t, modes = hb["_timestamp"], hb["custom_mode"]
+        mav_type = int(hb["type"][0]) if "type" in hb else None
+    else:
+        cols = message_columns(parsed_data, "MODE", ["ModeNum", "Mode"])
+        field = "ModeNum" if "ModeNum" in cols else "Mode"
+        if field not in cols or not cols["_timestamp"].size:
+            return []
+        t, modes = cols["_timestamp"], cols[field]
+        mav_type = DATAFLASH_MAV_TYPES.get(parsed_data.get("vehicle_type"))
+    starts = _run_starts(modes)
+    ends = np.append(t[starts[1:]], max(t[-1], parsed_data.get("metadata", {}).get("last_timestamp") or t[-1]))
+    return [{"mode": int(modes[i]), "name": mode_name(mav_type, int(modes[i])), "start": float(t[i]), "end": float(end)}
+            for i, end in zip(starts, ends)]
+
+def _armed_at(parsed_data: Dict[str, Any], t: np.ndarray) -> Optional[np.ndarray]:
+    hb = vehicle_heartbeats(parsed_data)
+    if not hb or not hb["_timestamp"].size:
+        return None
+    armed = (hb["base_mode"].astype(np.int64) & MAV_MODE_FLAG_SAFETY_ARMED) != 0
+    i = np.searchsorted(hb["_timestamp"], t, side="right") - 1
+    return np.where(i >= 0, armed[np.maximum(i, 0)], False)
+
+def phase_labels(t: np.ndarray, alt: np.ndarray, armed: Optional[np.ndarray] = None) -> np.ndarray:
+    """Phase name per sample ("" for disarmed on the ground) from time (s) and relative altitude (m)."""
+    n = t.size
+    idx = np.arange(n)
+    # Climb rate over a window of +/- RATE_WINDOW_S
+    lo = np.searchsorted(t, t - RATE_WINDOW_S, side="left")
+    hi = np.searchsorted(t, t + RATE_WINDOW_S, side="right") - 1
+    span = t[hi] - t[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(span > 0, (alt[hi] - alt[lo]) / span, 0.0)
+
+    airborne = alt > AIRBORNE_ALT_M
+    if armed is None:
+        armed = np.ones(n, dtype=bool)
+    # Takeoff: left the ground more recently than the vehicle was last above TAKEOFF_ALT_M
+    last_ground = np.maximum.accumulate(np.where(~airborne, idx, -1))
+    last_high = np.maximum.accumulate(np.where(alt >= TAKEOFF_ALT_M, idx, -1))
+    takeoff = airborne & (alt < TAKEOFF_ALT_M) & (last_ground > last_high) & (last_ground >= 0)
+    # Landing: touches down before climbing back above LANDING_ALT_M
+    next_ground = np.minimum.accumulate(np.where(~airborne, idx, n)[::-1])[::-1]
+    next_high = np.minimum.accumulate(np.where(alt >= LANDING_ALT_M, idx, n)[::-1])[::-1]
+    landing = airborne & (alt < LANDING_ALT_M) & (next_ground < next_high) & (next_ground < n)
+    # Low hops are both: the climbing part is takeoff, the rest landing
+    landing &= ~(takeoff & (rate > 0))
+    takeoff &= ~landing
+
+    labels = np.full(n, "cruise", dtype=object)
+    labels[rate > CLIMB_RATE_MS] = "climb"
+    labels[rate < -CLIMB_RATE_MS] = "descent"
+    labels[takeoff] = "takeoff"
+    labels[landing] = "landing"
+    labels[~airborne] = np.where(armed[~airborne], "armed", "")
+    return labels
+
+def phase_segments(parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flight phases as segments (phase, start, end), short flickers merged into their predecessor."""
+    cols = message_columns(parsed_data, "GLOBAL_POSITION_INT", ["relative_alt"])
+    if "relative_alt" not in cols or not cols["_timestamp"].size:
+        return []
+    t = cols["_timestamp"]
+    order = np.argsort(t, kind="stable")
+    t, alt = t[order], cols["relative_alt"][order] * 1e-3
+    labels = phase_labels(t, alt, _armed_at(parsed_data, t))
+
+    starts = _run_starts(labels)
+    ends = np.append(t[starts[1:]], t[-1])
+    segments: List[Dict[str, Any]] = []
+    for i, end in zip(starts, ends):
+        segment = {"phase": labels[i], "start": float(t[i]), "end": float(end)}
+        if segments and (segment["end"] - segment["start"] < MIN_PHASE_S or segments[-1]["phase"] == segment["phase"]):
+            segments[-1]["end"] = segment["end"]
+        else:
+            segments.append(segment)
+    # A merged flicker can leave two neighbours with the same phase
+    merged = []
+    for segment in segments:
+        if merged and merged[-1]["phase"] == segment["phase"]:
+            merged[-1]["end"] = segment["end"]
+        else:
+            merged.append(segment)
+    return [s for s in merged if s["phase"]]
+
+def build_flight_phases(parsed_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """{"modes": mode_segments, "phases": phase_segments} of a parsed log."""
+    return {"modes": mode_segments(parsed_data), "phases": phase_segments(parsed_data)}
+
+class FlightIndex:
+    """Interval index over mode and phase segments.
+
+    Segments are kept sorted by start with a running maximum of their ends:
+    the segments overlapping [start, end] are found with two binary searches
+    (O(log n + k)), as an interval tree would, without building one. Each
+    label also keeps its own sorted start/end arrays for vectorized membership
+    tests of many timestamps, per kind: the phase "takeoff" and ArduPlane's
+    TAKEOFF mode are separate scopes, "phase:takeoff" and "mode:takeoff".
+    """
+
+    def __init__(self, flight_phases: Dict[str, List[Dict[str, Any]]]):
+        entries = [(s["start"], s["end"], "phase", s["phase"]) for s in flight_phases.get("phases", [])]
+        entries += [(s["start"], s["end"], "mode", s["name"]) for s in flight_phases.get("modes", [])]
+        entries.sort()
+        self.entries = entries
+        self._starts = np.array([e[0] for e in entries], dtype=np.float64)
+        self._max_ends = np.maximum.accumulate(np.array([e[1] for e in entries], dtype=np.float64)) \
+            if entries else np.empty(0)
+        self._labels: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        for kind, label in {(e[2], e[3].lower()) for e in entries}:
+            spans = np.array([(e[0], e[1]) for e in entries if e[2] == kind and e[3].lower() == label],
+                             dtype=np.float64)
+            self._labels[(kind, label)] = (spans[:, 0], spans[:, 1])
+
+    def scopes(self) -> List[str]:
+        """Scopes of the log, e.g. ["mode:auto", "phase:takeoff"]."""
+        return sorted(f"{kind}:{label}" for kind, label in self._labels)
+
+    def has(self, scope: str) -> bool:
+        """Whether the log has a scope ("phase:takeoff", "mode:AUTO", or a bare label of either kind)."""
+        return bool(self._spans(scope)[0].size)
+
+    def _spans(self, scope: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted, disjoint (starts, ends) of a scope; a bare label merges the spans of both kinds."""
+        kind, _, label = scope.rpartition(":")
+        spans = [self._labels[(k, label.lower())] for k in ((kind,) if kind else ("phase", "mode"))
+                 if (k, label.lower()) in self._labels]
+        if not spans:
+            return np.empty(0), np.empty(0)
+        if len(spans) == 1:
+            return spans[0]
+        starts, ends = np.concatenate([s for s, _ in spans]), np.concatenate([e for _, e in spans])
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        first = np.concatenate(([True], starts[1:] > np.maximum.accumulate(ends)[:-1]))
+        return starts[first], np.maximum.reduceat(ends, np.flatnonzero(first))
+
+    def overlapping(self, start: float, end: float) -> List[Tuple[float, float, str, str]]:
+        """(start, end, kind, label) of the segments overlapping [start, end]."""
+        hi = np.searchsorted(self._starts, end, side="right")
+        lo = np.searchsorted(self._max_ends, start, side="left")
+        return [e for e in self.entries[lo:hi] if e[1] >= start]
+
+    def at(self, timestamp: float) -> Dict[str, str]:
+        """Phase and mode at a timestamp, e.g. {"phase": "cruise", "mode": "AUTO"}."""
+        return {kind: label for _, _, kind, label in self.overlapping(timestamp, timestamp)}
+
+    def intervals(self, scope: str) -> List[Tuple[float, float]]:
+        """(start, end) of a scope ("phase:takeoff", "mode:AUTO", or a bare label of either kind)."""
+        starts, ends = self._spans(scope)
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def mask(self, timestamps, scope: str) -> np.ndarray:
+        """Which timestamps fall inside a scope (see intervals)."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        starts, ends = self._spans(scope)
+        if not starts.size:
+            return np.zeros(timestamps.shape, dtype=bool)
+        i = np.searchsorted(starts, timestamps, side="right") - 1
+        return (i >= 0) & (timestamps <= ends[np.maximum(i, 0)])
+
+def save_flight_index(fileKey: str, parsed_data: Dict[str, Any]) -> None:
+    FLIGHT_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    flight_phases = parsed_data.get("flight_phases") or build_flight_phases(parsed_data)
+    with open(FLIGHT_INDEX_DIR / f"{fileKey}_phases.json", "w") as f:
+        json.dump(flight_phases, f)
+
+def load_flight_index(fileKey: str) -> Optional[FlightIndex]:
+    """FlightIndex saved at ingestion, or None if there is none on disk."""
+    path = FLIGHT_INDEX_DIR / f"{fileKey}_phases.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return FlightIndex(json.load(f))
+
+def _all_mode_names() -> List[str]:
+    names = set()
+    for mav_type in range(30):
+        names.update((mavutil.mode_mapping_bynumber(mav_type) or {}).values())
+    return sorted(names, key=len, reverse=True)
+
+_PHASE_NAMES = [*PHASES, "take-off", "take off", "land(?:ing)?", "climb(?:ing)?", "descen(?:t|ding)"]
+_MODE_NAMES = [re.escape(n).replace("_", "[_ ]") for n in _all_mode_names()]
+# Phases after "during/while/in/at/on" unless followed by "mode" ("in TAKEOFF mode" is
+# ArduPlane's mode); mode names only after "during"/"while (in)" or before "mode", since
+# many of them are plain words ("in simple terms", "in position")
+_SCOPE = re.compile(
+    r"\b(?:during|while(?: in)?|in|at|on)\s+(?:the\s+)?(?:flight\s+)?(?P<phase>" + "|".join(_PHASE_NAMES) + r")\b(?!\s+mode\b)"
+    r"|\b(?:during|while(?: in)?)\s+(?:the\s+)?(?P<mode>" + "|".join(_MODE_NAMES) + r")\b(?!-)"
+    r"|\b(?P<named>" + "|".join(_MODE_NAMES) + r")\s+(?:mode|phase)\b",
+    re.IGNORECASE)
+_PHASE_WORDS = {"take-off": "takeoff", "take off": "takeoff", "land": "landing", "climbing": "climb",
+                "descending": "descent"}
+
+def scope_from_question(question: str, scopes: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Phase or mode a question restricts itself to, e.g. "phase:takeoff" or "mode:AUTO" ("while in AUTO").
+
+    "during takeoff" is the phase, "in TAKEOFF mode" the mode (ArduPlane's custom_mode 13).
+
+    Args:
+        question: The user question
+        scopes: Scopes of the log (FlightIndex.scopes()); when given, scopes the log
+            does not have are skipped
+
+    Returns:
+        Optional[str]: The scope, or None if the question names none
+    """
+    allowed = {scope.lower() for scope in scopes} if scopes is not None else None
+    for match in _SCOPE.finditer(question):
+        word = match.group("phase")
+        if word is not None:
+            word = word.lower()
+            scope = f"phase:{_PHASE_WORDS.get(word, word)}"
+        else:
+            scope = "mode:" + (match.group("mode") or match.group("named")).upper().replace(" ", "_")
+        if allowed is None or scope.lower() in allowed:
+            return scope
+    return None
@@ -0,0 +1,305 @@
+import ast
+import logging
+import math
+import threading
+import xml.etree.ElementTree as ET
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from .alignment import asof
+from .columns import message_columns
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = Path(__file__).resolve().parents[2] / "src" / "assets"
+# Same files, in the same order, as SideBarMessageMenu.loadXmlPresets; later files override
+GRAPH_FILES = ["mavgraphs.xml", "mavgraphs2.xml", "ekfGraphs.xml", "ekf3Graphs.xml"]
+
+# Instance number fields of multi-instance DataFlash messages (GPS[0], IMU[1], ...)
+INSTANCE_FIELDS = ("I", "Instance", "C", "IMU")
+
+def load_graphs(directory: Path = ASSETS_DIR, files: List[str] = GRAPH_FILES) -> Dict[str, Dict[str, Any]]:
+    """Read the predefined graphs.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Graph name -> {"description", "expressions"}; each
+        expression is a list of terms, alternatives for different log formats
+    """
+    graphs = {}
+    for name in files:
+        path = directory / name
+        if not path.exists():
+            logger.warning(f"Graph definitions not found: {path}")
+            continue
+        for graph in ET.parse(path).getroot().iter("graph"):
+            graphs[graph.get("name")] = {
+                "description": " ".join((graph.findtext("description") or "").split()),
+                "expressions": [e.text.split() for e in graph.iter("expression") if e.text and e.text.strip()],
+            }
+    return graphs
+
+def lowpass(x: np.ndarray, alpha: float) -> np.ndarray:
+    """First-order IIR low-pass y[i] = alpha*y[i-1] + (1-alpha)*x[i], y[0] = x[0], vectorized per block.
+
+    Within a block y[j] = alpha^(j+1) y_prev + (1-alpha) alpha^j sum_k<=j x[k] alpha^-k; the block
+    size keeps alpha^-k below e^300 (about 1e130), so x[k] alpha^-k stays finite for any
+    realistic sample value and alpha close to 1 still gets the full block.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if x.size == 0 or alpha <= 0:
+        return x.copy()
+    if alpha >= 1:
+        return np.full_like(x, x[0])
+    block = int(min(4096, max(1, 300 / -math.log(alpha))))
+    y = np.empty_like(x)
+    prev = x[0]
+    for start in range(0, x.size, block):
+        chunk = x[start:start + block]
+        j = np.arange(chunk.size)
+        powers = alpha ** j
+        y[start:start + block] = alpha * powers * prev + (1 - alpha) * powers * np.cumsum(chunk / powers)
+        prev = y[start + chunk.size - 1]
+    return y
+
+def _diff(x: np.ndarray) -> np.ndarray:
+    return np.diff(x, prepend=x[:1]) if x.size else x
+
+def _min(*args):
+    return args[0] if len(args) == 1 else np.minimum(args[0], args[1])
+
+def _max(*args):
+    return args[0] if len(args) == 1 else np.maximum(args[0], args[1])
+
+# Elementwise functions of mavgraphs expressions. Key arguments of lowpass/diff
+# ("gy", 0) only name MAVExplorer's filter state and are ignored.
+FUNCTIONS = {
+    "sqrt": np.sqrt,
+    "degrees": np.degrees,
+    "radians": np.radians,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "abs": np.abs,
+    "pow": np.power,
+    "min": _min,
+    "max": _max,
+    "lowpass": lambda x, key, alpha: lowpass(x, float(alpha)),
+    "diff": lambda x, key=None: _diff(x),
+}
+
+_BINARY_OPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+    ast.Div: np.divide, ast.Pow: np.power, ast.Mod: np.mod,
+}
+
+class UnsupportedExpression(ValueError):
+    pass
+
+def parse_term(term: str) -> Tuple[ast.Expression, int]:
+    """Parse one graph term, e.g. "CTUN.As*CTUN.E2T" or "BARO.Temp:2", into (ast, axis)."""
+    axis = 1
+    if term.endswith(":2"):
+        term, axis = term[:-2], 2
+    try:
+        tree = ast.parse(term, mode="eval")
+    except SyntaxError as e:
+        raise UnsupportedExpression(f"cannot parse {term!r}: {e.msg}")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                name = node.func.id if isinstance(node.func, ast.Name) else ast.dump(node.func)
+                raise UnsupportedExpression(f"unsupported function {name}()")
+        elif not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Attribute, ast.Subscript,
+                                   ast.Name, ast.Constant, ast.Load, ast.USub, ast.UAdd, *_BINARY_OPS)):
+            raise UnsupportedExpression(f"unsupported syntax {type(node).__name__} in {term!r}")
+    return tree, axis
+
+def _field_ref(node: ast.AST) -> Optional[Tuple[str, Optional[int], str]]:
+    """(message type, instance, field) for MSG.Field / MSG[i].Field nodes."""
+    if not isinstance(node, ast.Attribute):
+        return None
+    target = node.value
+    if isinstance(target, ast.Name):
+        return target.id, None, node.attr
+    if (isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name)
+            and isinstance(target.slice, ast.Constant) and isinstance(target.slice.value, int)):
+        return target.value.id, target.slice.value, node.attr
+    return None
+
+def field_refs(tree: ast.AST) -> List[Tuple[str, Optional[int], str]]:
+    """Message fields referenced by a term, in source order."""
+    nodes = sorted((n for n in ast.walk(tree) if _field_ref(n) is not None), key=lambda n: (n.lineno, n.col_offset))
+    return [_field_ref(n) for n in nodes]
+
+def _resolve_field(parsed_data: Dict[str, Any], msg_type: str, field: str) -> str:
+    # Some graph definitions get the case wrong (ATTITUDE.Pitch)
+    msgs = parsed_data.get("messages", {}).get(msg_type) or [{}]
+    if field in msgs[0]:
+        return field
+    return next((name for name in msgs[0] if name.lower() == field.lower()), field)
+
+def _instance_columns(parsed_data: Dict[str, Any], msg_type: str, instance: Optional[int], field: str) -> Dict[str, np.ndarray]:
+    if instance is not None and parsed_data.get("messages", {}).get(f"{msg_type}[{instance}]"):
+        msg_type = f"{msg_type}[{instance}]"
+        resolved = _resolve_field(parsed_data, msg_type, field)
+        cols = message_columns(parsed_data, msg_type, [resolved])
+        return {field if k == resolved else k: v for k, v in cols.items()}
+    resolved = _resolve_field(parsed_data, msg_type, field)
+    cols = message_columns(parsed_data, msg_type, [resolved, *INSTANCE_FIELDS])
+    cols = {field if k == resolved else k: v for k, v in cols.items()}
+    if instance is None or field not in cols:
+        return cols
+    for name in INSTANCE_FIELDS:
+        if name in cols:
+            keep = cols[name] == instance
+            return {k: v[keep] for k, v in cols.items()}
+    # Single-instance log: [0] is the only instance
+    return cols if instance == 0 else {}
+
+def evaluate_term(parsed_data: Dict[str, Any], tree: ast.Expression) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate a parsed term over the log's columns.
+
+    The first referenced message type provides the time base; other message
+    types are sampled as-of each base timestamp (their latest value so far),
+    the way MAVExplorer evaluates expressions as messages arrive.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (timestamps, values)
+    """
+    refs = field_refs(tree)
+    if not refs:
+        raise UnsupportedExpression("expression references no message field")
+    series = {}
+    for ref in dict.fromkeys(refs):
+        cols = _instance_columns(parsed_data, *ref)
+        if ref[2] not in cols or cols[ref[2]].size == 0:
+            raise KeyError(f"{ref[0]}{'' if ref[1] is None else f'[{ref[1]}]'}.{ref[2]} not in log")
+        series[ref] = (cols["_timestamp"], cols[ref[2]])
+    base_t = series[refs[0]][0]
+
+    def value(ref):
+        t, v = series[ref]
+        if t is base_t or (t.size == base_t.size and ref[:2] == refs[0][:2]):
+            return v
+        return asof(t, v, base_t)
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant):
+            return node.value
+        ref = _field_ref(node)
+        if ref is not None:
+            return value(ref)
+        if isinstance(node, ast.BinOp):
+            return _BINARY_OPS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp):
+            operand = visit(node.operand)
+            return -operand if isinstance(node.op, ast.USub) else operand
+        if isinstance(node, ast.Call):
+            return FUNCTIONS[node.func.id](*[visit(a) for a in node.args])
+        raise UnsupportedExpression(f"unsupported syntax {type(node).__name__}")
+
+    with np.errstate(all="ignore"):
+        values = np.broadcast_to(np.asarray(visit(tree), dtype=np.float64), base_t.shape)
+    return base_t, np.where(np.isfinite(values), values, np.nan)
+
+def downsample_minmax(t: np.ndarray, y: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the min and max of each bucket (in time order), so spikes survive downsampling."""
+    n = t.size
+    if n <= max_points:
+        return t, y
+    buckets = max(1, max_points // 2)
+    size = math.ceil(n / buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    valid = ~np.all(np.isnan(rows), axis=1)
+    filled_min = np.where(np.isnan(rows), np.inf, rows)
+    filled_max = np.where(np.isnan(rows), -np.inf, rows)
+    lo = np.argmin(filled_min, axis=1) + np.arange(buckets) * size
+    hi = np.argmax(filled_max, axis=1) + np.arange(buckets) * size
+    idx = np.sort(np.unique(np.concatenate([lo[valid], hi[valid]])))
+    idx = idx[idx < n]
+    return t[idx], y[idx]
+
+def _present(parsed_data: Dict[str, Any], msg_type: str, instance: Optional[int]) -> bool:
+    messages = parsed_data.get("messages", {})
+    return bool(messages.get(msg_type) or (instance is not None and messages.get(f"{msg_type}[{instance}]")))
+
+class GraphEngine:
+    """Evaluates predefined graphs over parsed logs, caching the downsampled series per fileKey/graph."""
+    def __init__(self, graphs: Optional[Dict[str, Dict[str, Any]]] = None, max_entries: int = 256):
+        self.graphs = graphs if graphs is not None else load_graphs()
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _choose_expression(self, parsed_data: Dict[str, Any], expressions: List[List[str]]) -> List[str]:
+        """First alternative whose message types are all in the log, else the best covered one."""
+        best, best_score = expressions[0] if expressions else [], -1.0
+        for terms in expressions:
+            refs = []
+            for term in terms:
+                try:
+                    refs += field_refs(parse_term(term)[0])
+                except UnsupportedExpression:
+                    continue
+            if not refs:
+                continue
+            score = sum(_present(parsed_data, r[0], r[1]) for r in refs) / len(refs)
+            if score == 1.0:
+                return terms
+            if score > best_score:
+                best, best_score = terms, score
+        return best
+
+    def evaluate(self, parsed_data: Dict[str, Any], name: str, max_points: int = 2000) -> Dict[str, Any]:
+        """Evaluate a graph (uncached).
+
+        Returns:
+            Dict[str, Any]: name, description, expression and series (term, axis, t, y),
+            plus skipped terms with the reason
+        """
+        graph = self.graphs[name]
+        terms = self._choose_expression(parsed_data, graph["expressions"])
+        series, skipped = [], []
+        for term in terms:
+            try:
+                tree, axis = parse_term(term)
+                t, y = evaluate_term(parsed_data, tree)
+            except (UnsupportedExpression, KeyError) as e:
+                skipped.append({"term": term, "reason": str(e).strip("'\"")})
+                continue
+            t, y = downsample_minmax(t, y, max_points)
+            series.append({
+                "term": term.replace(":2", ""),
+                "axis": axis,
+                "t": t.tolist(),
+                "y": [None if math.isnan(v) else v for v in y.tolist()],
+            })
+        return {"name": name, "description": graph["description"], "expression": " ".join(terms),
+                "series": series, "skipped": skipped}
+
+    def series(self, fileKey: str, parsed_data: Dict[str, Any], name: str, max_points: int = 2000) -> Dict[str, Any]:
+        """Evaluate a graph for a log, cached per fileKey/graph/max_points."""
+        key = (fileKey, name, max_points)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._cache[key]
+            self.stats["misses"] += 1
+        result = self.evaluate(parsed_data, name, max_points)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def invalidate(self, fileKey: str) -> None:
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == fileKey]:
+                del self._cache[key]
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Callable, Awaitable, Set
+
+logger = logging.getLogger(__name__)
+
+# Marker of the flight log context message main.chat adds to the history
+FLIGHT_LOG_CONTEXT = "Flight log loaded successfully"
+
+SUMMARY_PROMPT = """Summarize this conversation between a user and a UAV flight-log assistant in at most {max_words} words.
+Keep every number, timestamp, flight event and open question; drop greetings and filler.
+
+{previous}{turns}"""
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return max(1, len(text) // 4) if text else 0
+
+def _render(turns: List[Dict[str, str]]) -> str:
+    return "".join(f"{t.get('role', 'user')}: {t.get('content', '')}\n" for t in turns)
+
+class ChatHistoryManager:
+    """Keeps the chat history sent to the LLM within a token budget.
+
+    The most recent turns are kept verbatim; older turns are replaced by a
+    rolling summary. Summaries are cached by a hash of the turns they cover, so
+    each new turn only summarizes the turns that just fell out of the window,
+    on top of the previous summary. The optional LLM ``summarizer`` runs in the
+    background; until it finishes an extractive summary stands in.
+    """
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        keep_recent: int = 6,
+        summarizer: Optional[Callable[[str], Awaitable[str]]] = None,
+        summary_words: int = 120,
+        cache_size: int = 256
+    ):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self.summary_words = summary_words
+        self.cache_size = cache_size
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def dedupe_context(history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Keep only the latest flight log context message, moved to the front."""
+        context = [t for t in history if FLIGHT_LOG_CONTEXT in t.get("content", "")]
+        rest = [t for t in history if FLIGHT_LOG_CONTEXT not in t.get("content", "")]
+        return context[-1:] + rest
+
+    @staticmethod
+    def _prefix_hashes(turns: List[Dict[str, str]]) -> List[str]:
+        hashes, h = [], hashlib.sha1()
+        for t in turns:
+            h.update(f"{t.get('role', '')}\x00{t.get('content', '')}\x01".encode("utf-8"))
+            hashes.append(h.copy().hexdigest())
+        return hashes
+
+    def _remember(self, key: str, summary: str) -> None:
+        self._summaries[key] = summary[: self.summary_words * 8]
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    def _extractive(self, previous: str, turns: List[Dict[str, str]]) -> str:
+        """Fallback summary: the first sentence of each turn, newest kept when too long."""
+        parts = [previous] if previous else []
+        parts += [f"{t.get('role', 'user')}: {t.get('content', '').split('. ')[0][:160]}" for t in turns]
+        return " | ".join(parts)[-self.summary_words * 8:]
+
+    async def _llm_summary(self, key: str, previous: str, turns: List[Dict[str, str]]) -> None:
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_words,
+            previous=f"Summary so far: {previous}\n\nNew turns:\n" if previous else "",
+            turns=_render(turns)
+        )
+        try:
+            summary = (await self.summarizer(prompt)).strip()
+            if summary:
+                self._remember(key, summary)
+        except Exception as e:
+            logger.warning(f"History summarization failed, keeping the extractive summary: {e}")
+
+    def _summarize(self, older: List[Dict[str, str]]) -> str:
+        hashes = self._prefix_hashes(older)
+        if hashes[-1] in self._summaries:
+            self._summaries.move_to_end(hashes[-1])
+            return self._summaries[hashes[-1]]
+
+        # Roll forward from the longest prefix that is already summarized
+        start, previous = 0, ""
+        for i in range(len(hashes) - 2, -1, -1):
+            if hashes[i] in self._summaries:
+                start, previous = i + 1, self._summaries[hashes[i]]
+                break
+
+        # Answer now with an extractive summary and refine it with the LLM in
+        # the background, so compaction never adds a serial LLM call to a turn
+        summary = self._extractive(previous, older[start:])
+        self._remember(hashes[-1], summary)
+        if self.summarizer is not None:
+            task = asyncio.ensure_future(self._llm_summary(hashes[-1], previous, older[start:]))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        return self._summaries[hashes[-1]]
+
+    async def wait_pending(self) -> None:
+        """Wait for background summaries to finish (used by tests and shutdown)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    async def compact(self, history: Optional[List[Dict[str, str]]], reserved_tokens: int = 0) -> List[Dict[str, str]]:
+        """Return the history to send to the LLM.
+
+        Args:
+            history: Chat history as sent by the client
+            reserved_tokens: Tokens already taken by the rest of the prompt
+
+        Returns:
+            List[Dict[str, str]]: Context message, optional summary message, recent turns
+        """
+        history = self.dedupe_context(history or [])
+        context = history[:1] if history and FLIGHT_LOG_CONTEXT in history[0].get("content", "") else []
+        turns = history[len(context):]
+
+        budget = self.token_budget - reserved_tokens - sum(estimate_tokens(t.get("content", "")) for t in context)
+        recent: List[Dict[str, str]] = []
+        used = 0
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn.get("content", ""))
+            if len(recent) >= self.keep_recent or (recent and used + cost > budget):
+                break
+            recent.insert(0, turn)
+            used += cost
+
+        older = turns[: len(turns) - len(recent)]
+        if not older:
+            return context + recent
+        summary = self._summarize(older)
+        return context + [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] + recent
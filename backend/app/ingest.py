@@ -0,0 +1,271 @@
+"""Bulk offline ingestion of flight logs.
+
+Walks directories or globs of .tlog/.bin files and runs the same pipeline as
+an upload (parse, snippets, embeddings, FAISS index, anomaly report, position
+track and the Parquet copy) across a process pool. Files already ingested, by content hash,
+are skipped. Run from the backend directory:
+
+    python -m app.ingest /data/flights "/archive/**/*.bin" --workers 4 --report ingest_report.json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+LOG_SUFFIXES = {".tlog", ".bin"}
+REGISTRY_PATH = Path("uploads/ingested.json")
+FAISS_DIR = Path("uploads/faiss_indexes")
+
+def discover_logs(inputs: Iterable[str]) -> List[Path]:
+    """Log files under directories, matching globs, or given directly; sorted and deduplicated.
+
+    zstd compressed logs (.tlog.zst, .bin.zst) are included and decompressed while parsing.
+    """
+    from .storage import log_suffix  # storage imports the registry from here
+    found = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = path.rglob("*")
+        elif any(c in item for c in "*?["):
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        else:
+            candidates = [path]
+        found += [p for p in candidates if p.is_file() and log_suffix(p) in LOG_SUFFIXES]
+    return sorted(set(p.resolve() for p in found))
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class IngestRegistry:
+    """Content hash -> ingested fileKey, persisted as JSON next to the indexes."""
+    def __init__(self, path: Path = REGISTRY_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def is_ingested(self, digest: str) -> bool:
+        entry = self.entries.get(digest)
+        return entry is not None and (FAISS_DIR / f"{entry['fileKey']}.index").exists()
+
+    def record(self, digest: str, entry: Dict[str, Any]) -> None:
+        self.entries[digest] = entry
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.path)
+
+def index_parsed_log(file_key: str, parsed_data: Dict[str, Any], timings: Optional[Dict[str, float]] = None) -> None:
+    """Build the snippet index, anomaly report, position track, phase index and Parquet copy of a parsed log (blocking).
+
+    The async equivalent used by the API is main.build_log_index, which runs
+    each stage in its executor pool.
+    """
+    # Imported here: loading the embedding model is only worth it in the workers
+    from .embeddings import build_snippets, create_embeddings, save_faiss_index
+    from .anomalies import collect_anomalies, save_anomaly_report
+    from .parquet_store import parquet_available, export_parsed_log
+    from .spatial import save_track
+    from .flight_phases import save_flight_index
+
+    timings = timings if timings is not None else {}
+
+    def stage(name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - started
+        return result
+
+    snippets = stage("snippets", build_snippets, parsed_data)
+    embeddings = stage("embeddings", create_embeddings, snippets)
+    stage("faiss", save_faiss_index, file_key, embeddings, snippets)
+    anomalies = stage("anomalies", collect_anomalies, parsed_data)
+    stage("anomaly_report", save_anomaly_report, file_key, anomalies)
+    stage("track", save_track, file_key, parsed_data)
+    stage("phases", save_flight_index, file_key, parsed_data)
+    if parquet_available():
+        stage("parquet", export_parsed_log, file_key, parsed_data)
+
+def ingest_file(path: str, file_key: str) -> Dict[str, Any]:
+    """Parse and index one log (runs in a worker process).
+
+    Returns:
+        Dict[str, Any]: fileKey, message count, vehicle type, stage timings and
+        the worker's peak RSS in MB
+    """
+    from .mavlink_parser import parse_log
+
+    timings = {}
+    started = time.perf_counter()
+    parsed_data = parse_log(path)
+    timings["parse"] = time.perf_counter() - started
+    index_parsed_log(file_key, parsed_data, timings)
+    return {
+        "fileKey": file_key,
+        "messages": parsed_data["metadata"].get("message_count", 0),
+        "vehicle_type": parsed_data.get("vehicle_type"),
+        "timings": timings,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _init_worker(memory_limit_mb: Optional[int]) -> None:
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if memory_limit_mb:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        # A worker over the limit fails its file with MemoryError instead of taking the host down
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _new_pool(workers: int, max_tasks_per_child: Optional[int], memory_limit_mb: Optional[int]) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(memory_limit_mb,),
+        max_tasks_per_child=max_tasks_per_child,
+    )
+
+def run_batch(
+    paths: List[Path],
+    workers: int = 2,
+    max_tasks_per_child: Optional[int] = 20,
+    memory_limit_mb: Optional[int] = None,
+    force: bool = False,
+    registry: Optional[IngestRegistry] = None,
+    ingest: Callable[[str, str], Dict[str, Any]] = ingest_file
+) -> Dict[str, Any]:
+    """Ingest logs across a process pool.
+
+    Workers are recycled after max_tasks_per_child files so memory held by
+    the parser and model cannot grow without bound. At most 2 x workers files
+    are in flight. If a worker dies (e.g. killed for memory), its files are
+    reported as failed and the pool is recreated for the rest.
+
+    Args:
+        paths: Log files
+        workers: Worker processes
+        max_tasks_per_child: Files per worker before it is replaced (None: never)
+        memory_limit_mb: Address-space limit per worker (None: unlimited)
+        force: Re-ingest files whose content hash is already registered
+        registry: Content hash registry (default: uploads/ingested.json)
+        ingest: Worker function taking (path, fileKey)
+
+    Returns:
+        Dict[str, Any]: Totals, throughput in files/s and MB/s, per-stage seconds and per-file results
+    """
+    registry = registry if registry is not None else IngestRegistry()
+    report = {"files": len(paths), "ingested": 0, "skipped": 0, "failed": 0, "bytes": 0,
+              "stage_s": {}, "results": []}
+    started = time.perf_counter()
+    pool = _new_pool(workers, max_tasks_per_child, memory_limit_mb)
+    pending: Dict[Any, Dict[str, Any]] = {}
+    queued = set()
+    todo = list(paths)
+
+    def finish(future, job):
+        try:
+            result = future.result()
+        except BrokenExecutor:
+            result = {"error": "worker process died (out of memory?)"}
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        entry = {"path": job["path"], "sha256": job["digest"], "bytes": job["bytes"], **result}
+        if "error" in entry:
+            report["failed"] += 1
+            logger.warning(f"Failed to ingest {job['path']}: {entry['error']}")
+        else:
+            report["ingested"] += 1
+            report["bytes"] += job["bytes"]
+            for name, seconds in entry["timings"].items():
+                report["stage_s"][name] = report["stage_s"].get(name, 0.0) + seconds
+            registry.record(job["digest"], {"fileKey": entry["fileKey"], "path": job["path"],
+                                            "bytes": job["bytes"], "ingested_at": time.time()})
+            registry.save()
+        report["results"].append(entry)
+
+    try:
+        while todo or pending:
+            while todo and len(pending) < 2 * workers:
+                path = todo.pop(0)
+                digest = file_digest(path)
+                if digest in queued or (not force and registry.is_ingested(digest)):
+                    report["skipped"] += 1
+                    report["results"].append({"path": str(path), "sha256": digest, "skipped": True})
+                    continue
+                queued.add(digest)
+                job = {"path": str(path), "digest": digest, "bytes": path.stat().st_size}
+                # Same content, same fileKey: re-running after an interruption overwrites, never duplicates
+                pending[pool.submit(ingest, str(path), digest[:32])] = job
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                broken = broken or isinstance(future.exception(), BrokenExecutor)
+                finish(future, pending.pop(future))
+            if broken:
+                for future, job in list(pending.items()):
+                    finish(future, job)
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _new_pool(workers, max_tasks_per_child, memory_limit_mb)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_s"] = elapsed
+    report["files_per_s"] = report["ingested"] / elapsed if elapsed > 0 else 0.0
+    report["mb_per_s"] = report["bytes"] / 1e6 / elapsed if elapsed > 0 else 0.0
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory or glob of .tlog/.bin flight logs")
+    parser.add_argument("inputs", nargs="+", help="Log files, directories (searched recursively) or globs")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--max-tasks-per-child", type=int, default=20, help="Files per worker before it is replaced")
+    parser.add_argument("--memory-limit-mb", type=int, help="Address-space limit per worker")
+    parser.add_argument("--force", action="store_true", help="Re-ingest files already in the registry")
+    parser.add_argument("--report", help="Write the throughput report as JSON to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    paths = discover_logs(args.inputs)
+    logger.info(f"Found {len(paths)} log files")
+    report = run_batch(paths, args.workers, args.max_tasks_per_child or None, args.memory_limit_mb, args.force)
+    print(f"ingested={report['ingested']} skipped={report['skipped']} failed={report['failed']} "
+          f"elapsed={report['elapsed_s']:.1f}s files/s={report['files_per_s']:.2f} MB/s={report['mb_per_s']:.2f}")
+    if report["stage_s"]:
+        print("stage seconds: " + " ".join(f"{k}={v:.1f}" for k, v in report["stage_s"].items()))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
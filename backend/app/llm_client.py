@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import aiohttp
+from typing import Dict, Any, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk
+from .metrics import registry, observe_stage
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an LLM call failure is worth retrying (rate limits, overload, timeouts)."""
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError, aiohttp.ClientConnectionError)):
+        return True
+    status = getattr(exc, "status", None) or getattr(exc, "code", None)
+    if callable(status):
+        # grpc errors expose code() as a method
+        try:
+            status = status()
+        except Exception:
+            status = None
+    if isinstance(status, int) and status in RETRYABLE_STATUS:
+        return True
+    text = str(exc).lower()
+    return "429" in text or "resource exhausted" in text or "rate limit" in text or "503" in text
+
+def _record_call(started: float, outcome: str, stage: str = "llm.call") -> None:
+    observe_stage(stage, time.monotonic() - started)
+    registry.inc("llm_calls_total", {"outcome": outcome})
+
+class LLMHTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"LLM server returned {status}: {message}")
+        self.status = status
+
+class TokenBucket:
+    """Async token bucket allowing `rate` calls per second with bursts up to `capacity`."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the time waited."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+class RetryBudget:
+    """Caps retries to a fraction of recent traffic so overload does not turn into a retry storm.
+
+    Every request deposits `ratio` tokens (up to `max_tokens`); every retry withdraws one.
+    """
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class LLMLimits:
+    """Limits shared by every LLMClient in the process."""
+    def __init__(self, max_concurrency: int = 8, rate: float = 10.0, burst: float = 20.0, retry_ratio: float = 0.2):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.budget = RetryBudget(retry_ratio)
+        self.max_concurrency = max_concurrency
+
+_shared_limits: Optional[LLMLimits] = None
+
+def shared_limits() -> LLMLimits:
+    global _shared_limits
+    if _shared_limits is None:
+        _shared_limits = LLMLimits(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            rate=float(os.getenv("LLM_RATE_PER_SEC", "10")),
+            burst=float(os.getenv("LLM_BURST", "20"))
+        )
+    return _shared_limits
+
+class LLMClient:
+    """Wraps a chat model with concurrency, rate limiting, retries and request coalescing.
+
+    - at most `max_concurrency` calls in flight (shared semaphore)
+    - a token bucket spaces calls to stay under the provider rate limit
+    - retryable failures (429/5xx/timeouts) are retried with full-jitter
+      exponential backoff while the deadline and the retry budget allow
+    - identical prompts already in flight share a single call (single-flight)
+
+    Exposes the same ainvoke/astream interface as the wrapped model.
+    """
+    def __init__(
+        self,
+        llm,
+        limits: Optional[LLMLimits] = None,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: float = 45.0
+    ):
+        self.llm = llm
+        self.limits = limits or shared_limits()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"requests": 0, "calls": 0, "coalesced": 0, "retries": 0, "retryable_errors": 0, "failures": 0, "budget_exhausted": 0, "inflight": 0, "queue_wait_s": 0.0}
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _acquire(self) -> None:
+        started = time.monotonic()
+        await self.limits.semaphore.acquire()
+        try:
+            await self.limits.bucket.acquire()
+        except BaseException:
+            self.limits.semaphore.release()
+            raise
+        self.stats["queue_wait_s"] += time.monotonic() - started
+
+    async def _with_retries(self, call):
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        self.limits.budget.deposit()
+        while True:
+            await self._acquire()
+            self.stats["inflight"] += 1
+            self.stats["calls"] += 1
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(call(), max(0.001, deadline - time.monotonic()))
+                _record_call(started, "ok")
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    _record_call(started, "error")
+                    self.stats["failures"] += 1
+                    raise
+                _record_call(started, "retryable_error")
+                self.stats["retryable_errors"] += 1
+                delay = self._backoff(attempt)
+                attempt += 1
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    self.stats["failures"] += 1
+                    raise
+                if not self.limits.budget.withdraw():
+                    self.stats["budget_exhausted"] += 1
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Retryable LLM error ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            finally:
+                self.stats["inflight"] -= 1
+                self.limits.semaphore.release()
+            await asyncio.sleep(delay)
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved; every waiter gets it re-raised through its shield
+        if not future.cancelled():
+            future.exception()
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.stats["requests"] += 1
+        key = str(prompt) if not kwargs else None
+        if key is not None and key in self._inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.ensure_future(self._with_retries(lambda: self.llm.ainvoke(prompt, **kwargs)))
+        if key is not None:
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        # Shield so a caller timing out does not cancel the call for coalesced waiters
+        return await asyncio.shield(future)
+
+    async def astream(self, prompt, **kwargs):
+        """Stream chunks; retries only happen before the first chunk is delivered."""
+        self.stats["requests"] += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        self.limits.budget.deposit()
+        while True:
+            await self._acquire()
+            self.stats["inflight"] += 1
+            self.stats["calls"] += 1
+            started = False
+            retry_delay = None
+            call_started = time.monotonic()
+            try:
+                async for chunk in self.llm.astream(prompt, **kwargs):
+                    if not started:
+                        observe_stage("llm.stream_first_chunk", time.monotonic() - call_started)
+                    started = True
+                    yield chunk
+                _record_call(call_started, "ok", "llm.stream")
+                return
+            except Exception as e:
+                if started or not is_retryable(e):
+                    _record_call(call_started, "error", "llm.stream")
+                    self.stats["failures"] += 1
+                    raise
+                _record_call(call_started, "retryable_error", "llm.stream")
+                self.stats["retryable_errors"] += 1
+                retry_delay = self._backoff(attempt)
+                attempt += 1
+                if attempt > self.max_retries or time.monotonic() + retry_delay >= deadline or not self.limits.budget.withdraw():
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                logger.warning(f"Retryable LLM stream error ({e}), retry {attempt}/{self.max_retries} in {retry_delay:.2f}s")
+            finally:
+                self.stats["inflight"] -= 1
+                self.limits.semaphore.release()
+            await asyncio.sleep(retry_delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "coalescing_inflight": len(self._inflight), "retry_budget_tokens": self.limits.budget.tokens}
+
+class HTTPChatModel:
+    """Minimal chat model speaking the JSON protocol of benchmarks/stub_llm_server.py.
+
+    POST {base_url}/v1/chat with {"prompt": ...} returns {"content": ...};
+    POST {base_url}/v1/chat/stream returns the answer as JSON lines of {"content": ...} chunks.
+    Non-200 responses raise LLMHTTPError carrying the status code.
+    """
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def ainvoke(self, prompt, **kwargs) -> AIMessage:
+        async with self._get_session().post(f"{self.base_url}/v1/chat", json={"prompt": str(prompt)}) as resp:
+            if resp.status != 200:
+                raise LLMHTTPError(resp.status, await resp.text())
+            data = await resp.json()
+            return AIMessage(content=data["content"])
+
+    async def astream(self, prompt, **kwargs):
+        async with self._get_session().post(f"{self.base_url}/v1/chat/stream", json={"prompt": str(prompt)}) as resp:
+            if resp.status != 200:
+                raise LLMHTTPError(resp.status, await resp.text())
+            async for line in resp.content:
+                if line.strip():
+                    yield AIMessageChunk(content=json.loads(line)["content"])
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
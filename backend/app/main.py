@@ -1,5 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 import os
 import uuid
 import shutil
@@ -7,13 +8,30 @@ from typing import Optional, Dict, Any, List
 import json
 from pathlib import Path
 import logging
-from .mavlink_parser import MAVLinkParser
+from .mavlink_parser import parse_log, quick_scan_log
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from .embeddings import build_snippets, create_embeddings, save_faiss_index, retrieve_relevant_snippets, classify_query_type
+from .embeddings import model, build_snippets, create_embeddings, save_faiss_index
 from .tools import retrieve_snippets, detect_anomalies
-from .agents import FlightLogAgentOrchestrator
+from .anomalies import collect_anomalies, save_anomaly_report
+from .facts import answer_from_facts
+from .agents import FlightLogAgentOrchestrator, FALLBACK_RESPONSE
+from .cache import ResponseCache, history_key
+from .executors import run_blocking, executor_metrics, shutdown_executors, LoopLagMonitor
+from .llm_client import HTTPChatModel
+from .docs_index import load_docs_index
+from .graph_expressions import GraphEngine
+from .parquet_store import parquet_available, has_parquet_log, export_parsed_log, load_parsed_log, archive_parquet_log
+from .columnar import ColumnarEncoder, FastJSONResponse, columns_schema, parse_range, layout_header
+from .metrics import registry, profiles, dict_collector, record_timings, timed, instrumented, MetricsMiddleware
+from .spatial import catalog as spatial_catalog, save_track, remove_track
+from .flight_phases import save_flight_index, load_flight_index
+from .storage import storage, STORAGE_CONFIG
+from .events import EventBus
+from .router import QueryRouter, ROUTER_CONFIG
+import asyncio
 import numpy as np
+import faiss
 
 load_dotenv()
 
@@ -26,6 +44,9 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Request durations by route, and opt-in profiling (PROFILING_ENABLED=1)
+app.add_middleware(MetricsMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Columns", "X-Rows", "Content-Range", "Accept-Ranges", "X-Profile-Id"],
 )
 
 # Create upload directory if it doesn't exist
@@ -42,31 +64,215 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 # Store for file metadata and parsed data
 file_data = {}
 
-# Store active WebSocket connections
-active_connections: List[WebSocket] = []
+# Header-only summaries of logs, available while they are still being parsed
+previews: Dict[str, Dict[str, Any]] = {}
+
+# Websocket subscribers by topic: "session:<id>" (the browser that uploaded) and "file:<fileKey>"
+events = EventBus()
+
+# Created on first use, so the app can start without LLM credentials (e.g. for load tests)
+_orchestrator: Optional[FlightLogAgentOrchestrator] = None
+
+def get_orchestrator() -> FlightLogAgentOrchestrator:
+    """The chat orchestrator; LLM_BASE_URL points it at an HTTPChatModel server instead of Gemini."""
+    global _orchestrator
+    if _orchestrator is None:
+        base_url = os.getenv("LLM_BASE_URL")
+        llm = HTTPChatModel(base_url) if base_url else None
+        _orchestrator = FlightLogAgentOrchestrator(api_key=os.getenv("GOOGLE_API_KEY"), llm=llm)
+    return _orchestrator
+
+# Answers per fileKey: exact question match first, then embedding similarity
+response_cache = ResponseCache(encode=lambda texts: model.encode(texts),
+                               max_entries=int(os.getenv("RESPONSE_CACHE_ENTRIES", "512")))
+
+# Routes questions by similarity to example questions; reuses the response cache's question embedding
+query_router = QueryRouter(encode=lambda texts: model.encode(texts), embed=response_cache.embed,
+                           min_similarity=ROUTER_CONFIG["min_similarity"], min_margin=ROUTER_CONFIG["min_margin"])
+
+# Event loop lag, reported by /api/executor-stats
+loop_lag = LoopLagMonitor()
+
+# Gauges exported by /metrics next to the stage timers
+registry.add_collector(dict_collector("executor", "Executor pool metrics", executor_metrics, label="pool"))
+registry.add_collector(dict_collector("response_cache", "Chat response cache metrics", lambda: response_cache.metrics()))
+registry.add_collector(dict_collector("event_loop_lag", "Event loop lag", lambda: loop_lag.metrics()))
+registry.add_collector(dict_collector("storage", "Bytes on disk by artifact kind",
+                                      lambda: {kind: {"bytes": size} for kind, size in storage.usage()["by_kind"].items()},
+                                      label="kind"))
+registry.add_collector(dict_collector("query_router", "Query router decisions", lambda: query_router.metrics()))
+registry.add_collector(dict_collector("events", "Websocket event bus metrics", lambda: events.metrics()))
+registry.add_collector(dict_collector("llm_client", "LLM client metrics",
+                                      lambda: _orchestrator.llm.metrics() if _orchestrator is not None else {}))
+
+# Predefined graphs (mavgraphs.xml etc.) evaluated server-side, cached per fileKey/graph
+graph_engine = GraphEngine()
+
+# Message columns as raw typed arrays / Arrow IPC for the plots, cached per fileKey
+columnar_encoder = ColumnarEncoder()
+
+@app.on_event("startup")
+async def start_docs_index():
+    # Embedding the doc entries takes a while on the first run (cached afterwards);
+    # until it finishes, doc lookups use a keyword-only index
+    asyncio.ensure_future(run_blocking("model", load_docs_index, lambda texts: model.encode(texts)))
+
+@app.on_event("startup")
+async def start_query_router():
+    if ROUTER_CONFIG["enabled"]:
+        asyncio.ensure_future(run_blocking("model", query_router.warm))
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag.start()
+
+@app.on_event("startup")
+async def start_event_heartbeats():
+    events.start()
+
+def forget_log(file_key: str) -> None:
+    """Drop everything held in memory for a log whose files are gone."""
+    file_data.pop(file_key, None)
+    previews.pop(file_key, None)
+    remove_track(file_key)
+    response_cache.invalidate(file_key)
+    graph_engine.invalidate(file_key)
+    columnar_encoder.invalidate(file_key)
+
+async def collect_storage(dry_run: bool = False) -> Dict[str, Any]:
+    """Run the storage collector, keeping the logs loaded in this process."""
+    with timed("storage_gc"):
+        report = await run_blocking("io", storage.collect, list(file_data), dry_run)
+    if not dry_run:
+        for entry in report["removed"]:
+            if entry["reason"] != "partial":
+                forget_log(entry["fileKey"])
+    return report
+
+# Periodic storage collection, cancelled on shutdown before the executors stop
+_storage_gc_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_storage_gc():
+    # Orphans always; expired and over-quota logs when STORAGE_MAX_AGE_DAYS / STORAGE_QUOTA_MB are set
+    global _storage_gc_task
+    interval = STORAGE_CONFIG["gc_interval_s"]
+    if interval <= 0:
+        return
+
+    async def run():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await collect_storage()
+            except Exception as e:
+                logger.warning(f"Storage collection failed: {e}")
+    _storage_gc_task = asyncio.ensure_future(run())
+
+@app.on_event("shutdown")
+async def stop_executors():
+    global _storage_gc_task
+    if _storage_gc_task is not None:
+        _storage_gc_task.cancel()
+        await asyncio.gather(_storage_gc_task, return_exceptions=True)
+        _storage_gc_task = None
+    await loop_lag.stop()
+    await events.close()
+    shutdown_executors()
+    if _orchestrator is not None and isinstance(_orchestrator.llm.llm, HTTPChatModel):
+        await _orchestrator.llm.llm.close()
+
+async def parse_file(file_path: Path) -> Dict[str, Any]:
+    """Parse a log in the parse pool, recording the parser's stage timings."""
+    with timed("parse"):
+        parsed_data = await run_blocking("parse", parse_log, file_path)
+    record_timings("parse", parsed_data["metadata"].get("parse_timings", {}))
+    return parsed_data
+
+INDEX_STAGES = ["snippets", "embeddings", "faiss", "anomalies", "track", "phases", "parquet"]
 
-# Initialize orchestrator
-orchestrator = FlightLogAgentOrchestrator(api_key=os.getenv("GOOGLE_API_KEY"))
+async def build_log_index(file_key: str, parsed_data: Dict[str, Any], session: Optional[str] = None) -> None:
+    """Build the snippet index, anomaly report, track and phase index of a parsed log off the event loop.
+
+    Stage progress is published to the log's (and the uploading session's) subscribers.
+    """
+    def progress(stage: str) -> None:
+        notify(file_key, session, {"type": "index_progress", "fileKey": file_key, "stage": stage,
+                                   "step": INDEX_STAGES.index(stage) + 1, "steps": len(INDEX_STAGES)}, coalesce=True)
+
+    progress("snippets")
+    snippets = await run_blocking("cpu", build_snippets, parsed_data)
+    progress("embeddings")
+    embeddings = await run_blocking("model", create_embeddings, snippets)
+    progress("faiss")
+    await run_blocking("io", save_faiss_index, file_key, embeddings, snippets)
+    progress("anomalies")
+    anomalies = await run_blocking("cpu", collect_anomalies, parsed_data)
+    await run_blocking("io", save_anomaly_report, file_key, anomalies)
+    # Grid index of the position track for region queries (this log and across logs)
+    progress("track")
+    await run_blocking("cpu", save_track, file_key, parsed_data)
+    # Mode and phase segments that scope the tools to e.g. "during takeoff"
+    progress("phases")
+    await run_blocking("io", save_flight_index, file_key, parsed_data)
+    if parquet_available():
+        # Columnar copy for analysts, and to reload the log without reparsing
+        progress("parquet")
+        try:
+            with timed("export_parquet"):
+                await run_blocking("cpu", export_parsed_log, file_key, parsed_data)
+        except Exception as e:
+            logger.warning(f"Parquet export of {file_key} failed: {e}")
+    response_cache.invalidate(file_key)
+    graph_engine.invalidate(file_key)
+    columnar_encoder.invalidate(file_key)
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, session: Optional[str] = None, fileKey: Optional[str] = None):
+    """Server events for a browser session (?session=, sent as X-Session-Id with uploads) and for logs.
+
+    Clients subscribe to more logs with {"type": "subscribe", "fileKey": ...}
+    and leave them with {"type": "unsubscribe", "fileKey": ...}.
+    """
     await websocket.accept()
-    active_connections.append(websocket)
+    topics = ([f"session:{session}"] if session else []) + ([f"file:{fileKey}"] if fileKey else [])
+    subscriber = events.connect(websocket.send_text, topics)
     try:
         while True:
-            await websocket.receive_text()
-    except:
-        active_connections.remove(websocket)
+            try:
+                request = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if not isinstance(request, dict) or not request.get("fileKey"):
+                continue
+            if request.get("type") == "subscribe":
+                events.subscribe(subscriber, f"file:{request['fileKey']}")
+            elif request.get("type") == "unsubscribe":
+                events.unsubscribe(subscriber, f"file:{request['fileKey']}")
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        events.disconnect(subscriber)
 
-async def notify_embedding_status(message: str):
-    for connection in active_connections:
-        try:
-            await connection.send_text(json.dumps({"type": "embedding_status", "message": message}))
-        except:
-            continue
+def notify(file_key: str, session: Optional[str], event: Dict[str, Any], coalesce: bool = False) -> None:
+    """Publish an event to the log's subscribers and to the session that uploaded it."""
+    events.publish([f"file:{file_key}"] + ([f"session:{session}"] if session else []), event, coalesce)
+
+def notify_embedding_status(file_key: str, session: Optional[str], message: str) -> None:
+    notify(file_key, session, {"type": "embedding_status", "fileKey": file_key, "message": message})
+
+async def preview_file(file_key: str, file_path: Path, session: Optional[str] = None) -> None:
+    """Quick-scan a log before the full parse and send the summary to the websocket clients."""
+    try:
+        with timed("quick_scan"):
+            previews[file_key] = await run_blocking("parse", quick_scan_log, file_path)
+    except Exception as e:
+        logger.warning(f"Quick scan of {file_path} failed: {e}")
+        return
+    notify(file_key, session, {"type": "log_preview", "fileKey": file_key, "preview": previews[file_key]})
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), x_session_id: Optional[str] = Header(None)):
     try:
         # Generate unique file key
         file_key = str(uuid.uuid4())
@@ -79,9 +285,9 @@ async def upload_file(file: UploadFile = File(...)):
         with file_path.open("wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
-        # Parse the file
-        parser = MAVLinkParser(file_path)
-        parsed_data = parser.parse()
+        # Preview first (a fraction of the parse time), then parse in a worker process
+        await preview_file(file_key, file_path, x_session_id)
+        parsed_data = await parse_file(file_path)
 
         # Get vehicle type from parsed data
         vehicle_type = parsed_data.get("vehicle_type", "UNKNOWN")
@@ -102,15 +308,15 @@ async def upload_file(file: UploadFile = File(...)):
         logger.info(f"Successfully processed file {file.filename} with key {file_key}")
 
         # Notify about embedding creation
-        await notify_embedding_status("Creating embeddings for flight log analysis...")
+        notify_embedding_status(file_key, x_session_id, "Creating embeddings for flight log analysis...")
         
         # After parsing, build and store vector embeddings
-        snippets = build_snippets(parsed_data)
-        embeddings = create_embeddings(snippets)
-        save_faiss_index(file_key, embeddings, snippets)
+        await build_log_index(file_key, parsed_data, x_session_id)
+        # Indexed: the raw log is only needed to reparse, keep it compressed
+        await run_blocking("io", storage.store, file_path)
         
         # Notify completion
-        await notify_embedding_status("Embeddings created successfully!")
+        notify_embedding_status(file_key, x_session_id, "Embeddings created successfully!")
         
         return {"fileKey": file_key}
     except Exception as e:
@@ -118,7 +324,7 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/open-sample")
-async def open_sample():
+async def open_sample(x_session_id: Optional[str] = Header(None)):
     try:
         # Generate unique file key for sample
         file_key = str(uuid.uuid4())
@@ -131,9 +337,9 @@ async def open_sample():
         dest_path = UPLOAD_DIR / f"{file_key}.tlog"
         shutil.copy2(sample_path, dest_path)
         
-        # Parse the sample file
-        parser = MAVLinkParser(dest_path)
-        parsed_data = parser.parse()
+        # Preview first, then parse the sample file in a worker process
+        await preview_file(file_key, dest_path, x_session_id)
+        parsed_data = await parse_file(dest_path)
         
         # Store data
         file_data[file_key] = {
@@ -147,15 +353,14 @@ async def open_sample():
         logger.info(f"Successfully processed sample file with key {file_key}")
 
         # Notify about embedding creation
-        await notify_embedding_status("Creating embeddings for flight log analysis...")
+        notify_embedding_status(file_key, x_session_id, "Creating embeddings for flight log analysis...")
         
         # After parsing, build and store vector embeddings
-        snippets = build_snippets(parsed_data)
-        embeddings = create_embeddings(snippets)
-        save_faiss_index(file_key, embeddings, snippets)
+        await build_log_index(file_key, parsed_data, x_session_id)
+        await run_blocking("io", storage.store, dest_path)
         
         # Notify completion
-        await notify_embedding_status("Embeddings created successfully!")
+        notify_embedding_status(file_key, x_session_id, "Embeddings created successfully!")
         
         return {"fileKey": file_key}
     except Exception as e:
@@ -171,88 +376,145 @@ class ChatRequest(BaseModel):
     class Config:
         extra = "allow"  # Allow extra fields in the telemetryData
 
+@instrumented("top_snippet")
+def top_snippet(fileKey: str, message: str):
+    """Closest snippet to the question and its cosine similarity (blocking)."""
+    outdir = Path("uploads/faiss_indexes")
+    index = faiss.read_index(str(outdir / f"{fileKey}.index"))
+    with open(outdir / f"{fileKey}_snippets.json") as f:
+        snippets = json.load(f)
+    q_emb = model.encode([message]).astype("float32")
+    D, I = index.search(q_emb, 1)
+    if I[0][0] < 0:
+        return None, 0.0
+    # FAISS returns L2 distance, convert to cosine similarity
+    # If vectors are normalized, cosine_sim = 1 - 0.5 * L2^2
+    return snippets[I[0][0]], float(1 - 0.5 * D[0][0])
+
+async def plan_chat(request: ChatRequest) -> Dict[str, Any]:
+    """Prepare a chat turn and resolve everything that does not need the LLM.
+
+    Loads the sample log if needed, adds the flight log context to the chat
+    history, routes the question, and tries the facts table and the embedding
+    short-circuit.
+
+    Returns:
+        Dict[str, Any]: message, fileKey, chatHistory, vehicle_type and the router decision
+        ("route") for the orchestrator, plus "response" when the turn was answered without
+        the LLM and "embedding_snippet" when a close embedding match was found
+    """
+    message = request.message
+    fileKey = request.fileKey
+    chatHistory = request.chatHistory or []
+    plan = {"message": message, "fileKey": fileKey, "chatHistory": chatHistory, "response": None, "embedding_snippet": None, "vehicle_type": None, "route": None}
+
+    # Handle chat with or without flight log
+    if fileKey and fileKey not in file_data:
+        # A log exported before a restart reloads from Parquet; otherwise assume the sample file
+        sample_path = Path("../src/assets/vtol.tlog")
+        if parquet_available() and has_parquet_log(fileKey):
+            parsed_data = await run_blocking("cpu", load_parsed_log, fileKey)
+            file_data[fileKey] = {
+                "filename": parsed_data["metadata"].get("file_name"),
+                "content_type": "application/octet-stream",
+                "size": parsed_data["metadata"].get("file_size"),
+                "parsed_data": parsed_data,
+                "vehicle_type": parsed_data.get("vehicle_type", "UNKNOWN")
+            }
+            logger.info(f"Reloaded flight log {fileKey} from Parquet")
+            if not Path(f"uploads/faiss_indexes/{fileKey}.index").exists():
+                await build_log_index(fileKey, parsed_data)
+        elif sample_path.exists():
+            dest_path = UPLOAD_DIR / f"{fileKey}.tlog"
+            shutil.copy2(sample_path, dest_path)
+            parsed_data = await parse_file(dest_path)
+            file_data[fileKey] = {
+                "filename": "vtol.tlog",
+                "content_type": "application/octet-stream",
+                "size": dest_path.stat().st_size,
+                "parsed_data": parsed_data,
+                "vehicle_type": parsed_data.get("vehicle_type", "UNKNOWN")
+            }
+            logger.info(f"Successfully processed sample file with key {fileKey}")
+            await build_log_index(fileKey, parsed_data)
+            await run_blocking("io", storage.store, dest_path)
+        else:
+            raise HTTPException(status_code=404, detail="File not found or embeddings not created")
+
+    if fileKey:
+        plan["vehicle_type"] = file_data[fileKey]["parsed_data"].get("vehicle_type")
+        # Recently used logs are the last to go when the storage quota is exceeded
+        storage.touch(fileKey)
+
+    # Add file context to chat history if it's not already there
+    if fileKey and not any("Flight log loaded successfully" in msg.get("content", "") for msg in chatHistory):
+        vehicle_type = file_data[fileKey].get("vehicle_type", "UNKNOWN")
+        chatHistory.insert(0, {
+            "role": "system",
+            "content": f"Flight log loaded successfully. This is a {vehicle_type} flight log. You can now ask questions about the flight data. FileKey: {fileKey}"
+        })
+
+    # --- Route the question: facts, retrieval, anomaly, region or chat ---
+    # By embedding only with ROUTER_ENABLED=1; keyword decisions are never confident,
+    # so the LLM keeps picking the tool
+    if ROUTER_CONFIG["enabled"]:
+        decision = await run_blocking("model", query_router.route, message)
+    else:
+        decision = query_router.keyword_decision(message)
+    plan["route"] = decision
+    logger.info(f"Routed to {decision['route']} (confidence {decision['confidence']:.2f}, {decision['source']})")
+    if decision["route"] == "chat" and decision["confident"]:
+        logger.info("General chat detected, answering without embedding/tool short-circuits.")
+        return plan
+    query_type = decision["route"]
+
+    # --- Facts short-circuit: answer common questions from the precomputed facts table ---
+    # (its patterns are strict, so it is also worth a try when the route is uncertain)
+    if fileKey and (query_type in ("facts", "retrieval") or not decision["confident"]):
+        parsed_data = file_data[fileKey]["parsed_data"]
+        answer = answer_from_facts(message, parsed_data.get("facts"), parsed_data["metadata"].get("first_timestamp"))
+        if answer:
+            logger.info("Answered from flight facts table, skipping embedding/LLM.")
+            plan["response"] = answer
+            return plan
+
+    # --- Embedding short-circuit: Try to answer using FAISS before LLM ---
+    if fileKey and query_type in ("facts", "retrieval", "anomaly"):
+        try:
+            snippet, cosine_sim = await run_blocking("model", top_snippet, fileKey, message)
+            logger.info(f"Embedding similarity for '{message}': {cosine_sim:.3f}")
+            if snippet and cosine_sim > 0.3:
+                logger.info("High confidence embedding match found, refining response...")
+                # Instead of returning raw snippet, let the orchestrator refine it
+                plan["embedding_snippet"] = snippet["text"]
+        except Exception as e:
+            logger.warning(f"Embedding search failed: {e}")
+            # Fallback to LLM if embedding search fails
+            pass
+    return plan
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     try:
-        message = request.message
-        fileKey = request.fileKey
-        chatHistory = request.chatHistory or []
-
-        # Handle chat with or without flight log
-        if fileKey and fileKey not in file_data:
-            # Check if this is a sample file
-            sample_path = Path("../src/assets/vtol.tlog")
-            if sample_path.exists():
-                dest_path = UPLOAD_DIR / f"{fileKey}.tlog"
-                shutil.copy2(sample_path, dest_path)
-                parser = MAVLinkParser(dest_path)
-                parsed_data = parser.parse()
-                file_data[fileKey] = {
-                    "filename": "vtol.tlog",
-                    "content_type": "application/octet-stream",
-                    "size": dest_path.stat().st_size,
-                    "parsed_data": parsed_data,
-                    "vehicle_type": parsed_data.get("vehicle_type", "UNKNOWN")
-                }
-                logger.info(f"Successfully processed sample file with key {fileKey}")
-                snippets = build_snippets(parsed_data)
-                embeddings = create_embeddings(snippets)
-                save_faiss_index(fileKey, embeddings, snippets)
-            else:
-                raise HTTPException(status_code=404, detail="File not found or embeddings not created")
-
-        # Add file context to chat history if it's not already there
-        if fileKey and not any("Flight log loaded successfully" in msg.get("content", "") for msg in chatHistory):
-            vehicle_type = file_data[fileKey].get("vehicle_type", "UNKNOWN")
-            chatHistory.insert(0, {
-                "role": "system",
-                "content": f"Flight log loaded successfully. This is a {vehicle_type} flight log. You can now ask questions about the flight data. FileKey: {fileKey}"
-            })
-
-        # --- Classify the query type ---
-        query_type = classify_query_type(message)
-        if query_type == "unknown":
-            logger.info("General chat detected, answering without embedding/LLM/tool.")
-            response = await orchestrator.answer_question(message, fileKey, chatHistory)
-            return {"response": response}
-
-        # --- Embedding short-circuit: Try to answer using FAISS before LLM ---
-        if fileKey and query_type in ("retrieval", "anomaly_tool"):
-            try:
-                # Retrieve top 1 relevant snippet and its similarity
-                top_k = 1
-                snippets = retrieve_relevant_snippets(fileKey, message, top_k=top_k)
-                if snippets:
-                    # Compute cosine similarity between question and snippet
-                    from .embeddings import model
-                    q_emb = model.encode([message]).astype("float32")[0]
-                    outdir = Path("uploads/faiss_indexes")
-                    import faiss
-                    index = faiss.read_index(str(outdir / f"{fileKey}.index"))
-                    D, I = index.search(np.expand_dims(q_emb, 0), top_k)
-                    # FAISS returns L2 distance, convert to cosine similarity
-                    # If vectors are normalized, cosine_sim = 1 - 0.5 * L2^2
-                    l2 = D[0][0]
-                    cosine_sim = 1 - 0.5 * l2
-                    logger.info(f"Embedding similarity for '{message}': {cosine_sim:.3f}")
-                    if cosine_sim > 0.3:
-                        logger.info("High confidence embedding match found, refining response...")
-                        # Instead of returning raw snippet, use the orchestrator to refine it
-                        response = await orchestrator.answer_question(
-                            message=message,
-                            fileKey=fileKey,
-                            chatHistory=chatHistory,
-                            embedding_snippet=snippets[0]["text"]  # Pass the snippet to the orchestrator
-                        )
-                        return {"response": response}
-            except Exception as e:
-                logger.warning(f"Embedding search failed: {e}")
-                # Fallback to LLM if embedding search fails
-                pass
+        context = history_key(request.chatHistory)
+        if request.fileKey:
+            await run_blocking("model", response_cache.embed, request.message)
+            cached = response_cache.get(request.fileKey, request.message, context)
+            if cached is not None:
+                logger.info("Answered from response cache.")
+                return {"response": cached}
 
-        # --- If no good embedding match, call orchestrator/LLM ---
-        logger.info("Calling LLM orchestrator for response.")
-        response = await orchestrator.answer_question(message, fileKey, chatHistory)
+        plan = await plan_chat(request)
+        response = plan["response"]
+        if response is None:
+            # --- If no good embedding match, call orchestrator/LLM ---
+            logger.info("Calling LLM orchestrator for response.")
+            response = await get_orchestrator().answer_question(
+                plan["message"], plan["fileKey"], plan["chatHistory"],
+                embedding_snippet=plan["embedding_snippet"], vehicle_type=plan["vehicle_type"], route=plan["route"]
+            )
+        if plan["fileKey"] and response != FALLBACK_RESPONSE:
+            response_cache.put(plan["fileKey"], plan["message"], response, context)
         return {"response": response}
     except HTTPException:
         raise
@@ -260,16 +522,250 @@ async def chat(request: ChatRequest):
         logger.error(f"Error in chat: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Server-sent events version of /api/chat.
+
+    Emits {"type": "status"} progress events, then the answer as {"type": "token"}
+    events while the LLM generates it, and finally {"type": "done"}.
+    """
+    async def events():
+        try:
+            yield _sse({"type": "status", "message": "Reading your question..."})
+            context = history_key(request.chatHistory)
+            if request.fileKey:
+                await run_blocking("model", response_cache.embed, request.message)
+                cached = response_cache.get(request.fileKey, request.message, context)
+                if cached is not None:
+                    yield _sse({"type": "token", "content": cached})
+                    yield _sse({"type": "done"})
+                    return
+
+            plan = await plan_chat(request)
+            if plan["response"] is not None:
+                tokens = [plan["response"]]
+                yield _sse({"type": "token", "content": plan["response"]})
+            else:
+                tokens = []
+                async for event in get_orchestrator().stream_answer(
+                    plan["message"], plan["fileKey"], plan["chatHistory"],
+                    embedding_snippet=plan["embedding_snippet"], vehicle_type=plan["vehicle_type"], route=plan["route"]
+                ):
+                    if event["type"] == "error":
+                        tokens = None
+                    elif event["type"] == "token" and tokens is not None:
+                        tokens.append(event["content"])
+                    yield _sse(event)
+            if plan["fileKey"] and tokens:
+                response_cache.put(plan["fileKey"], plan["message"], "".join(tokens), context)
+            yield _sse({"type": "done"})
+        except HTTPException as e:
+            yield _sse({"type": "error", "message": e.detail})
+        except Exception as e:
+            logger.error(f"Error in streaming chat: {e}", exc_info=True)
+            yield _sse({"type": "error", "message": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit-rate metrics of the chat response cache."""
+    return response_cache.metrics()
+
+@app.get("/api/graphs")
+async def list_graphs():
+    """Names and descriptions of the predefined graphs."""
+    return [{"name": name, "description": graph["description"]} for name, graph in graph_engine.graphs.items()]
+
+# orjson (FastJSONResponse) only on the routes with large numeric payloads
+@app.get("/api/graphs/{fileKey}", response_class=FastJSONResponse)
+async def graph_series(fileKey: str, name: str, max_points: int = 2000):
+    """Series of a predefined graph evaluated over a log, downsampled to about max_points per series."""
+    if fileKey not in file_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    if name not in graph_engine.graphs:
+        raise HTTPException(status_code=404, detail=f"Unknown graph: {name}")
+    max_points = min(max(max_points, 10), 100000)
+    result = await run_blocking("cpu", graph_engine.series, fileKey, file_data[fileKey]["parsed_data"], name, max_points)
+    return FastJSONResponse(result)
+
+@app.get("/api/preview/{fileKey}")
+async def log_preview(fileKey: str):
+    """Message type counts, time range and vehicle type of a log, from its quick scan.
+
+    Available as soon as the upload is saved, while the full parse and
+    indexing still run; the same summary is pushed to /ws as a "log_preview" event.
+    """
+    if fileKey not in previews:
+        raise HTTPException(status_code=404, detail="File not found")
+    return previews[fileKey]
+
+@app.get("/api/columns/{fileKey}", response_class=FastJSONResponse)
+async def column_schema(fileKey: str):
+    """Message types of a log with their row counts and numeric fields."""
+    if fileKey not in file_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    return FastJSONResponse(columns_schema(file_data[fileKey]["parsed_data"]))
+
+@app.get("/api/columns/{fileKey}/{msg_type}", response_class=FastJSONResponse)
+async def message_columns_binary(request: Request, fileKey: str, msg_type: str, fields: Optional[str] = None,
+                                 format: str = "raw", dtype: str = "float64"):
+    """Columns of one message type as little-endian typed arrays or an Arrow IPC stream.
+
+    Raw bodies hold the columns back to back at the offsets listed in the
+    X-Columns header (_timestamp first, always float64). Single byte ranges are
+    supported (e.g. to fetch one column); whole bodies are gzipped when the
+    client accepts it.
+    """
+    if fileKey not in file_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    wanted = [f for f in fields.split(",") if f] if fields else None
+    range_header = request.headers.get("range")
+    compress = not range_header and "gzip" in request.headers.get("accept-encoding", "")
+    try:
+        encoded = await run_blocking("cpu", columnar_encoder.encode, fileKey, file_data[fileKey]["parsed_data"],
+                                     msg_type, wanted, format, dtype, compress)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'\""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+    body = encoded["body"]
+    headers = {"Accept-Ranges": "bytes", "X-Rows": str(encoded["rows"]), "Vary": "Accept-Encoding"}
+    if encoded["layout"] is not None:
+        headers["X-Columns"] = layout_header(encoded["layout"])
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    try:
+        byte_range = parse_range(range_header, len(body))
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{len(body)}"})
+    if byte_range is None:
+        return Response(body, media_type=encoded["media_type"], headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+    return Response(body[start:end + 1], status_code=206, media_type=encoded["media_type"], headers=headers)
+
+def _region(lat: Optional[float], lon: Optional[float], radius_m: Optional[float], bbox: Optional[str],
+            polygon: Optional[str]) -> Dict[str, Any]:
+    """Region dict (see spatial.py) from the query parameters of the spatial endpoints."""
+    try:
+        if radius_m is not None:
+            if lat is None or lon is None:
+                return {"type": "radius", "center": "home", "radius_m": radius_m}
+            return {"type": "radius", "lat": lat, "lon": lon, "radius_m": radius_m}
+        if bbox:
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox.split(","))
+            return {"type": "bbox", "min_lat": min(min_lat, max_lat), "min_lon": min(min_lon, max_lon),
+                    "max_lat": max(min_lat, max_lat), "max_lon": max(min_lon, max_lon)}
+        if polygon:
+            points = [[float(v) for v in point.split(",")] for point in polygon.split(";") if point]
+            if len(points) >= 3 and all(len(p) == 2 for p in points):
+                return {"type": "polygon", "points": points}
+    except ValueError:
+        pass
+    raise HTTPException(status_code=400, detail="Give radius_m (with lat/lon, or around home), "
+                                                "bbox=min_lat,min_lon,max_lat,max_lon or polygon=lat,lon;lat,lon;lat,lon")
+
+@app.get("/api/spatial", response_class=FastJSONResponse)
+async def spatial_query_all(lat: Optional[float] = None, lon: Optional[float] = None, radius_m: Optional[float] = None,
+                            bbox: Optional[str] = None, polygon: Optional[str] = None):
+    """Ingested logs whose GLOBAL_POSITION_INT track entered a region, with the time intervals inside it."""
+    region = _region(lat, lon, radius_m, bbox, polygon)
+    results = await run_blocking("cpu", spatial_catalog.query, region)
+    return FastJSONResponse({"region": region, "logs": results})
+
+@app.get("/api/spatial/{fileKey}", response_class=FastJSONResponse)
+async def spatial_query(fileKey: str, lat: Optional[float] = None, lon: Optional[float] = None,
+                        radius_m: Optional[float] = None, bbox: Optional[str] = None, polygon: Optional[str] = None):
+    """Time intervals one log spent inside a region: radius_m around lat/lon (or home), bbox or polygon."""
+    region = _region(lat, lon, radius_m, bbox, polygon)
+    index = await run_blocking("io", spatial_catalog.get, fileKey)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No position track for this file")
+    intervals = await run_blocking("cpu", index.intervals, region)
+    return FastJSONResponse({"region": region, "home": index.home, "intervals": intervals,
+                             "total_s": sum(i["duration_s"] for i in intervals)})
+
+@app.get("/api/phases/{fileKey}", response_class=FastJSONResponse)
+async def flight_phase_segments(fileKey: str, at: Optional[float] = None):
+    """Flight mode and phase segments of a log, or the mode and phase at one timestamp."""
+    index = await run_blocking("io", load_flight_index, fileKey)
+    if index is None:
+        raise HTTPException(status_code=404, detail="No flight phases for this file")
+    if at is not None:
+        return {"timestamp": at, **index.at(at)}
+    return FastJSONResponse({"segments": [{"kind": kind, "label": label, "start": start, "end": end}
+                                          for start, end, kind, label in index.entries]})
+
+@app.get("/api/export/{fileKey}")
+async def export_log(fileKey: str):
+    """The parsed log as a zip of Parquet files (one per message type), trajectory and metadata."""
+    if not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+    if not has_parquet_log(fileKey):
+        if fileKey not in file_data:
+            raise HTTPException(status_code=404, detail="File not found")
+        await run_blocking("cpu", export_parsed_log, fileKey, file_data[fileKey]["parsed_data"])
+    body = await run_blocking("io", archive_parquet_log, fileKey)
+    return Response(body, media_type="application/zip",
+                    headers={"Content-Disposition": f'attachment; filename="{fileKey}.parquet.zip"'})
+
+@app.get("/metrics")
+async def metrics():
+    """Stage timers, request durations, pool/cache/LLM gauges and memory in the Prometheus text format."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json"):
+    """Profile of a request sent with "X-Profile: 1" (PROFILING_ENABLED=1).
+
+    format=folded returns collapsed stacks (flamegraph.pl, speedscope),
+    format=cprofile the cProfile table of the event loop thread.
+    """
+    profile = profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(profile["folded"], media_type="text/plain")
+    if format == "cprofile":
+        return Response(profile["cprofile"], media_type="text/plain")
+    return {k: v for k, v in profile.items() if k != "folded"}
+
+@app.get("/api/executor-stats")
+async def executor_stats():
+    """Queue and run-time metrics of the blocking-work pools, plus event loop lag."""
+    return {**executor_metrics(), "event_loop": loop_lag.metrics()}
+
+@app.get("/api/storage")
+async def storage_usage():
+    """Bytes on disk by artifact kind (uploads, indexes, Parquet), number of logs and the GC settings."""
+    return await run_blocking("io", storage.usage)
+
+@app.post("/api/storage/gc")
+async def storage_gc(dry_run: bool = False):
+    """Remove orphaned, expired and over-quota logs; reports what was removed and the bytes reclaimed."""
+    return await collect_storage(dry_run)
+
 @app.post("/api/clear-history")
 async def clear_history():
     try:
-        # Clear all uploaded files and data
+        # Clear all uploaded files (any extension, compressed or not), their indexes and Parquet copies
+        reclaimed = 0
         for file_key in list(file_data.keys()):
-            file_path = UPLOAD_DIR / f"{file_key}.bin"
-            if file_path.exists():
-                file_path.unlink()
-            del file_data[file_key]
-        return {"status": "success"}
+            removed = await run_blocking("io", storage.remove, file_key)
+            reclaimed += removed["bytes"]
+            forget_log(file_key)
+        return {"status": "success", "bytes_reclaimed": reclaimed}
     except Exception as e:
         logger.error(f"Error clearing history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,21 @@
 import os
 import logging
+import mmap
+import struct
+from array import array
+from operator import attrgetter, itemgetter
+import numpy as np
 from pathlib import Path
-from pymavlink import mavutil
-from typing import Dict, List, Any, Optional
+from pymavlink import mavutil, DFReader
+from pymavlink.dialects.v20 import ardupilotmega as mavlink_dialect
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple, Generator, BinaryIO
 import json
 import time
 import datetime
+from .online_detectors import OnlineAnomalyMonitor
+from .facts import compute_flight_facts
+from .flight_phases import build_flight_phases
+from .storage import is_compressed, log_suffix, open_log, materialized
 
 # Configure logging
 logging.basicConfig(
@@ -14,21 +24,294 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# MAV_TYPE of the HEARTBEAT -> vehicle name
+VEHICLE_TYPES = {
+    0: "Generic",
+    1: "Fixed Wing",
+    2: "Quadcopter",
+    3: "Coaxial Helicopter",
+    4: "Helicopter",
+    5: "Antenna Tracker",
+    6: "GCS",
+    7: "Airship",
+    8: "Free Balloon",
+    9: "Rocket",
+    10: "Ground Rover",
+    11: "Surface Boat",
+    12: "Submarine",
+    13: "Hexacopter",
+    14: "Octocopter",
+    15: "Tricopter",
+    16: "Flapping Wing",
+    17: "Kite",
+    18: "Onboard Controller",
+    19: "VTOL Duorotor",
+    20: "VTOL Quadrotor",
+    21: "VTOL Tiltrotor",
+    22: "VTOL Reserved 2",
+    23: "VTOL Reserved 3",
+    24: "VTOL Reserved 4",
+    25: "VTOL Reserved 5",
+    26: "Gimbal",
+    27: "ADSB",
+    28: "Parafoil",
+    29: "Dodecarotor"
+}
+# Firmware name in DataFlash MSG texts -> vehicle name, checked in order
+FIRMWARE_VEHICLES = [
+    ("arduplane", "Fixed Wing"),
+    ("arducopter", "Quadcopter"),
+    ("ardusub", "Submarine"),
+    ("rover", "Ground Rover"),
+    ("tracker", "Antenna Tracker"),
+]
+
+def vehicle_type_name(heartbeat_type: Optional[int], msg_texts: Iterable[str] = ()) -> str:
+    """Vehicle name from the first HEARTBEAT's type, else from the firmware MSG texts."""
+    if heartbeat_type is not None:
+        return VEHICLE_TYPES.get(heartbeat_type, f"Unknown Type {heartbeat_type}")
+    for text in msg_texts:
+        text = text.lower()
+        for keyword, name in FIRMWARE_VEHICLES:
+            if keyword in text:
+                return name
+    return "UNKNOWN"
+
+class MessageBuffer:
+    """Rows of one message type, plus its numeric fields as flat float64 buffers.
+
+    The numeric fields are resolved from the first message; every row is
+    appended to an array("d") that becomes parsed_data["columns"] without a
+    second pass over the dicts (see columns.message_columns).
+    """
+
+    def __init__(self, sample: Dict[str, Any], buffered: bool = True):
+        self.rows: List[Dict[str, Any]] = []
+        self.fields: List[str] = []
+        self.values: Optional[array] = None
+        self.timestamps: Optional[array] = None
+        if buffered:
+            self.fields = [k for k, v in sample.items() if isinstance(v, (int, float)) and k != "_timestamp"]
+        if self.fields:
+            getter = itemgetter(*self.fields)
+            self._numeric = getter if len(self.fields) > 1 else (lambda d, g=getter: (g(d),))
+            self.values = array("d")
+            self.timestamps = array("d")
+
+    def append(self, msg_dict: Dict[str, Any], timestamp: float) -> None:
+        msg_dict["_timestamp"] = timestamp
+        self.rows.append(msg_dict)
+        if self.values is not None:
+            row = self._numeric(msg_dict)
+            try:
+                self.timestamps.append(timestamp)
+                self.values.extend(row)
+            except (TypeError, ValueError, OverflowError):
+                # A non-numeric value: leave this type to the lazy conversion in columns.py
+                self.values = self.timestamps = None
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """float64 column per numeric field and _timestamp, as built by columns.message_columns."""
+        if self.values is None or len(self.timestamps) != len(self.rows):
+            return {}
+        table = np.frombuffer(self.values, dtype=np.float64).reshape(len(self.rows), len(self.fields))
+        columns = {field: table[:, i].copy() for i, field in enumerate(self.fields)}
+        columns["_timestamp"] = np.frombuffer(self.timestamps, dtype=np.float64).copy()
+        return columns
+
+class MessageExtractor:
+    """to_dict and timestamp lookup for one pymavlink message type, resolved from its first message.
+
+    Picks the timestamp attribute once instead of probing every message and
+    builds the message dict from one attrgetter call (MAVLink messages; other
+    message classes, e.g. DataFlash, use to_dict).
+    """
+    TIMESTAMP_ATTRS = (("_timestamp", 1.0), ("time_boot_ms", 1e-3), ("time_unix_usec", 1e-6))
+
+    def __init__(self, msg):
+        self.msg_type = msg.get_type()
+        self.timestamp = None
+        for attr, scale in self.TIMESTAMP_ATTRS:
+            if hasattr(msg, attr):
+                getter = attrgetter(attr)
+                self.timestamp = getter if scale == 1.0 else (lambda m, g=getter, k=scale: g(m) * k)
+                break
+
+        names = list(getattr(msg, "_fieldnames", None) or [])
+        self._getter = None
+        if names and hasattr(msg, "format_attr"):
+            getter = attrgetter(*names)
+            self._getter = getter if len(names) > 1 else (lambda m, g=getter: (g(m),))
+            self._names = names
+            types = getattr(msg, "fieldtypes", None) or []
+            self._strings = [n for n, t in zip(names, types) if t == "char"]
+
+    def to_dict(self, msg) -> Dict[str, Any]:
+        if self._getter is None:
+            return msg.to_dict()
+        msg_dict = {"mavpackettype": self.msg_type}
+        msg_dict.update(zip(self._names, self._getter(msg)))
+        for name in self._strings:
+            # Same conversion as MAVLink_message.format_attr
+            value = msg_dict[name]
+            if isinstance(value, bytes):
+                msg_dict[name] = value.decode(errors="backslashreplace").rstrip("\x00")
+        return msg_dict
+
+class FastPathUnsupported(Exception):
+    """The log needs pymavlink's tolerant parser (bad bytes, CRC errors, unknown messages)."""
+
+class TlogDecoder:
+    """Decoder for well-formed .tlog files that skips pymavlink's byte-wise parser.
+
+    Walks the records by their header lengths and checks each CRC like
+    MAVLink.decode. Message types without array or char fields are unpacked
+    with their struct and reordered into the to_dict field order by one
+    itemgetter; the others are built through their pymavlink class so strings
+    and arrays convert exactly as before. Anything pymavlink would resync
+    over or report as BAD_DATA raises FastPathUnsupported instead.
+    """
+
+    def __init__(self):
+        # The dialect module mavlink_connection(dialect='ardupilotmega') decodes with
+        mavutil.set_dialect("ardupilotmega")
+        self.dialect = mavutil.mavlink
+        self.check_crc = not getattr(self.dialect, "MAVLINK_IGNORE_CRC", False)
+        self._decoders: Dict[int, Any] = {}
+
+    def _compile(self, msg_id: int):
+        msg_class = self.dialect.mavlink_map.get(msg_id)
+        if msg_class is None:
+            raise FastPathUnsupported(f"unknown message id {msg_id}")
+        msg_type = msg_class.msgname
+        unpack = msg_class.unpacker.unpack
+        size = msg_class.unpacker.size
+        orders, lengths = msg_class.orders, msg_class.lengths
+
+        if sum(lengths) == len(lengths) and "char" not in msg_class.fieldtypes:
+            names = msg_class.fieldnames
+            reorder = itemgetter(*orders) if len(orders) > 1 else (lambda t, o=orders[0]: (t[o],))
+
+            def decode(payload: bytes) -> Dict[str, Any]:
+                if len(payload) < size:
+                    # MAVLink 2 truncates trailing zero bytes
+                    payload += bytes(size - len(payload))
+                msg_dict = {"mavpackettype": msg_type}
+                msg_dict.update(zip(names, reorder(unpack(payload[:size]))))
+                return msg_dict
+        else:
+            starts = [sum(lengths[:order]) for order in range(len(lengths))]
+
+            def decode(payload: bytes) -> Dict[str, Any]:
+                if len(payload) < size:
+                    payload += bytes(size - len(payload))
+                t = unpack(payload[:size])
+                values = []
+                for order in orders:
+                    field = t[starts[order]]
+                    if lengths[order] == 1 or isinstance(field, bytes):
+                        values.append(field.rstrip(b"\x00") if isinstance(field, bytes) else field)
+                    else:
+                        values.append(list(t[starts[order]:starts[order] + lengths[order]]))
+                return msg_class(*values).to_dict()
+
+        return msg_class.crc_extra, decode
+
+    def messages(self, data) -> Iterator[Tuple[str, float, Dict[str, Any]]]:
+        """(message type, receive time in seconds, message dict) of every record in .tlog bytes."""
+        yield from self._records(data, final=True)
+
+    def stream_messages(self, stream: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, float, Dict[str, Any]]]:
+        """Like messages, reading the .tlog from a stream (e.g. a zstd decompressor) chunk by chunk."""
+        pending = b""
+        while True:
+            chunk = stream.read(chunk_size)
+            data = pending + chunk if pending else chunk
+            consumed = yield from self._records(data, final=not chunk)
+            if not chunk:
+                return
+            pending = data[consumed:]
+
+    def _records(self, data, final: bool) -> Generator[Tuple[str, float, Dict[str, Any]], None, int]:
+        """Decode the complete records of data; returns the offset decoding stopped at.
+
+        Unless final, a record cut off at the end of data is left for the next chunk.
+        """
+        decoders = self._decoders
+        x25crc = self.dialect.x25crc
+        i, end = 0, len(data)
+        while i < end:
+            if i + 18 > end:
+                if not final:
+                    return i
+                raise FastPathUnsupported(f"{end - i} trailing bytes")
+            magic = data[i + 8]
+            if magic == 0xFD:
+                length, flags = data[i + 9], data[i + 10]
+                if flags & ~0x01:
+                    raise FastPathUnsupported(f"incompatibility flags 0x{flags:02x} at offset {i + 8}")
+                header, signature = 10, 13 if flags & 0x01 else 0
+                msg_id = data[i + 15] | data[i + 16] << 8 | data[i + 17] << 16
+            elif magic == 0xFE:
+                length, header, signature = data[i + 9], 6, 0
+                msg_id = data[i + 13]
+            else:
+                raise FastPathUnsupported(f"unexpected byte 0x{magic:02x} at offset {i + 8}")
+            packet_end = i + 8 + header + length + 2 + signature
+            if packet_end > end:
+                if not final:
+                    return i
+                raise FastPathUnsupported("truncated last record")
+
+            compiled = decoders.get(msg_id)
+            if compiled is None:
+                compiled = decoders[msg_id] = self._compile(msg_id)
+            crc_extra, decode = compiled
+            payload_end = i + 8 + header + length
+            if self.check_crc:
+                crc = data[payload_end] | data[payload_end + 1] << 8
+                if x25crc(data[i + 9:payload_end] + bytes((crc_extra,))).crc != crc:
+                    raise FastPathUnsupported(f"CRC mismatch in message id {msg_id} at offset {i + 8}")
+            msg_dict = decode(data[i + 8 + header:payload_end])
+            yield msg_dict["mavpackettype"], struct.unpack_from(">Q", data, i)[0] * 1.0e-6, msg_dict
+            i = packet_end
+        return i
+
 class MAVLinkParser:
-    def __init__(self, file_path: Path):
+    def __init__(self, file_path: Path, fast_path: bool = True):
         self.file_path = file_path
-        self.messages = {}
+        # False: decode every message through pymavlink with to_dict and the
+        # generic timestamp lookup (the reference for the fast path)
+        self.fast_path = fast_path
+        # Log format suffix, also for zstd compressed logs (x.tlog.zst)
+        self.suffix = log_suffix(file_path)
         self.metadata = {
             "file_name": file_path.name,
             "file_size": os.path.getsize(file_path),
+        }
+        self._reset()
+
+    def _reset(self):
+        """Clear everything collected by a previous (abandoned) decode."""
+        self.messages = {}
+        self.metadata.update({
             "message_count": 0,
             "first_timestamp": None,
             "last_timestamp": None,
             "corrupted_messages": 0
-        }
+        })
         self.message_types = set()
         self.current_timestamp = None
-        
+        self.online_monitor = OnlineAnomalyMonitor()
+        self._buffers: Dict[str, MessageBuffer] = {}
+        # Seconds per parse stage, reported by the caller (parsing runs in a worker process)
+        self._timings = {"decode": 0.0, "columns": 0.0, "online_monitor": 0.0}
+        self.trajectory = []
+        self.time_trajectory = {}
+        self.start_altitude = None
+        self._last_position = None
+        self._last_position_time = None
+
     def _get_timestamp(self, msg) -> float:
         """Get timestamp from message, with fallbacks."""
         try:
@@ -47,89 +330,158 @@ class MAVLinkParser:
         except Exception as e:
             logger.warning(f"Error getting timestamp from message: {e}")
             return time.time()
-        
-    def parse(self) -> Dict[str, Any]:
-        """Parse the MAVLink log file and return processed data with high-level info."""
-        try:
-            # Handle both .bin and .tlog files
-            if self.file_path.suffix.lower() == '.tlog':
-                mlog = mavutil.mavlink_connection(str(self.file_path), dialect='ardupilotmega')
-            else:
-                mlog = mavutil.mavlink_connection(str(self.file_path))
 
-            logger.info(f"Processing file: {self.file_path}")
+    def _record(self, msg_type: str, timestamp: float, msg_dict: Dict[str, Any]) -> None:
+        """Store one decoded message and feed the streaming consumers."""
+        self.metadata["message_count"] += 1
+        buffer = self._buffers.get(msg_type)
+        if buffer is None:
+            buffer = self._buffers[msg_type] = MessageBuffer(msg_dict, self.fast_path)
+            self.message_types.add(msg_type)
+            self.messages[msg_type] = buffer.rows
 
-            # Initialize trajectory data
-            trajectory = []
-            time_trajectory = {}
-            start_altitude = None
-            last_position = None
-            last_timestamp = None
+        if self.metadata["first_timestamp"] is None:
+            self.metadata["first_timestamp"] = timestamp
+        self.metadata["last_timestamp"] = timestamp
 
-            # Process messages
-            while True:
-                try:
-                    msg = mlog.recv_match()
-                    if msg is None:
-                        break
+        clock = time.perf_counter
+        started = clock()
+        buffer.append(msg_dict, timestamp)
+        stored = clock()
+        # Streaming anomaly detection while the log is decoded
+        self.online_monitor.observe(msg_type, msg_dict, timestamp)
+        self._timings["online_monitor"] += clock() - stored
+        self._timings["columns"] += stored - started
+
+        # Process position data for trajectory
+        if msg_type == 'GLOBAL_POSITION_INT':
+            self._add_position(msg_dict, timestamp)
+
+    def _add_position(self, msg_dict: Dict[str, Any], timestamp: float) -> None:
+        lat = msg_dict["lat"] / 1e7  # Convert from int to degrees
+        lon = msg_dict["lon"] / 1e7  # Convert from int to degrees
+        relative_alt = msg_dict["relative_alt"] / 1000.0  # Convert from mm to meters
+
+        # Only add point if position has changed significantly and enough time has passed
+        if self._last_position_time is None or (timestamp - self._last_position_time) >= 200:  # 200ms minimum between points
+            last_position = self._last_position
+            if last_position is None or (
+                abs(lat - last_position[0]) > 0.00001 or  # ~1m at equator
+                abs(lon - last_position[1]) > 0.00001 or
+                abs(relative_alt - last_position[2]) > 0.1  # 0.1m
+            ):
+                if self.start_altitude is None:
+                    self.start_altitude = relative_alt
+
+                # Add to trajectory with relative altitude
+                self.trajectory.append([
+                    lon,
+                    lat,
+                    relative_alt - self.start_altitude,
+                    timestamp * 1000  # Convert to milliseconds for visualization
+                ])
 
-                    self.metadata["message_count"] += 1
+                # Add to time trajectory with absolute altitude
+                self.time_trajectory[timestamp * 1000] = [
+                    lon,
+                    lat,
+                    relative_alt,
+                    timestamp * 1000
+                ]
+
+                self._last_position = (lat, lon, relative_alt)
+                self._last_position_time = timestamp
+
+    def _decode_tlog(self) -> None:
+        """Decode a .tlog with TlogDecoder; raises FastPathUnsupported for logs it cannot handle."""
+        if is_compressed(self.file_path):
+            # Decompressed as a stream straight into the decoder, never whole in memory or on disk
+            with open_log(self.file_path) as stream:
+                self._consume(TlogDecoder().stream_messages(stream))
+            return
+        with open(self.file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self._consume(TlogDecoder().messages(data))
+
+    def _consume(self, messages: Iterator[Tuple[str, float, Dict[str, Any]]]) -> None:
+        clock = time.perf_counter
+        timings = self._timings
+        while True:
+            started = clock()
+            decoded = next(messages, None)
+            timings["decode"] += clock() - started
+            if decoded is None:
+                break
+            self._record(*decoded)
+
+    def _decode_pymavlink(self) -> None:
+        # pymavlink reads from a path: compressed logs are decompressed to a temporary file first
+        with materialized(self.file_path) as path:
+            self._decode_pymavlink_file(path)
+
+    def _decode_pymavlink_file(self, path: Path) -> None:
+        # Handle both .bin and .tlog files
+        if self.suffix == '.tlog':
+            mlog = mavutil.mavlink_connection(str(path), dialect='ardupilotmega')
+        else:
+            mlog = mavutil.mavlink_connection(str(path))
+
+        clock = time.perf_counter
+        timings = self._timings
+        extractors: Dict[str, MessageExtractor] = {}
+        while True:
+            try:
+                started = clock()
+                msg = mlog.recv_match()
+                if msg is None:
+                    timings["decode"] += clock() - started
+                    break
+
+                msg_type = msg.get_type()
+                if not self.fast_path:
                     timestamp = self._get_timestamp(msg)
-                    
-                    if self.metadata["first_timestamp"] is None:
-                        self.metadata["first_timestamp"] = timestamp
-                    self.metadata["last_timestamp"] = timestamp
-
-                    msg_type = msg.get_type()
-                    self.message_types.add(msg_type)
-                    if msg_type not in self.messages:
-                        self.messages[msg_type] = []
-                    
-                    # Convert message to dict and add timestamp
                     msg_dict = msg.to_dict()
-                    msg_dict['_timestamp'] = timestamp
-                    self.messages[msg_type].append(msg_dict)
-
-                    # Process position data for trajectory
-                    if msg_type == 'GLOBAL_POSITION_INT':
-                        lat = msg.lat / 1e7  # Convert from int to degrees
-                        lon = msg.lon / 1e7  # Convert from int to degrees
-                        alt = msg.alt / 1000.0  # Convert from mm to meters
-                        relative_alt = msg.relative_alt / 1000.0  # Convert from mm to meters
-                        
-                        # Only add point if position has changed significantly and enough time has passed
-                        if last_timestamp is None or (timestamp - last_timestamp) >= 200:  # 200ms minimum between points
-                            if last_position is None or (
-                                abs(lat - last_position[0]) > 0.00001 or  # ~1m at equator
-                                abs(lon - last_position[1]) > 0.00001 or
-                                abs(relative_alt - last_position[2]) > 0.1  # 0.1m
-                            ):
-                                if start_altitude is None:
-                                    start_altitude = relative_alt
-                                
-                                # Add to trajectory with relative altitude
-                                trajectory.append([
-                                    lon,
-                                    lat,
-                                    relative_alt - start_altitude,
-                                    timestamp * 1000  # Convert to milliseconds for visualization
-                                ])
-                                
-                                # Add to time trajectory with absolute altitude
-                                time_trajectory[timestamp * 1000] = [
-                                    lon,
-                                    lat,
-                                    relative_alt,
-                                    timestamp * 1000
-                                ]
-                                
-                                last_position = (lat, lon, relative_alt)
-                                last_timestamp = timestamp
-                    
-                except Exception as e:
-                    self.metadata["corrupted_messages"] += 1
-                    logger.warning(f"Error processing message: {e}")
-                    continue
+                else:
+                    extractor = extractors.get(msg_type)
+                    if extractor is None:
+                        extractor = extractors[msg_type] = MessageExtractor(msg)
+                    timestamp = None
+                    if extractor.timestamp is not None:
+                        try:
+                            timestamp = extractor.timestamp(msg)
+                        except Exception:
+                            timestamp = None
+                    if timestamp is None:
+                        timestamp = self._get_timestamp(msg)
+                    msg_dict = extractor.to_dict(msg)
+                timings["decode"] += clock() - started
+                self._record(msg_type, timestamp, msg_dict)
+
+            except Exception as e:
+                self.metadata["corrupted_messages"] += 1
+                logger.warning(f"Error processing message: {e}")
+                continue
+
+    def parse(self) -> Dict[str, Any]:
+        """Parse the MAVLink log file and return processed data with high-level info."""
+        try:
+            logger.info(f"Processing file: {self.file_path}")
+            self._reset()
+            decoded = False
+            if self.fast_path and self.suffix == '.tlog':
+                try:
+                    self._decode_tlog()
+                    decoded = True
+                except FastPathUnsupported as e:
+                    logger.info(f"Fast tlog decoding not possible ({e}), decoding with pymavlink")
+                    self._reset()
+            if not decoded:
+                self._decode_pymavlink()
+
+            timings = self._timings
+            clock = time.perf_counter
 
             if self.metadata["first_timestamp"] and self.metadata["last_timestamp"]:
                 self.metadata["duration"] = self.metadata["last_timestamp"] - self.metadata["first_timestamp"]
@@ -139,16 +491,17 @@ class MAVLinkParser:
                 logger.warning(f"Found {self.metadata['corrupted_messages']} corrupted messages in the log file")
 
             # Process high-level data
+            started = clock()
             attitude = self._process_attitude()
-            flight_modes = self._process_flight_modes()
             vehicle_type = self._get_vehicle_type()
+            timings["summaries"] = clock() - started
 
             # Format trajectory data for visualization
             trajectory_data = {
                 "GLOBAL_POSITION_INT": {
-                    "startAltitude": start_altitude,
-                    "trajectory": trajectory,
-                    "timeTrajectory": time_trajectory
+                    "startAltitude": self.start_altitude,
+                    "trajectory": self.trajectory,
+                    "timeTrajectory": self.time_trajectory
                 }
             }
 
@@ -158,21 +511,37 @@ class MAVLinkParser:
             
             # Add trajectory data to metadata
             self.metadata["trajectory_data"] = trajectory_data
-            self.metadata["currentTrajectory"] = trajectory
+            self.metadata["currentTrajectory"] = self.trajectory
 
             # Add trajectory sources to metadata
             self.metadata["trajectorySources"] = ["GLOBAL_POSITION_INT"]
 
-            return {
+            result = {
                 "messages": self.messages,
+                # Numeric columns filled during decoding (see columns.message_columns)
+                "columns": {t: cols for t, b in self._buffers.items() if (cols := b.columns())},
                 "metadata": self.metadata,
                 "trajectory_data": trajectory_data,
                 "attitude": attitude,
-                "flight_modes": flight_modes,
+                "flight_modes": [],
                 "vehicle_type": vehicle_type,
+                "online_anomalies": self.online_monitor.events(),
                 "types": list(self.message_types)  # Add message types to response
             }
 
+            # Mode and phase segments behind the time-scoped tool queries (see flight_phases)
+            started = clock()
+            result["flight_phases"] = build_flight_phases(result)
+            result["flight_modes"] = self._process_flight_modes(result["flight_phases"])
+            timings["phases"] = clock() - started
+
+            # Precompute the flight facts table used to answer common questions directly
+            started = clock()
+            result["facts"] = compute_flight_facts(result)
+            timings["facts"] = clock() - started
+            self.metadata["parse_timings"] = timings
+            return result
+
         except Exception as e:
             logger.error(f"Error parsing file: {e}", exc_info=True)
             raise
@@ -195,82 +564,15 @@ class MAVLinkParser:
                 
         return attitude
 
-    def _process_flight_modes(self) -> List[Dict[str, Any]]:
-        """Process flight mode changes."""
-        flight_modes = []
-        if "HEARTBEAT" in self.messages:
-            for msg in self.messages["HEARTBEAT"]:
-                if "custom_mode" in msg:
-                    flight_modes.append({
-                        "timestamp": msg["_timestamp"],
-                        "mode": msg["custom_mode"]
-                    })
-        return flight_modes
+    def _process_flight_modes(self, flight_phases: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Flight mode changes (not every HEARTBEAT) with the mode's name for the vehicle type."""
+        return [{"timestamp": s["start"], "mode": s["mode"], "name": s["name"]} for s in flight_phases["modes"]]
 
     def _get_vehicle_type(self) -> str:
-        """Get vehicle type from heartbeat messages."""
-        vehicle_type = "UNKNOWN"
-        
-        # First try to get from HEARTBEAT messages
-        if "HEARTBEAT" in self.messages and self.messages["HEARTBEAT"]:
-            type_id = self.messages["HEARTBEAT"][0].get("type")
-            if type_id is not None:
-                # Map numeric type to descriptive name
-                type_map = {
-                    0: "Generic",
-                    1: "Fixed Wing",
-                    2: "Quadcopter",
-                    3: "Coaxial Helicopter",
-                    4: "Helicopter",
-                    5: "Antenna Tracker",
-                    6: "GCS",
-                    7: "Airship",
-                    8: "Free Balloon",
-                    9: "Rocket",
-                    10: "Ground Rover",
-                    11: "Surface Boat",
-                    12: "Submarine",
-                    13: "Hexacopter",
-                    14: "Octocopter",
-                    15: "Tricopter",
-                    16: "Flapping Wing",
-                    17: "Kite",
-                    18: "Onboard Controller",
-                    19: "VTOL Duorotor",
-                    20: "VTOL Quadrotor",
-                    21: "VTOL Tiltrotor",
-                    22: "VTOL Reserved 2",
-                    23: "VTOL Reserved 3",
-                    24: "VTOL Reserved 4",
-                    25: "VTOL Reserved 5",
-                    26: "Gimbal",
-                    27: "ADSB",
-                    28: "Parafoil",
-                    29: "Dodecarotor"
-                }
-                vehicle_type = type_map.get(type_id, f"Unknown Type {type_id}")
-        
-        # If still unknown, try to get from MSG messages
-        if vehicle_type == "UNKNOWN" and "MSG" in self.messages:
-            for msg in self.messages["MSG"]:
-                msg_text = msg.get("Message", "").lower()
-                if "arduplane" in msg_text:
-                    vehicle_type = "Fixed Wing"
-                    break
-                elif "arducopter" in msg_text:
-                    vehicle_type = "Quadcopter"
-                    break
-                elif "ardusub" in msg_text:
-                    vehicle_type = "Submarine"
-                    break
-                elif "rover" in msg_text:
-                    vehicle_type = "Ground Rover"
-                    break
-                elif "tracker" in msg_text:
-                    vehicle_type = "Antenna Tracker"
-                    break
-        
-        return vehicle_type
+        """Get vehicle type from heartbeat messages, or from MSG texts for DataFlash logs."""
+        heartbeats = self.messages.get("HEARTBEAT") or []
+        type_id = heartbeats[0].get("type") if heartbeats else None
+        return vehicle_type_name(type_id, (msg.get("Message", "") for msg in self.messages.get("MSG", [])))
 
     def get_datetime_from_timestamp(self, timestamp: float) -> str:
         """Convert a timestamp to a datetime string.
@@ -296,6 +598,51 @@ class MAVLinkParser:
             logger.error(f"Error converting timestamp {timestamp}: {e}")
             return "Invalid timestamp"
 
+    def quick_scan(self) -> Dict[str, Any]:
+        """Summarize the log from packet headers alone, without a full decode.
+
+        Walks the .tlog records or DataFlash messages by their lengths,
+        counting message types; only the first HEARTBEAT (tlog), the FMT and
+        a few MSG messages (DataFlash) and the first/last timestamps are
+        decoded. Counts can differ from parse() on corrupt logs, since CRCs
+        are not checked. Time range: tlog receive times as in parse(),
+        DataFlash TimeUS (seconds since boot).
+
+        Returns:
+            Dict[str, Any]: file name and size, format, message_count,
+            message_counts by type, types, first/last timestamp, duration,
+            vehicle_type, skipped_bytes and scan_seconds
+        """
+        started = time.perf_counter()
+        # Compressed logs are scanned from a decompressed temporary copy, mapped like a plain log
+        with materialized(self.file_path) as path, open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                data = b""
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if self.suffix == ".tlog":
+                    summary = {"format": "tlog", **_scan_tlog(data)}
+                else:
+                    summary = {"format": "dataflash", **_scan_dataflash(data)}
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+        counts = summary["message_counts"]
+        first, last = summary.pop("first_timestamp"), summary.pop("last_timestamp")
+        return {
+            "file_name": self.file_path.name,
+            "file_size": self.metadata["file_size"],
+            "message_count": sum(counts.values()),
+            "types": list(counts),
+            "first_timestamp": first,
+            "last_timestamp": last,
+            "duration": last - first if first is not None and last is not None else None,
+            **summary,
+            "scan_seconds": time.perf_counter() - started,
+        }
+
     def get_message_summary(self) -> Dict[str, int]:
         """Get a summary of message types and their counts."""
         return {msg_type: len(msgs) for msg_type, msgs in self.messages.items()}
@@ -323,4 +670,122 @@ class MAVLinkParser:
             elif msg_type == "HEARTBEAT":
                 telemetry["heartbeat"].extend(messages)
                 
-        return telemetry 
\ No newline at end of file
+        return telemetry 
+
+def _scan_tlog(data) -> Dict[str, Any]:
+    """Message counts, first HEARTBEAT type and time range of .tlog bytes.
+
+    A tlog record is an 8-byte big-endian microsecond timestamp followed by a
+    MAVLink v1 (0xFE) or v2 (0xFD) packet, whose header gives its length.
+    """
+    counts: Dict[int, int] = {}
+    heartbeat_type = None
+    first_record = last_record = None
+    skipped = 0
+    i, end = 0, len(data)
+    while i + 18 <= end:
+        magic = data[i + 8]
+        if magic == 0xFD:
+            size = data[i + 9] + 12 + (13 if data[i + 10] & 0x01 else 0)
+            msg_id = data[i + 15] | data[i + 16] << 8 | data[i + 17] << 16
+        elif magic == 0xFE:
+            size = data[i + 9] + 8
+            msg_id = data[i + 13]
+        else:
+            # Not a record boundary: resynchronize byte by byte, as pymavlink does
+            i += 1
+            skipped += 1
+            continue
+        if i + 8 + size > end:
+            break
+        counts[msg_id] = counts.get(msg_id, 0) + 1
+        if first_record is None:
+            first_record = i
+        last_record = i
+        if msg_id == 0 and heartbeat_type is None:
+            try:
+                decoder = mavlink_dialect.MAVLink(None)
+                decoder.robust_parsing = True
+                heartbeat_type = decoder.decode(bytearray(data[i + 8:i + 8 + size])).type
+            except Exception as e:
+                logger.warning(f"Could not decode HEARTBEAT while scanning: {e}")
+        i += 8 + size
+
+    names: Dict[str, int] = {}
+    for msg_id, count in counts.items():
+        msg_class = mavlink_dialect.mavlink_map.get(msg_id)
+        name = msg_class.msgname if msg_class is not None else f"UNKNOWN_{msg_id}"
+        names[name] = names.get(name, 0) + count
+    timestamp = lambda offset: struct.unpack_from(">Q", data, offset)[0] / 1e6 if offset is not None else None
+    return {
+        "message_counts": names,
+        "first_timestamp": timestamp(first_record),
+        "last_timestamp": timestamp(last_record),
+        "vehicle_type": vehicle_type_name(heartbeat_type),
+        "skipped_bytes": skipped + max(0, end - i),
+    }
+
+DATAFLASH_HEAD = b"\xa3\x95"
+DATAFLASH_FMT = 128
+# MSG texts decoded to find the firmware (vehicle) name
+SCAN_MSG_TEXTS = 20
+
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("ascii", errors="replace")
+
+def _scan_dataflash(data) -> Dict[str, Any]:
+    """Message counts, firmware MSG texts and TimeUS range of DataFlash (.bin) bytes.
+
+    Messages start with 0xA3 0x95 and a type id; their lengths come from the
+    FMT messages, which are the only ones decoded in full.
+    """
+    # type id -> [name, length including the header, format, has TimeUS first, count]
+    formats: Dict[int, list] = {DATAFLASH_FMT: ["FMT", 89, "BBnNZ", False, 0]}
+    msg_texts: List[str] = []
+    first_time = last_time_offset = None
+    skipped = 0
+    i, end = 0, len(data)
+    while i + 3 <= end:
+        fmt = formats.get(data[i + 2]) if data[i] == 0xA3 and data[i + 1] == 0x95 else None
+        if fmt is None:
+            nxt = data.find(DATAFLASH_HEAD, i + 1)
+            nxt = end if nxt < 0 else nxt
+            skipped += nxt - i
+            i = nxt
+            continue
+        name, length, fmt_chars, has_time, _ = fmt
+        if i + length > end:
+            skipped += end - i
+            break
+        fmt[4] += 1
+        if data[i + 2] == DATAFLASH_FMT:
+            type_id, type_length, type_name, type_format, columns = struct.unpack_from("<BB4s16s64s", data, i + 3)
+            count = formats[type_id][4] if type_id in formats else 0
+            formats[type_id] = [_cstr(type_name), type_length, _cstr(type_format),
+                                _cstr(columns).startswith("TimeUS,"), count]
+        elif has_time:
+            if first_time is None:
+                first_time = struct.unpack_from("<Q", data, i + 3)[0]
+            last_time_offset = i
+            if name == "MSG" and len(msg_texts) < SCAN_MSG_TEXTS:
+                struct_format = "<" + "".join(DFReader.FORMAT_TO_STRUCT[c][0] for c in fmt_chars)
+                msg_texts += [_cstr(v) for v in struct.unpack_from(struct_format, data, i + 3) if isinstance(v, bytes)]
+        i += length
+
+    counts = {fmt[0]: fmt[4] for fmt in formats.values() if fmt[4]}
+    last_time = struct.unpack_from("<Q", data, last_time_offset + 3)[0] if last_time_offset is not None else None
+    return {
+        "message_counts": counts,
+        "first_timestamp": first_time / 1e6 if first_time is not None else None,
+        "last_timestamp": last_time / 1e6 if last_time is not None else None,
+        "vehicle_type": vehicle_type_name(None, msg_texts),
+        "skipped_bytes": skipped,
+    }
+
+def quick_scan_log(file_path: Path) -> Dict[str, Any]:
+    """Header-only summary of a log (see MAVLinkParser.quick_scan); module-level for process pools."""
+    return MAVLinkParser(Path(file_path)).quick_scan()
+
+def parse_log(file_path: Path) -> Dict[str, Any]:
+    """Parse a log file; module-level so it can run in a process pool."""
+    return MAVLinkParser(Path(file_path)).parse()
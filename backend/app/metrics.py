@@ -0,0 +1,392 @@
+"""Stage timers, counters and per-request profiling.
+
+Every pipeline stage (parsing, snippets, embeddings, FAISS, tools, LLM calls)
+reports its duration to a process-wide registry. GET /metrics renders the
+registry in the Prometheus text format, together with the executor, cache,
+LLM client and memory gauges registered as collectors.
+
+With PROFILING_ENABLED=1, a request sent with the header "X-Profile: 1" (or
+?profile=1) runs under cProfile, tracemalloc and a stack sampler. The
+response carries an X-Profile-Id header, and GET /api/profiles/{id} returns
+the profile; ?format=folded gives collapsed stacks for flamegraph.pl or
+speedscope.
+"""
+import cProfile
+import inspect
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, List, Tuple, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "uavlogviewer_"
+# Seconds; stages range from sub-millisecond lookups to minutes of embedding
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Optional[Dict[str, Any]]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Counters, histograms and gauges keyed by name and labels (thread-safe).
+
+    Collectors are callables run at render time that return
+    (name, type, help, [(labels dict, value), ...]) tuples for values kept
+    elsewhere, e.g. executor pool stats.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._gauges: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        # name -> labels -> [bucket counts..., sum, count]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._counters[name][key] = self._counters[name].get(key, 0) + value
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._gauges[name][_labels(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            # Non-cumulative counts (the last one is +Inf), summed at render time
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def add_collector(self, collector: Callable) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self, name: str) -> Dict[Labels, Dict[str, float]]:
+        """Count and sum per label set of a histogram (for tests and reports)."""
+        with self._lock:
+            return {k: {"count": v[-1], "sum": v[-2]} for k, v in self._histograms.get(name, {}).items()}
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            histograms = {n: {k: list(v) for k, v in s.items()} for n, s in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            header(name, "counter", self._help.get(name, ("", name))[1])
+            lines += [f"{PREFIX}{name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(series.items())]
+        for name, series in sorted(gauges.items()):
+            header(name, "gauge", self._help.get(name, ("", name))[1])
+            lines += [f"{PREFIX}{name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(series.items())]
+        for name, series in sorted(histograms.items()):
+            header(name, "histogram", self._help.get(name, ("", name))[1])
+            for key, values in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), values[:-2]):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {_format_value(values[-2])}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {values[-1]}")
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                header(name, kind, help_text)
+                lines += [f"{PREFIX}{name}{_format_labels(_labels(labels))} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+registry.describe("stage_duration_seconds", "histogram", "Duration of pipeline stages")
+registry.describe("stage_errors_total", "counter", "Pipeline stages that raised")
+registry.describe("http_request_duration_seconds", "histogram", "HTTP request duration by route")
+registry.describe("llm_calls_total", "counter", "LLM call attempts by outcome")
+
+def observe_stage(stage: str, seconds: float) -> None:
+    registry.observe("stage_duration_seconds", seconds, {"stage": stage})
+
+def record_timings(prefix: str, timings: Dict[str, float]) -> None:
+    """Report stage durations measured elsewhere, e.g. in a worker process."""
+    for name, seconds in timings.items():
+        observe_stage(f"{prefix}.{name}", seconds)
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as a pipeline stage; failures are also counted."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.inc("stage_errors_total", {"stage": stage})
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def instrumented(stage: str) -> Callable:
+    """Decorator form of timed, for plain and async functions."""
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def memory_collector() -> List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]:
+    """Resident set size (current and peak) and, while tracing, tracemalloc totals."""
+    families = []
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        families.append(("process_resident_memory_bytes", "gauge", "Resident set size", [({}, rss)]))
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        families.append(("process_peak_resident_memory_bytes", "gauge", "Peak resident set size", [({}, peak)]))
+    except ImportError:
+        pass
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        families.append(("tracemalloc_bytes", "gauge", "Memory traced by tracemalloc",
+                         [({"kind": "current"}, current), ({"kind": "peak"}, peak)]))
+    return families
+
+registry.add_collector(memory_collector)
+
+def dict_collector(name: str, help_text: str, source: Callable[[], Dict[str, Any]], label: Optional[str] = None) -> Callable:
+    """Collector exporting the numeric values of a metrics dict as gauges.
+
+    Without label every key becomes <name>_<key>; with label, source returns
+    {label value: metrics dict} (e.g. one dict per executor pool).
+    """
+    def collect():
+        data = source()
+        groups = data.items() if label else [(None, data)]
+        families: Dict[str, List[Tuple[Dict[str, Any], float]]] = defaultdict(list)
+        for group, metrics in groups:
+            if not isinstance(metrics, dict):
+                continue
+            for key, value in metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    families[f"{name}_{key}"].append(({label: group} if label else {}, value))
+        return [(family, "gauge", f"{help_text} ({family[len(name) + 1:]})", samples) for family, samples in families.items()]
+    return collect
+
+# --- Per-request profiling ---
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_INTERVAL = 0.005
+# Innermost frames of threads waiting for work; their samples are dropped
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+               ("thread.py", "_worker"), ("threading.py", "_wait_for_tstate_lock")}
+
+class StackSampler:
+    """Samples the stacks of every thread in the process into collapsed stacks.
+
+    cProfile only sees the thread it runs on; blocking stages run in executor
+    threads, so the flamegraph comes from periodic sys._current_frames() samples.
+    """
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts: Dict[str, int] = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.counts.items()))
+
+class RequestProfile:
+    """cProfile (event loop thread), tracemalloc and stack samples for one request."""
+    def __init__(self, path: str, top: int = 30):
+        self.id = uuid.uuid4().hex[:16]
+        self.path = path
+        self.top = top
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler()
+        self._started_tracemalloc = False
+        self.result: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self, status: Optional[int] = None) -> Dict[str, Any]:
+        self.profiler.disable()
+        self.sampler.stop()
+        elapsed = time.perf_counter() - self._started
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(self.top)
+        allocations = [
+            {"location": str(stat.traceback[0]), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in after.compare_to(self._before, "lineno")[:self.top]
+        ]
+        self.result = {
+            "id": self.id,
+            "path": self.path,
+            "status": status,
+            "elapsed_s": elapsed,
+            "tracemalloc_peak_bytes": peak,
+            "allocations": allocations,
+            "cprofile": out.getvalue(),
+            "folded": self.sampler.folded(),
+            "samples": sum(self.sampler.counts.values()),
+        }
+        return self.result
+
+class ProfileStore:
+    """The most recent request profiles, by id."""
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        self._profiles[profile["id"]] = profile
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(profile_id)
+
+profiles = ProfileStore()
+
+def _route_name(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route, and profiling opted-in requests.
+
+    Pure ASGI rather than BaseHTTPMiddleware, so streamed responses are timed
+    (and profiled) until their last chunk is sent.
+    """
+    def __init__(self, app, profiling: bool = PROFILING_ENABLED):
+        self.app = app
+        self.profiling = profiling
+        # One profiled request at a time: cProfile and tracemalloc are process-wide
+        self._profile_lock = threading.Lock()
+
+    def _wants_profile(self, scope: Dict[str, Any]) -> bool:
+        if not self.profiling:
+            return False
+        headers = dict(scope.get("headers") or [])
+        return headers.get(b"x-profile") == b"1" or b"profile=1" in scope.get("query_string", b"").split(b"&")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = None
+        if self._wants_profile(scope) and self._profile_lock.acquire(blocking=False):
+            profile = RequestProfile(scope.get("path", ""))
+            profile.start()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if profile is not None:
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.observe("http_request_duration_seconds", time.perf_counter() - started,
+                             {"method": scope.get("method", ""), "route": _route_name(scope), "status": status["code"]})
+            if profile is not None:
+                try:
+                    profiles.add(profile.stop(status["code"]))
+                finally:
+                    self._profile_lock.release()
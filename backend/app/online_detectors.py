@@ -0,0 +1,159 @@
+import math
+from typing import Dict, Any, List, Optional
+from .anomalies import MERGE_GAP
+
+class EWMAZScoreDetector:
+    """Flags samples far from an exponentially weighted running mean.
+
+    The z-score is computed against the mean/variance *before* the sample is
+    folded in, so a sudden spike is scored against the history that preceded it.
+    """
+    def __init__(self, alpha: float = 0.05, threshold: float = 6.0, warmup: int = 20, min_std: float = 1e-3):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_std = min_std
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, x: float) -> Optional[float]:
+        """Fold in a sample and return its z-score if it is anomalous, else None."""
+        self.count += 1
+        if self.count == 1:
+            self.mean = x
+            return None
+        diff = x - self.mean
+        z = abs(diff) / max(math.sqrt(self.var), self.min_std)
+        incr = self.alpha * diff
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + diff * incr)
+        if self.count > self.warmup and z > self.threshold:
+            return z
+        return None
+
+class CUSUMDetector:
+    """Two-sided CUSUM change-point detector on standardized residuals.
+
+    Residuals are standardized against a slow EWMA baseline. On an alarm the
+    cumulative sums reset and the baseline mean moves to the new level, so each
+    level shift is reported once.
+    """
+    def __init__(self, drift: float = 0.5, threshold: float = 10.0, alpha: float = 0.01, warmup: int = 50, min_std: float = 1e-3):
+        self.baseline = EWMAZScoreDetector(alpha=alpha, threshold=math.inf, warmup=warmup, min_std=min_std)
+        self.drift = drift
+        self.threshold = threshold
+        self.pos = 0.0
+        self.neg = 0.0
+
+    def update(self, x: float) -> Optional[float]:
+        """Fold in a sample and return the CUSUM statistic on a change point, else None."""
+        base = self.baseline
+        if base.count == 0:
+            base.update(x)
+            return None
+        r = (x - base.mean) / max(math.sqrt(base.var), base.min_std)
+        base.update(x)
+        if base.count <= base.warmup:
+            return None
+        self.pos = max(0.0, self.pos + r - self.drift)
+        self.neg = max(0.0, self.neg - r - self.drift)
+        score = max(self.pos, self.neg)
+        if score > self.threshold:
+            # Measure later samples against the new level, not the one before the shift
+            self.pos = self.neg = 0.0
+            base.mean = x
+            return score
+        return None
+
+DETECTORS = {
+    "ewma": EWMAZScoreDetector,
+    "cusum": CUSUMDetector,
+}
+
+# Fields watched while the log is being parsed.
+# mode "delta" feeds sample-to-sample differences instead of raw values;
+# valid_range drops "unknown" sentinel values before they reach the detector.
+ONLINE_DETECTORS: List[Dict[str, Any]] = [
+    {"name": "attitude_rate_outlier", "msg_type": "ATTITUDE", "fields": ["rollspeed", "pitchspeed", "yawspeed"], "detector": "ewma", "params": {"threshold": 8.0}, "severity": "warning"},
+    {"name": "vibration_outlier", "msg_type": "VIBRATION", "fields": ["vibration_x", "vibration_y", "vibration_z"], "detector": "ewma", "params": {"threshold": 8.0}, "severity": "warning"},
+    {"name": "altitude_step", "msg_type": "GLOBAL_POSITION_INT", "fields": ["relative_alt"], "mode": "delta", "scale": 1e-3, "detector": "ewma", "params": {"threshold": 10.0, "min_std": 0.5}, "severity": "warning"},
+    {"name": "battery_voltage_shift", "msg_type": "SYS_STATUS", "fields": ["voltage_battery"], "scale": 1e-3, "valid_range": (1, 65534), "detector": "cusum", "params": {"min_std": 0.05}, "severity": "warning"},
+    {"name": "gps_quality_shift", "msg_type": "GPS_RAW_INT", "fields": ["satellites_visible", "eph"], "detector": "cusum", "params": {"min_std": 1.0}, "severity": "info"},
+    {"name": "baro_pressure_step", "msg_type": "SCALED_PRESSURE", "fields": ["press_abs"], "mode": "delta", "detector": "ewma", "params": {"threshold": 10.0, "min_std": 0.05}, "severity": "warning"},
+    {"name": "battery_voltage_shift", "msg_type": "BAT", "fields": ["Volt"], "valid_range": (0.1, 100.0), "detector": "cusum", "params": {"min_std": 0.05}, "severity": "warning"},
+    {"name": "vibration_outlier", "msg_type": "VIBE", "fields": ["VibeX", "VibeY", "VibeZ"], "detector": "ewma", "params": {"threshold": 8.0}, "severity": "warning"},
+]
+
+class _Watch:
+    __slots__ = ("config", "field", "scale", "lo", "hi", "delta", "last", "detector", "event")
+
+    def __init__(self, config: Dict[str, Any], field: str):
+        self.config = config
+        self.field = field
+        self.scale = config.get("scale", 1.0)
+        self.lo, self.hi = config.get("valid_range", (-math.inf, math.inf))
+        self.delta = config.get("mode") == "delta"
+        self.last = None
+        self.detector = DETECTORS[config["detector"]](**config.get("params", {}))
+        self.event = None
+
+class OnlineAnomalyMonitor:
+    """Runs streaming detectors over messages as the parser decodes them.
+
+    Call ``observe`` once per decoded message; flagged samples closer together
+    than ``merge_gap`` seconds are merged into one event, in the same format as
+    ``anomalies.detect_telemetry_anomalies``.
+    """
+    def __init__(self, detectors: Optional[List[Dict[str, Any]]] = None, merge_gap: float = MERGE_GAP):
+        self.merge_gap = merge_gap
+        self._watches: Dict[str, List[_Watch]] = {}
+        self._events: List[Dict[str, Any]] = []
+        for config in detectors if detectors is not None else ONLINE_DETECTORS:
+            for field in config["fields"]:
+                self._watches.setdefault(config["msg_type"], []).append(_Watch(config, field))
+
+    def observe(self, msg_type: str, msg: Dict[str, Any], timestamp: float) -> None:
+        watches = self._watches.get(msg_type)
+        if watches is None:
+            return
+        for w in watches:
+            value = msg.get(w.field)
+            if not isinstance(value, (int, float)) or not (w.lo <= value <= w.hi):
+                continue
+            value *= w.scale
+            if w.delta:
+                last, w.last = w.last, value
+                if last is None:
+                    continue
+                value -= last
+            score = w.detector.update(value)
+            if score is not None:
+                self._flag(w, timestamp, score)
+
+    def _flag(self, w: _Watch, timestamp: float, score: float) -> None:
+        event = w.event
+        if event is not None and timestamp - event["end"] <= self.merge_gap:
+            event["end"] = timestamp
+            event["samples"] += 1
+            event["peak"] = max(event["peak"], score)
+            return
+        config = w.config
+        w.event = {
+            "timestamp": timestamp,
+            "type": config["name"],
+            "msg_type": config["msg_type"],
+            "field": w.field,
+            "detector": config["detector"],
+            "severity": config["severity"],
+            "description": f"{config['detector'].upper()} detector flagged {config['msg_type']}.{w.field}",
+            "start": timestamp,
+            "end": timestamp,
+            "samples": 1,
+            "peak": score
+        }
+        self._events.append(w.event)
+
+    def events(self) -> List[Dict[str, Any]]:
+        """Return the events flagged so far, sorted by start time."""
+        return sorted(self._events, key=lambda e: e["start"])
@@ -0,0 +1,207 @@
+import io
+import json
+import logging
+import shutil
+import zipfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+from .alignment import message_series, resample
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional; logs are reparsed without it
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_DIR = Path("uploads/parquet")
+FORMAT_VERSION = 1
+# Rows per row group; each carries min/max statistics of _timestamp for time-range pruning
+ROW_GROUP_SIZE = 65536
+# Wide 10 Hz table for analysts, one column per field that the log has
+ALIGNED_FIELDS = [
+    "ATTITUDE.roll", "ATTITUDE.pitch", "ATTITUDE.yaw",
+    "GLOBAL_POSITION_INT.lat", "GLOBAL_POSITION_INT.lon", "GLOBAL_POSITION_INT.relative_alt",
+    "VFR_HUD.airspeed", "VFR_HUD.groundspeed", "VFR_HUD.throttle",
+    "GPS_RAW_INT.fix_type", "GPS_RAW_INT.satellites_visible", "SYS_STATUS.voltage_battery",
+]
+ALIGNED_RATE = 10.0
+# Parsed-data keys rebuilt from the Parquet files rather than stored as JSON
+_TABLE_KEYS = ("messages", "columns", "trajectory_data")
+
+def parquet_available() -> bool:
+    return pq is not None
+
+def store_path(fileKey: str, root: Path = PARQUET_DIR) -> Path:
+    return root / fileKey
+
+def has_parquet_log(fileKey: str, root: Path = PARQUET_DIR) -> bool:
+    return (store_path(fileKey, root) / "metadata.json").exists()
+
+def _column(values: List[Any]) -> "pa.Array":
+    try:
+        # A field mixing int and float becomes float64 (its ints come back as floats)
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed types in one field (e.g. str and int); keep them as text
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+def _message_table(msgs: List[Dict[str, Any]]) -> "pa.Table":
+    names = list(dict.fromkeys(name for m in msgs for name in m))
+    return pa.table({name: _column([m.get(name) for m in msgs]) for name in names})
+
+def _trajectory_table(trajectory_data: Dict[str, Any]) -> "pa.Table":
+    source = trajectory_data.get("GLOBAL_POSITION_INT", {})
+    points = source.get("trajectory", [])
+    absolute = source.get("timeTrajectory", {})
+    return pa.table({
+        "lon": pa.array([p[0] for p in points], pa.float64()),
+        "lat": pa.array([p[1] for p in points], pa.float64()),
+        "altitude": pa.array([p[2] for p in points], pa.float64()),
+        "relative_alt": pa.array([absolute.get(p[3], [None] * 3)[2] for p in points], pa.float64()),
+        "time_ms": pa.array([p[3] for p in points], pa.float64()),
+    }, metadata={"startAltitude": json.dumps(source.get("startAltitude"))})
+
+def _aligned_table(parsed_data: Dict[str, Any]) -> Optional["pa.Table"]:
+    fields = [f for f in ALIGNED_FIELDS if message_series(parsed_data, f)[0].size]
+    if not fields:
+        return None
+    aligned = resample(parsed_data, fields, ALIGNED_RATE)
+    return pa.table({name: pa.array(values) for name, values in aligned.items()})
+
+def _tag_keys(value: Any) -> Any:
+    """JSON-ready copy of value: dicts with non-str keys become {"__items__": [[key, value], ...]}."""
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: _tag_keys(v) for k, v in value.items()}
+        return {"__items__": [[k, _tag_keys(v)] for k, v in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_tag_keys(v) for v in value]
+    return value
+
+def _untag_keys(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """json.load object_hook undoing _tag_keys (tuple keys were written as lists)."""
+    if obj.keys() == {"__items__"}:
+        return {tuple(k) if isinstance(k, list) else k: v for k, v in obj["__items__"]}
+    return obj
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+def export_parsed_log(fileKey: str, parsed_data: Dict[str, Any], root: Path = PARQUET_DIR) -> Path:
+    """Write a parsed log as a Parquet dataset.
+
+    Layout under ``root/fileKey``:
+        messages/msg_type=<TYPE>/part-0.parquet  one file per message type (hive partitioning)
+        trajectory.parquet                       the trajectory shown on the map
+        aligned.parquet                          ALIGNED_FIELDS resampled to ALIGNED_RATE Hz
+        metadata.json                            everything else in parsed_data, plus a manifest
+
+    Dict keys that are not strings (e.g. int instance numbers) are kept. A message
+    field mixing str and numbers is stored as text, and one mixing int and float as
+    float64; load_parsed_log returns them that way.
+
+    Returns:
+        Path: The dataset directory
+
+    Raises:
+        RuntimeError: pyarrow is not installed
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow installed")
+    final = store_path(fileKey, root)
+    staging = final.with_name(f".{fileKey}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+
+    manifest = {}
+    for msg_type, msgs in parsed_data.get("messages", {}).items():
+        if not msgs:
+            continue
+        relative = Path("messages") / f"msg_type={quote(msg_type, safe='')}" / "part-0.parquet"
+        (staging / relative).parent.mkdir(parents=True, exist_ok=True)
+        table = _message_table(msgs)
+        pq.write_table(table, staging / relative, row_group_size=ROW_GROUP_SIZE, compression="zstd",
+                       write_statistics=True)
+        manifest[msg_type] = {"path": str(relative), "rows": table.num_rows,
+                              "row_groups": -(-table.num_rows // ROW_GROUP_SIZE)}
+
+    pq.write_table(_trajectory_table(parsed_data.get("trajectory_data", {})), staging / "trajectory.parquet")
+    aligned = _aligned_table(parsed_data)
+    if aligned is not None:
+        pq.write_table(aligned, staging / "aligned.parquet", compression="zstd")
+
+    rest = {k: v for k, v in parsed_data.items() if k not in _TABLE_KEYS}
+    rest["metadata"] = {k: v for k, v in rest.get("metadata", {}).items()
+                        if k not in ("trajectory_data", "currentTrajectory")}
+    with open(staging / "metadata.json", "w") as f:
+        json.dump({"version": FORMAT_VERSION, "message_types": manifest, "parsed_data": _tag_keys(rest)}, f,
+                  default=_json_default)
+
+    # Swap in the complete dataset so readers never see a half-written one
+    shutil.rmtree(final, ignore_errors=True)
+    staging.rename(final)
+    return final
+
+def load_parsed_log(fileKey: str, root: Path = PARQUET_DIR) -> Dict[str, Any]:
+    """Rehydrate ``parsed_data`` from a dataset written by export_parsed_log.
+
+    Messages come back as lists of dicts, as MAVLinkParser.parse returns them,
+    and the numeric columns are loaded straight into ``parsed_data["columns"]``.
+
+    Raises:
+        RuntimeError: pyarrow is not installed
+        FileNotFoundError: No dataset for fileKey
+    """
+    if pq is None:
+        raise RuntimeError("Parquet import needs pyarrow installed")
+    directory = store_path(fileKey, root)
+    with open(directory / "metadata.json") as f:
+        stored = json.load(f, object_hook=_untag_keys)
+    if stored.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported Parquet log version: {stored.get('version')}")
+
+    parsed_data = stored["parsed_data"]
+    messages, columns = {}, {}
+    for msg_type, entry in stored["message_types"].items():
+        table = pq.read_table(directory / entry["path"])
+        messages[msg_type] = table.to_pylist()
+        columns[msg_type] = {
+            name: table.column(name).to_numpy().astype(np.float64)
+            for name, kind in zip(table.column_names, table.schema.types)
+            if pa.types.is_integer(kind) or pa.types.is_floating(kind) or pa.types.is_boolean(kind)
+        }
+    parsed_data["messages"] = messages
+    parsed_data["columns"] = columns
+
+    table = pq.read_table(directory / "trajectory.parquet")
+    start_altitude = json.loads((table.schema.metadata or {}).get(b"startAltitude", b"null"))
+    rows = table.to_pydict()
+    trajectory = [list(p) for p in zip(rows["lon"], rows["lat"], rows["altitude"], rows["time_ms"])]
+    trajectory_data = {"GLOBAL_POSITION_INT": {
+        "startAltitude": start_altitude,
+        "trajectory": trajectory,
+        "timeTrajectory": {t: [lon, lat, alt, t] for lon, lat, alt, t in
+                           zip(rows["lon"], rows["lat"], rows["relative_alt"], rows["time_ms"])},
+    }}
+    parsed_data["trajectory_data"] = trajectory_data
+    parsed_data.setdefault("metadata", {})
+    parsed_data["metadata"]["trajectory_data"] = trajectory_data
+    parsed_data["metadata"]["currentTrajectory"] = trajectory
+    return parsed_data
+
+def archive_parquet_log(fileKey: str, root: Path = PARQUET_DIR) -> bytes:
+    """The dataset of a log as a zip archive (stored, Parquet files are already compressed)."""
+    directory = store_path(fileKey, root)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for path in sorted(directory.rglob("*")):
+            if path.is_file():
+                archive.write(path, Path(fileKey) / path.relative_to(directory))
+    return buffer.getvalue()
@@ -0,0 +1,229 @@
+"""Route chat questions to the facts table, log retrieval, anomaly checks, region queries or plain chat.
+
+Each route has a handful of labelled example questions (prototypes). They are
+embedded once with the sentence model that embeds the log snippets and kept
+in memory; a question is routed to the route whose closest prototypes it is
+most similar to. The margin over the runner-up route is the confidence.
+Confident decisions skip the LLM routing step; questions below the
+thresholds are left to the LLM, as before.
+
+Routing by embedding is off unless ROUTER_ENABLED=1: a wrong confident route
+fails silently, so the thresholds should first be calibrated for the deployed
+model with benchmarks/bench_router.py. Until then questions are routed by
+keywords (embeddings.classify_query_type) and the LLM picks the tool.
+"""
+import logging
+import os
+import threading
+import numpy as np
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional
+from .cache import normalize_question
+from .metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ("facts", "retrieval", "anomaly", "region", "chat")
+
+PROTOTYPES: Dict[str, List[str]] = {
+    # Questions the precomputed facts table answers (facts.FACT_QUESTIONS)
+    "facts": [
+        "What was the maximum altitude?",
+        "How high did the drone fly?",
+        "How long was the flight?",
+        "What was the total flight time?",
+        "What was the top ground speed?",
+        "What was the highest airspeed?",
+        "What was the lowest battery voltage?",
+        "How low did the battery remaining percentage get?",
+        "What was the peak temperature?",
+        "What was the fewest number of satellites?",
+        "How far from home did it go?",
+        "When was the vehicle armed and disarmed?",
+        "Which flight modes were used?",
+    ],
+    # Looking up specific values, events or times in the telemetry
+    "retrieval": [
+        "When did the GPS fix change?",
+        "What was the altitude two minutes into the flight?",
+        "Show me the attitude readings during the climb",
+        "What were the RC channel inputs at the start?",
+        "List all the servo outputs",
+        "When did the vehicle switch to RTL?",
+        "What was the throttle level while hovering?",
+        "What heading was it flying in the middle of the flight?",
+        "When did the takeoff start?",
+        "What were the GPS coordinates at landing?",
+        "How did the current draw change over the flight?",
+        "What was the vertical speed during descent?",
+        "Give me the first instance of the RC signal",
+    ],
+    # Problems, errors and safety events
+    "anomaly": [
+        "Were there any anomalies in this flight?",
+        "Did anything go wrong?",
+        "Were there any errors or warnings?",
+        "Did the GPS signal get lost at any point?",
+        "Was there a failsafe?",
+        "Did the battery fail or sag dangerously?",
+        "Are there any vibration issues?",
+        "Did the RC link drop out?",
+        "Were there any sudden altitude spikes or jumps?",
+        "Is there anything unusual or suspicious in the log?",
+        "Why did the drone crash?",
+        "Were there any EKF or compass problems?",
+        "Did any sensor report inconsistent values?",
+    ],
+    # Where the vehicle was: around home, in an area or near coordinates
+    "region": [
+        "When was the vehicle within 50 m of home?",
+        "How long did it stay near the takeoff point?",
+        "Did the drone fly inside this bounding box?",
+        "When was it within 100 meters of these coordinates?",
+        "Did it enter the polygon area?",
+        "Was the vehicle ever more than 200 m from the launch site?",
+        "How much time did it spend near latitude -35.36 longitude 149.16?",
+        "Did it leave the geofence area?",
+        "When did the drone pass over this location?",
+        "Which part of the flight was close to home?",
+    ],
+    # Questions that do not need the log
+    "chat": [
+        "Hello, how are you?",
+        "Tell me a joke",
+        "What can you do?",
+        "Thanks, that was helpful",
+        "What is a VTOL aircraft?",
+        "How does a PID controller work?",
+        "What does the EKF do in ArduPilot?",
+        "Explain what a MAVLink message is",
+        "What is the difference between a quadplane and a multicopter?",
+        "How do I calibrate the compass?",
+        "What is a tlog file?",
+        "Who are you?",
+    ],
+}
+
+MIN_SIMILARITY = 0.35
+MIN_MARGIN = 0.05
+
+ROUTER_CONFIG = {
+    "enabled": os.getenv("ROUTER_ENABLED", "0") == "1",
+    "min_similarity": float(os.getenv("ROUTER_MIN_SIMILARITY", str(MIN_SIMILARITY))),
+    "min_margin": float(os.getenv("ROUTER_MIN_MARGIN", str(MIN_MARGIN))),
+}
+
+# What the keyword classifier (embeddings.classify_query_type) means in router terms
+_KEYWORD_ROUTES = {"retrieval": "retrieval", "anomaly_tool": "anomaly", "unknown": "chat"}
+
+class QueryRouter:
+    """Nearest-prototype router over sentence embeddings.
+
+    Args:
+        encode: Embeds a list of texts (e.g. embeddings.model.encode); None routes with keywords only
+        embed: Embeds one question, returning a vector or None (e.g. ResponseCache.embed, so a
+            question already embedded for the response cache is not encoded again)
+        prototypes: Example questions per route
+        top_k: Number of closest prototypes averaged into a route's score
+        min_similarity: Score the best route needs for a confident decision
+        min_margin: Lead over the second-best route needed for a confident decision
+    """
+    def __init__(
+        self,
+        encode: Optional[Callable[[List[str]], Any]] = None,
+        embed: Optional[Callable[[str], Optional[np.ndarray]]] = None,
+        prototypes: Optional[Dict[str, List[str]]] = None,
+        top_k: int = 3,
+        min_similarity: float = MIN_SIMILARITY,
+        min_margin: float = MIN_MARGIN
+    ):
+        self._encode = encode
+        self._embed = embed
+        self.prototypes = prototypes or PROTOTYPES
+        self.routes = list(self.prototypes)
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._matrix: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._embed_question = lru_cache(maxsize=256)(self._embed_uncached)
+        self.stats = {"decisions": 0, "confident": 0, "low_confidence": 0, "keyword_fallbacks": 0,
+                      **{f"route_{route}": 0 for route in self.routes}}
+
+    def _normalized(self, vectors: Any) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def warm(self) -> None:
+        """Embed the prototypes (blocking; done on first use otherwise)."""
+        if self._matrix is not None or self._encode is None:
+            return
+        with self._lock:
+            if self._matrix is not None:
+                return
+            texts, labels = [], []
+            for index, route in enumerate(self.routes):
+                texts += [normalize_question(q) for q in self.prototypes[route]]
+                labels += [index] * len(self.prototypes[route])
+            self._labels = np.array(labels)
+            self._matrix = self._normalized(self._encode(texts))
+            logger.info(f"Embedded {len(texts)} routing prototypes for {len(self.routes)} routes")
+
+    def _embed_uncached(self, normalized: str) -> np.ndarray:
+        return self._normalized(self._encode([normalized]))[0]
+
+    def _vector(self, question: str) -> Optional[np.ndarray]:
+        vector = self._embed(question) if self._embed is not None else None
+        if vector is None:
+            vector = self._embed_question(normalize_question(question))
+        return vector
+
+    def scores(self, question: str) -> Dict[str, float]:
+        """Mean cosine similarity of the question to the top_k closest prototypes of each route (blocking)."""
+        self.warm()
+        similarities = self._matrix @ self._vector(question)
+        return {
+            route: float(np.sort(similarities[self._labels == index])[-self.top_k:].mean())
+            for index, route in enumerate(self.routes)
+        }
+
+    def keyword_decision(self, question: str) -> Dict[str, Any]:
+        """Route by keywords only; never confident, so the LLM still picks the tool."""
+        from .embeddings import classify_query_type
+        return {"route": _KEYWORD_ROUTES[classify_query_type(question)], "confidence": 0.0,
+                "similarity": None, "confident": False, "source": "keywords"}
+
+    @instrumented("route_query")
+    def route(self, question: str) -> Dict[str, Any]:
+        """Pick the route of a question (blocking: may run the embedding model).
+
+        Returns:
+            Dict[str, Any]: route (one of ROUTES), confidence (lead of the best route's score
+            over the second best), similarity (best score), confident (both over their
+            thresholds) and source ("embedding", or "keywords" when no embedding is available)
+        """
+        if self._encode is None:
+            decision = self.keyword_decision(question)
+        else:
+            try:
+                scores = self.scores(question)
+            except Exception as e:
+                logger.warning(f"Routing by embedding failed, falling back to keywords: {e}")
+                decision = self.keyword_decision(question)
+            else:
+                ranked = sorted(scores, key=scores.get, reverse=True)
+                best, margin = scores[ranked[0]], scores[ranked[0]] - scores[ranked[1]]
+                decision = {"route": ranked[0], "confidence": margin, "similarity": best,
+                            "confident": best >= self.min_similarity and margin >= self.min_margin,
+                            "source": "embedding"}
+        self.stats["decisions"] += 1
+        if decision["source"] == "keywords":
+            self.stats["keyword_fallbacks"] += 1
+        self.stats["confident" if decision["confident"] else "low_confidence"] += 1
+        self.stats[f"route_{decision['route']}"] += 1
+        return decision
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,297 @@
+"""Spatial index over GLOBAL_POSITION_INT tracks, per log and across logs.
+
+Each log's track (every valid fix, not the decimated trajectory sent to the
+3D view) is bucketed into a lat/lon grid: points are sorted by cell key, so
+the candidates of a query rectangle are one searchsorted slice per grid row.
+Radius and polygon queries filter those candidates exactly (haversine,
+even-odd rule) and return the matching stretches of the flight as time
+intervals. Tracks are saved next to the snippet index at ingestion, and
+SpatialCatalog answers the same queries across every ingested log, skipping
+logs whose bounds miss the query region.
+
+Regions are dicts:
+    {"type": "radius", "lat": ..., "lon": ..., "radius_m": ...}  ("center": "home" instead of lat/lon)
+    {"type": "bbox", "min_lat": ..., "min_lon": ..., "max_lat": ..., "max_lon": ...}
+    {"type": "polygon", "points": [[lat, lon], ...]}
+"""
+import logging
+import re
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from .anomalies import haversine
+from .columns import message_columns
+from .metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+TRACK_DIR = Path("uploads/faiss_indexes")
+# Grid cell size: 0.001 deg is about 111 m north-south
+CELL_DEG = 0.001
+# Query rectangles spanning more grid rows than this scan the whole track instead
+MAX_GRID_ROWS = 2048
+METERS_PER_DEG_LAT = 111320.0
+_ROW_OFFSET = int(90 / CELL_DEG) + 1
+_COLS = 2 * (int(180 / CELL_DEG) + 1)
+
+def _cell_keys(lat: np.ndarray, lon: np.ndarray, cell_deg: float) -> np.ndarray:
+    rows = np.floor(lat / cell_deg).astype(np.int64) + _ROW_OFFSET
+    cols = np.floor(lon / cell_deg).astype(np.int64) + _COLS // 2
+    return rows * _COLS + cols
+
+def points_in_polygon(lat: np.ndarray, lon: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Even-odd rule test of points against a polygon given as an (n, 2) array of lat, lon vertices."""
+    inside = np.zeros(lat.shape, dtype=bool)
+    lat1, lon1 = polygon[:, 0], polygon[:, 1]
+    lat2, lon2 = np.roll(lat1, -1), np.roll(lon1, -1)
+    for a_lat, a_lon, b_lat, b_lon in zip(lat1, lon1, lat2, lon2):
+        crosses = (a_lat > lat) != (b_lat > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            edge_lon = a_lon + (lat - a_lat) * (b_lon - a_lon) / (b_lat - a_lat)
+        inside ^= crosses & (lon < edge_lon)
+    return inside
+
+def region_bounds(region: Dict[str, Any], home: Optional[Tuple[float, float]] = None) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a region."""
+    kind = region["type"]
+    if kind == "bbox":
+        return region["min_lat"], region["min_lon"], region["max_lat"], region["max_lon"]
+    if kind == "polygon":
+        points = np.asarray(region["points"], dtype=np.float64)
+        return points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()
+    if kind == "radius":
+        lat, lon = home if region.get("center") == "home" else (region["lat"], region["lon"])
+        dlat = region["radius_m"] / METERS_PER_DEG_LAT
+        dlon = region["radius_m"] / (METERS_PER_DEG_LAT * max(np.cos(np.radians(lat)), 1e-6))
+        return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+    raise ValueError(f"Unknown region type: {kind}")
+
+class TrackIndex:
+    """Grid index over one log's position fixes (time-ordered seconds, degrees, meters)."""
+
+    def __init__(self, timestamps: np.ndarray, lat: np.ndarray, lon: np.ndarray, alt: np.ndarray,
+                 cell_deg: float = CELL_DEG):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.cell_deg = cell_deg
+        keys = _cell_keys(self.lat, self.lon, cell_deg)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+        # Home is the first fix, as in facts.max_distance_from_home
+        self.home = (float(self.lat[0]), float(self.lon[0])) if self.lat.size else None
+        self.bounds = (float(self.lat.min()), float(self.lon.min()), float(self.lat.max()), float(self.lon.max())) \
+            if self.lat.size else None
+
+    @classmethod
+    def from_parsed(cls, parsed_data: Dict[str, Any]) -> Optional["TrackIndex"]:
+        """Index of the GLOBAL_POSITION_INT fixes of a parsed log, None without any."""
+        cols = message_columns(parsed_data, "GLOBAL_POSITION_INT", ["lat", "lon", "relative_alt"])
+        if "lat" not in cols or "lon" not in cols:
+            return None
+        valid = (cols["lat"] != 0) | (cols["lon"] != 0)
+        if not valid.any():
+            return None
+        alt = cols["relative_alt"][valid] * 1e-3 if "relative_alt" in cols else np.full(int(valid.sum()), np.nan)
+        return cls(cols["_timestamp"][valid], cols["lat"][valid] * 1e-7, cols["lon"][valid] * 1e-7, alt)
+
+    def candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Sorted indices of the points in the grid cells overlapping a rectangle."""
+        if not self.lat.size:
+            return np.empty(0, dtype=np.int64)
+        min_lat, max_lat = max(min_lat, self.bounds[0]), min(max_lat, self.bounds[2])
+        min_lon, max_lon = max(min_lon, self.bounds[1]), min(max_lon, self.bounds[3])
+        if min_lat > max_lat or min_lon > max_lon:
+            return np.empty(0, dtype=np.int64)
+        row0, col0 = np.floor(np.array([min_lat, min_lon]) / self.cell_deg).astype(np.int64)
+        row1, col1 = np.floor(np.array([max_lat, max_lon]) / self.cell_deg).astype(np.int64)
+        if row1 - row0 >= MAX_GRID_ROWS:
+            return np.arange(self.lat.size)
+        rows = np.arange(row0, row1 + 1) + _ROW_OFFSET
+        starts = np.searchsorted(self._keys, rows * _COLS + col0 + _COLS // 2, side="left")
+        ends = np.searchsorted(self._keys, rows * _COLS + col1 + _COLS // 2, side="right")
+        slices = [self._order[s:e] for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices))
+
+    def match(self, region: Dict[str, Any]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Indices of the points inside a region, and their distances to the center for radius queries."""
+        if not self.lat.size:
+            return np.empty(0, dtype=np.int64), None
+        idx = self.candidates(*region_bounds(region, self.home))
+        lat, lon = self.lat[idx], self.lon[idx]
+        kind = region["type"]
+        if kind == "radius":
+            center = self.home if region.get("center") == "home" else (region["lat"], region["lon"])
+            dist = haversine(center[0], center[1], lat, lon)
+            keep = dist <= region["radius_m"]
+            return idx[keep], dist[keep]
+        if kind == "polygon":
+            return idx[points_in_polygon(lat, lon, np.asarray(region["points"], dtype=np.float64))], None
+        keep = (lat >= region["min_lat"]) & (lat <= region["max_lat"]) & (lon >= region["min_lon"]) & (lon <= region["max_lon"])
+        return idx[keep], None
+
+    def intervals(self, region: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Stretches of the flight inside a region: consecutive fixes inside it form one interval.
+
+        Returns:
+            List[Dict[str, Any]]: start/end timestamps, duration_s, points, min/max
+            relative altitude and, for radius queries, min_distance_m
+        """
+        idx, dist = self.match(region)
+        if not idx.size:
+            return []
+        breaks = np.flatnonzero(np.diff(idx) > 1) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [idx.size]))
+        intervals = []
+        for s, e in zip(starts, ends):
+            run = idx[s:e]
+            alt = self.alt[run]
+            interval = {
+                "start": float(self.timestamps[run[0]]),
+                "end": float(self.timestamps[run[-1]]),
+                "duration_s": float(self.timestamps[run[-1]] - self.timestamps[run[0]]),
+                "points": int(run.size),
+                "min_alt_m": float(np.nanmin(alt)) if not np.isnan(alt).all() else None,
+                "max_alt_m": float(np.nanmax(alt)) if not np.isnan(alt).all() else None,
+            }
+            if dist is not None:
+                interval["min_distance_m"] = float(dist[s:e].min())
+            intervals.append(interval)
+        return intervals
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, timestamps=self.timestamps, lat=self.lat, lon=self.lon, alt=self.alt)
+
+    @classmethod
+    def load(cls, path: Path) -> "TrackIndex":
+        with np.load(path) as data:
+            return cls(data["timestamps"], data["lat"], data["lon"], data["alt"])
+
+def track_path(fileKey: str) -> Path:
+    return TRACK_DIR / f"{fileKey}_track.npz"
+
+@instrumented("save_track")
+def save_track(fileKey: str, parsed_data: Dict[str, Any]) -> Optional[TrackIndex]:
+    """Index the track of a parsed log, save it for cross-log queries and add it to the catalog."""
+    index = TrackIndex.from_parsed(parsed_data)
+    if index is not None:
+        index.save(track_path(fileKey))
+        catalog.add(fileKey, index)
+    return index
+
+class SpatialCatalog:
+    """Track indexes of every ingested log, loaded lazily from TRACK_DIR.
+
+    Logs whose bounds do not overlap a query's rectangle are skipped with one
+    vectorized comparison before any per-log query runs.
+    """
+
+    def __init__(self, directory: Path = TRACK_DIR):
+        self.directory = directory
+        self.tracks: Dict[str, TrackIndex] = {}
+        self._keys: List[str] = []
+        self._bounds = np.empty((0, 4))
+        self._lock = threading.Lock()
+
+    def _rebuild(self) -> None:
+        self._keys = [k for k, t in self.tracks.items() if t.bounds is not None]
+        self._bounds = np.array([self.tracks[k].bounds for k in self._keys]).reshape(-1, 4)
+
+    def add(self, fileKey: str, index: TrackIndex) -> None:
+        with self._lock:
+            self.tracks[fileKey] = index
+            self._rebuild()
+
+    def remove(self, fileKey: str) -> None:
+        with self._lock:
+            if self.tracks.pop(fileKey, None) is not None:
+                self._rebuild()
+
+    def refresh(self) -> None:
+        """Load tracks saved since the last refresh (e.g. by the batch ingest CLI)."""
+        paths = [p for p in self.directory.glob("*_track.npz") if p.name[:-len("_track.npz")] not in self.tracks]
+        if not paths:
+            return
+        loaded = {}
+        for path in paths:
+            try:
+                loaded[path.name[:-len("_track.npz")]] = TrackIndex.load(path)
+            except Exception as e:
+                logger.warning(f"Could not load track {path}: {e}")
+        with self._lock:
+            self.tracks.update(loaded)
+            self._rebuild()
+
+    def get(self, fileKey: str) -> Optional[TrackIndex]:
+        index = self.tracks.get(fileKey)
+        if index is None and track_path(fileKey).exists():
+            index = TrackIndex.load(track_path(fileKey))
+            self.add(fileKey, index)
+        return index
+
+    @instrumented("spatial.catalog_query")
+    def query(self, region: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Intervals inside a region for every ingested log that entered it.
+
+        Returns:
+            List[Dict[str, Any]]: fileKey, intervals and total_s per matching log, longest time inside first
+        """
+        self.refresh()
+        with self._lock:
+            keys, bounds = self._keys, self._bounds
+        if region.get("center") == "home":
+            # Every log has its own home: check each one
+            selected = keys
+        else:
+            min_lat, min_lon, max_lat, max_lon = region_bounds(region)
+            overlap = (bounds[:, 0] <= max_lat) & (bounds[:, 2] >= min_lat) & (bounds[:, 1] <= max_lon) & (bounds[:, 3] >= min_lon)
+            selected = [keys[i] for i in np.flatnonzero(overlap)]
+        results = []
+        for fileKey in selected:
+            intervals = self.tracks[fileKey].intervals(region)
+            if intervals:
+                results.append({"fileKey": fileKey, "intervals": intervals,
+                                "total_s": sum(i["duration_s"] for i in intervals)})
+        return sorted(results, key=lambda r: -r["total_s"])
+
+catalog = SpatialCatalog()
+
+def remove_track(fileKey: str) -> None:
+    catalog.remove(fileKey)
+    track_path(fileKey).unlink(missing_ok=True)
+
+_UNITS_M = {"m": 1.0, "meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0, "km": 1000.0,
+            "kilometer": 1000.0, "kilometers": 1000.0, "ft": 0.3048, "feet": 0.3048, "foot": 0.3048}
+_DISTANCE = re.compile(r"(\d+(?:\.\d+)?)\s*(kilometers?|km|meters?|metres?|m|feet|foot|ft)\b", re.IGNORECASE)
+_COORDINATE = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+_HOME_WORDS = re.compile(r"\b(home|takeoff|take-off|launch|start(?:ing)? point)\b", re.IGNORECASE)
+
+def region_from_question(question: str) -> Optional[Dict[str, Any]]:
+    """Region named in a chat question, or None.
+
+    A distance ("within 50 m") makes a radius around the coordinates given
+    ("-35.36, 149.16") or home; two coordinate pairs make a bounding box and
+    three or more a polygon.
+    """
+    coordinates = [[float(lat), float(lon)] for lat, lon in _COORDINATE.findall(question)]
+    distance = _DISTANCE.search(question)
+    if distance:
+        radius_m = float(distance.group(1)) * _UNITS_M[distance.group(2).lower()]
+        if coordinates:
+            return {"type": "radius", "lat": coordinates[0][0], "lon": coordinates[0][1], "radius_m": radius_m}
+        if _HOME_WORDS.search(question):
+            return {"type": "radius", "center": "home", "radius_m": radius_m}
+    if len(coordinates) == 2:
+        (lat1, lon1), (lat2, lon2) = coordinates
+        return {"type": "bbox", "min_lat": min(lat1, lat2), "min_lon": min(lon1, lon2),
+                "max_lat": max(lat1, lat2), "max_lon": max(lon1, lon2)}
+    if len(coordinates) >= 3:
+        return {"type": "polygon", "points": coordinates}
+    return None
@@ -0,0 +1,371 @@
+"""At-rest compression and lifecycle management of everything stored per fileKey.
+
+A log's artifacts are the raw upload (uploads/<fileKey>.<ext>, zstd
+compressed as <fileKey>.<ext>.zst once indexed), the index files in
+uploads/faiss_indexes/ (<fileKey>.index, _snippets.json, _anomalies.json,
+_track.npz, _phases.json) and the Parquet copy (uploads/parquet/<fileKey>/).
+StorageManager groups them by fileKey and reclaims them: orphans (index
+files nothing can reload or rebuild), logs not used for max_age, and the
+least recently used logs while the total is over the quota. Logs in use
+by the API are passed as protected and never collected.
+
+Compression needs the optional zstandard package; without it uploads stay
+uncompressed. Compressed logs are decompressed as a stream: into the tlog
+decoder directly, or into a temporary file for pymavlink.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Iterator, BinaryIO
+from .ingest import IngestRegistry, REGISTRY_PATH
+from .parquet_store import PARQUET_DIR
+
+try:
+    import zstandard as zstd
+except ImportError:  # Compression is optional; uploads are stored as-is without it
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path("uploads")
+FAISS_DIR = Path("uploads/faiss_indexes")
+ACCESS_PATH = Path("uploads/storage_access.json")
+COMPRESSED_SUFFIX = ".zst"
+INDEX_SUFFIXES = (".index", "_snippets.json", "_anomalies.json", "_track.npz", "_phases.json")
+CHUNK_SIZE = 1 << 20
+
+STORAGE_CONFIG = {
+    # "zstd" compresses uploads once they are indexed, "none" keeps them as uploaded
+    "compression": os.getenv("STORAGE_COMPRESSION", "zstd"),
+    "zstd_level": int(os.getenv("STORAGE_ZSTD_LEVEL", "3")),
+    # Unset: no quota / no expiry
+    "quota_mb": float(os.getenv("STORAGE_QUOTA_MB")) if os.getenv("STORAGE_QUOTA_MB") else None,
+    "max_age_days": float(os.getenv("STORAGE_MAX_AGE_DAYS")) if os.getenv("STORAGE_MAX_AGE_DAYS") else None,
+    # Orphans and partial writes younger than this may still be in progress
+    "orphan_grace_s": float(os.getenv("STORAGE_ORPHAN_GRACE_S", "3600")),
+    "gc_interval_s": float(os.getenv("STORAGE_GC_INTERVAL_S", "3600")),
+}
+
+def compression_available() -> bool:
+    return zstd is not None
+
+def is_compressed(path: Path) -> bool:
+    return Path(path).suffix.lower() == COMPRESSED_SUFFIX
+
+def log_suffix(path: Path) -> str:
+    """Suffix of the log format, ignoring compression: ".tlog" for both x.tlog and x.tlog.zst."""
+    path = Path(path)
+    return Path(path.stem).suffix.lower() if is_compressed(path) else path.suffix.lower()
+
+def compress_file(path: Path, level: Optional[int] = None) -> Path:
+    """Compress a file to <path>.zst as a stream and remove the original.
+
+    The compressed copy is written under a temporary name and renamed, so a
+    crash never leaves a truncated .zst behind. The modification time is kept
+    for age-based collection.
+    """
+    if zstd is None:
+        raise RuntimeError("zstd compression needs the zstandard package")
+    path = Path(path)
+    target = path.with_name(path.name + COMPRESSED_SUFFIX)
+    tmp = target.with_name(target.name + ".tmp")
+    compressor = zstd.ZstdCompressor(level=level if level is not None else STORAGE_CONFIG["zstd_level"])
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        compressor.copy_stream(src, dst, read_size=CHUNK_SIZE, write_size=CHUNK_SIZE)
+    shutil.copystat(path, tmp)
+    os.replace(tmp, target)
+    path.unlink()
+    return target
+
+@contextmanager
+def open_log(path: Path) -> Iterator[BinaryIO]:
+    """Readable binary stream of a log, decompressing .zst files on the fly."""
+    path = Path(path)
+    with open(path, "rb") as f:
+        if not is_compressed(path):
+            yield f
+            return
+        if zstd is None:
+            raise RuntimeError(f"{path.name} is zstd compressed and the zstandard package is not installed")
+        with zstd.ZstdDecompressor().stream_reader(f, read_size=CHUNK_SIZE) as reader:
+            yield reader
+
+@contextmanager
+def materialized(path: Path) -> Iterator[Path]:
+    """Path of an uncompressed copy of a log for readers that need a real file (pymavlink).
+
+    Plain logs are yielded as-is; compressed ones are streamed into a
+    temporary file that is removed afterwards.
+    """
+    path = Path(path)
+    if not is_compressed(path):
+        yield path
+        return
+    fd, tmp = tempfile.mkstemp(suffix=log_suffix(path))
+    try:
+        with open_log(path) as src, os.fdopen(fd, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        yield Path(tmp)
+    finally:
+        os.unlink(tmp)
+
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+def _mtime(path: Path) -> float:
+    if path.is_dir():
+        return max([p.stat().st_mtime for p in path.rglob("*") if p.is_file()], default=path.stat().st_mtime)
+    return path.stat().st_mtime
+
+class StorageManager:
+    """Disk usage, quota, expiry and orphan collection across every artifact of a fileKey.
+
+    Last access times are recorded by touch() in memory and persisted to
+    access_path by flush() (and by every collection); the newest modification
+    time of a log's files stands in for logs never touched.
+    """
+
+    def __init__(self, upload_dir: Path = UPLOAD_DIR, faiss_dir: Path = FAISS_DIR, parquet_dir: Path = PARQUET_DIR,
+                 registry_path: Path = REGISTRY_PATH, access_path: Path = ACCESS_PATH,
+                 quota_bytes: Optional[int] = None, max_age_s: Optional[float] = None,
+                 orphan_grace_s: float = 3600.0, compression: Optional[str] = None):
+        self.upload_dir = upload_dir
+        self.faiss_dir = faiss_dir
+        self.parquet_dir = parquet_dir
+        self.registry_path = registry_path
+        self.access_path = access_path
+        self.quota_bytes = quota_bytes
+        self.max_age_s = max_age_s
+        self.orphan_grace_s = orphan_grace_s
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._access: Dict[str, float] = {}
+        self._dirty = False
+        if access_path.exists():
+            try:
+                with open(access_path) as f:
+                    self._access = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {access_path}: {e}")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = STORAGE_CONFIG) -> "StorageManager":
+        quota_mb, max_age_days = config.get("quota_mb"), config.get("max_age_days")
+        return cls(quota_bytes=int(quota_mb * 1e6) if quota_mb is not None else None,
+                   max_age_s=max_age_days * 86400 if max_age_days is not None else None,
+                   orphan_grace_s=config.get("orphan_grace_s", 3600.0),
+                   compression=config.get("compression"))
+
+    # --- Artifacts ---
+
+    def _reserved(self) -> set:
+        """Bookkeeping files in upload_dir that belong to no log."""
+        return {p.with_suffix(suffix).resolve() for p in (self.registry_path, self.access_path)
+                for suffix in (p.suffix, ".tmp")}
+
+    def artifacts(self) -> Dict[str, Dict[str, List[Path]]]:
+        """fileKey -> {"upload" | "index" | "parquet" | "partial": paths} of everything on disk."""
+        groups: Dict[str, Dict[str, List[Path]]] = {}
+
+        def add(key: str, kind: str, path: Path):
+            groups.setdefault(key, {}).setdefault(kind, []).append(path)
+
+        reserved = self._reserved()
+        if self.upload_dir.is_dir():
+            for path in self.upload_dir.iterdir():
+                if not path.is_file() or path.resolve() in reserved or path.name.startswith("."):
+                    continue
+                key = path.name.split(".", 1)[0]
+                add(key, "partial" if path.name.endswith(".tmp") else "upload", path)
+        if self.faiss_dir.is_dir():
+            for path in self.faiss_dir.iterdir():
+                suffix = next((s for s in INDEX_SUFFIXES if path.name.endswith(s)), None)
+                if suffix is not None and path.is_file():
+                    add(path.name[:-len(suffix)], "index", path)
+        if self.parquet_dir.is_dir():
+            for path in self.parquet_dir.iterdir():
+                if path.is_dir():
+                    add(path.name, "parquet", path)
+        return groups
+
+    def paths(self, fileKey: str) -> List[Path]:
+        return [p for paths in self.artifacts().get(fileKey, {}).values() for p in paths]
+
+    def usage(self) -> Dict[str, Any]:
+        """Bytes and files on disk by artifact kind, number of logs, quota and expiry settings."""
+        by_kind: Dict[str, int] = {}
+        files = 0
+        groups = self.artifacts()
+        for kinds in groups.values():
+            for kind, paths in kinds.items():
+                for path in paths:
+                    by_kind[kind] = by_kind.get(kind, 0) + _size(path)
+                    files += 1
+        return {"bytes": sum(by_kind.values()), "files": files, "logs": len(groups), "by_kind": by_kind,
+                "quota_bytes": self.quota_bytes, "max_age_s": self.max_age_s, "compression": compression_available()}
+
+    # --- Access times ---
+
+    def touch(self, fileKey: str, now: Optional[float] = None) -> None:
+        with self._lock:
+            self._access[fileKey] = now if now is not None else time.time()
+            self._dirty = True
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            access, self._dirty = dict(self._access), False
+        self.access_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.access_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(access, f)
+        os.replace(tmp, self.access_path)
+
+    def last_access(self, fileKey: str, paths: Iterable[Path]) -> float:
+        with self._lock:
+            touched = self._access.get(fileKey)
+        newest = max((_mtime(p) for p in paths), default=0.0)
+        return max(touched or 0.0, newest)
+
+    # --- Removal and collection ---
+
+    def _delete(self, paths: Iterable[Path]) -> int:
+        freed = 0
+        for path in paths:
+            try:
+                size = _size(path)
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+                freed += size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not remove {path}: {e}")
+        return freed
+
+    def _forget(self, keys: Iterable[str]) -> int:
+        """Drop access times and ingest registry entries of removed logs; returns the registry entries pruned."""
+        keys = set(keys)
+        if not keys:
+            return 0
+        with self._lock:
+            for key in keys:
+                if self._access.pop(key, None) is not None:
+                    self._dirty = True
+        pruned = 0
+        if self.registry_path.exists():
+            registry = IngestRegistry(self.registry_path)
+            stale = [digest for digest, entry in registry.entries.items() if entry.get("fileKey") in keys]
+            for digest in stale:
+                del registry.entries[digest]
+            if stale:
+                registry.save()
+            pruned = len(stale)
+        self.flush()
+        return pruned
+
+    def remove(self, fileKey: str) -> Dict[str, Any]:
+        """Delete every artifact of a log: upload, indexes and Parquet copy."""
+        paths = self.paths(fileKey)
+        freed = self._delete(paths)
+        self._forget([fileKey])
+        logger.info(f"Removed {len(paths)} files ({freed} bytes) of {fileKey}")
+        return {"fileKey": fileKey, "files": len(paths), "bytes": freed}
+
+    def collect(self, protect: Iterable[str] = (), dry_run: bool = False, now: Optional[float] = None) -> Dict[str, Any]:
+        """Remove orphans, expired logs and least recently used logs over the quota.
+
+        A log is an orphan when only index files remain: no upload, no
+        Parquet copy and no ingest registry entry to reload or rebuild it
+        from. Partial writes (*.tmp) and orphans younger than orphan_grace_s
+        are left alone, as they may belong to an ingestion in progress.
+
+        Args:
+            protect: fileKeys in use, never removed
+            dry_run: Report what would be removed without deleting anything
+            now: Current time (for tests)
+
+        Returns:
+            Dict[str, Any]: removed logs with reason, files and bytes, bytes_reclaimed,
+            bytes_before/bytes_after and registry entries pruned
+        """
+        now = now if now is not None else time.time()
+        protect = set(protect)
+        registered = set()
+        if self.registry_path.exists():
+            registered = {e.get("fileKey") for e in IngestRegistry(self.registry_path).entries.values()}
+
+        logs, partial = {}, []
+        for key, kinds in self.artifacts().items():
+            partial += [(key, p, _size(p)) for p in kinds.pop("partial", [])]
+            if kinds:
+                paths = [p for ps in kinds.values() for p in ps]
+                logs[key] = {"kinds": kinds, "paths": paths, "bytes": sum(_size(p) for p in paths),
+                             "last_access": self.last_access(key, paths)}
+        bytes_before = sum(log["bytes"] for log in logs.values()) + sum(size for _, _, size in partial)
+        removed: List[Dict[str, Any]] = []
+
+        def evict(key: str, reason: str, paths: List[Path], size: int):
+            removed.append({"fileKey": key, "reason": reason, "files": len(paths), "bytes": size})
+            if not dry_run:
+                self._delete(paths)
+
+        for key, path, size in partial:
+            if key not in protect and now - _mtime(path) > self.orphan_grace_s:
+                evict(key, "partial", [path], size)
+
+        for key, log in list(logs.items()):
+            if key in protect:
+                continue
+            idle = now - log["last_access"]
+            kinds = log["kinds"]
+            if "upload" not in kinds and "parquet" not in kinds and key not in registered and idle > self.orphan_grace_s:
+                evict(key, "orphan", log["paths"], log["bytes"])
+                del logs[key]
+            elif self.max_age_s is not None and idle > self.max_age_s:
+                evict(key, "expired", log["paths"], log["bytes"])
+                del logs[key]
+
+        if self.quota_bytes is not None:
+            total = sum(log["bytes"] for log in logs.values())
+            for key in sorted(logs, key=lambda k: logs[k]["last_access"]):
+                if total <= self.quota_bytes:
+                    break
+                if key in protect:
+                    continue
+                total -= logs[key]["bytes"]
+                evict(key, "quota", logs[key]["paths"], logs[key]["bytes"])
+
+        gone = {r["fileKey"] for r in removed if r["reason"] != "partial"}
+        pruned = 0 if dry_run else self._forget(gone)
+        if not dry_run:
+            self.flush()
+        reclaimed = sum(r["bytes"] for r in removed)
+        if removed:
+            logger.info(f"Storage collection {'would reclaim' if dry_run else 'reclaimed'} {reclaimed} bytes "
+                        f"from {len(gone)} logs")
+        return {"dry_run": dry_run, "removed": removed, "bytes_reclaimed": reclaimed,
+                "bytes_before": bytes_before, "bytes_after": bytes_before - reclaimed, "registry_pruned": pruned}
+
+    def store(self, path: Path) -> Path:
+        """Record a newly indexed upload and compress it at rest when configured; returns its final path."""
+        path = Path(path)
+        self.touch(path.name.split(".", 1)[0])
+        if self.compression != "zstd" or zstd is None or is_compressed(path):
+            return path
+        compressed = compress_file(path)
+        logger.info(f"Compressed {path.name}: {compressed.stat().st_size} bytes")
+        return compressed
+
+storage = StorageManager.from_config()
@@ -1,15 +1,88 @@
 import pytest
 import asyncio
-from backend.app.agents import ResponseEvaluator
 
-class DummyLLM:
+
+def test_parse_routed_answer():
+    from backend.app.agents import parse_routed_answer
+    assert parse_routed_answer('```json\n{"route": "tool:detect_anomalies", "answer": "Checking."}\n```') == ("tool:detect_anomalies", "Checking.")
+    assert parse_routed_answer('{"route": "embedding", "answer": "63 m"}') == ("answer", "63 m")
+    assert parse_routed_answer("Plain text reply") == ("answer", "Plain text reply")
+
+
+class CountingLLM:
+    def __init__(self):
+        self.prompts = []
+
     async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
         class R:
-            content = "True" if "incomplete" in prompt else "False"
+            content = '{"route": "tool:detect_anomalies", "answer": "Checking."}' if '"route"' in prompt else "No issues found."
         return R()
 
+
+@pytest.mark.asyncio
+async def test_confident_route_skips_llm_routing():
+    from backend.app.agents import FlightLogAgentOrchestrator
+    llm = CountingLLM()
+    orchestrator = FlightLogAgentOrchestrator(api_key="test", llm=llm)
+    calls = []
+    orchestrator.detect_anomalies = lambda fileKey, phase=None: calls.append("detect_anomalies") or []
+    orchestrator.retrieve_snippets = lambda fileKey, question, k=3, phase=None: calls.append("retrieve_snippets") or []
+    orchestrator.query_region = lambda fileKey, question: calls.append("query_region") or None
+
+    route = {"route": "anomaly", "confidence": 0.2, "similarity": 0.7, "confident": True, "source": "embedding"}
+    assert await orchestrator.answer_question("Any problems?", "log", [], route=route) == "No issues found."
+    assert calls == ["detect_anomalies"] and len(llm.prompts) == 1 and "detect_anomalies" in llm.prompts[0]
+
+    # Low confidence: the LLM drafts and routes while the guessed tool is prefetched
+    calls.clear()
+    await orchestrator.answer_question("Any problems?", "log", [], route={**route, "confident": False})
+    assert calls == ["detect_anomalies"] and len(llm.prompts) == 3
+
+
 @pytest.mark.asyncio
-async def test_response_evaluator_should_use_tool():
-    evaluator = ResponseEvaluator(DummyLLM())
-    assert await evaluator.should_use_tool("What is the max altitude?", "I don't know") is True
-    assert await evaluator.should_use_tool("What is the max altitude?", "The max altitude was 100m") is False 
\ No newline at end of file
+async def test_unused_prefetch_is_cancelled():
+    from backend.app.agents import FlightLogAgentOrchestrator
+
+    class AnsweringLLM:
+        async def ainvoke(self, prompt):
+            class R:
+                content = '{"route": "answer", "answer": "About 60 m."}'
+            return R()
+
+    orchestrator = FlightLogAgentOrchestrator(api_key="test", llm=AnsweringLLM())
+    started, finished = [], []
+
+    async def slow_snippets(fileKey, question, k=3, phase=None):
+        started.append(question)
+        await asyncio.sleep(1)
+        finished.append(question)
+        return []
+    orchestrator.aretrieve_snippets = slow_snippets
+    orchestrator.adetect_anomalies = lambda fileKey, phase=None: pytest.fail("not the guessed tool")
+
+    guess = {"route": "retrieval", "confidence": 0.0, "similarity": None, "confident": False, "source": "keywords"}
+    assert await orchestrator.answer_question("How high?", "log", [], route=guess) == "About 60 m."
+    await asyncio.sleep(0)
+    assert started == ["How high?"] and finished == []
+    # Nothing is prefetched for chat-like questions
+    started.clear()
+    await orchestrator.answer_question("Hello", "log", [], route={**guess, "route": "chat"})
+    assert started == []
+
+
+@pytest.mark.asyncio
+async def test_docs_fallback_index_is_built_off_the_event_loop(monkeypatch):
+    import threading
+    import backend.app.agents as agents
+    from backend.app.docs_index import DocsIndex
+    built_on = []
+
+    def build():
+        built_on.append(threading.current_thread())
+        return DocsIndex([])
+    monkeypatch.setattr(agents, "loaded_docs_index", lambda: None)
+    monkeypatch.setattr(agents, "get_docs_index", build)
+    orchestrator = agents.FlightLogAgentOrchestrator(api_key="test", llm=CountingLLM())
+    prompt = await orchestrator._conversation("What is logged in CTUN?", "log", [])
+    assert "CTUN" in prompt and built_on and built_on[0] is not threading.main_thread()
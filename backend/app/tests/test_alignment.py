@@ -0,0 +1,32 @@
+import numpy as np
+from backend.app.alignment import asof, nearest, interpolate, align, resample
+from backend.app.anomalies import detect_telemetry_anomalies
+
+def test_join_methods_match_definitions():
+    source_t = np.array([0.0, 1.0, 2.0, 4.0])
+    values = np.array([0.0, 10.0, 20.0, 40.0])
+    target = np.array([-0.5, 0.4, 1.0, 2.9, 3.5, 5.0])
+    assert np.array_equal(asof(source_t, values, target), [np.nan, 0, 10, 20, 20, 40], equal_nan=True)
+    assert np.array_equal(asof(source_t, values, target, tolerance=1.0), [np.nan, 0, 10, 20, np.nan, 40], equal_nan=True)
+    assert np.array_equal(nearest(source_t, values, target), [0, 0, 10, 20, 40, 40])
+    assert np.allclose(interpolate(source_t, values, target), [np.nan, 4, 10, 29, 35, np.nan], equal_nan=True)
+
+def test_align_and_resample_message_fields():
+    data = {"messages": {
+        "CTUN": [{"_timestamp": float(i), "Alt": 100.0 + i} for i in range(10)],
+        "GPS": [{"_timestamp": t, "Alt": 100.0 + t} for t in (9.5, 0.5, 2.5, 4.5, 6.5, 8.5)],
+    }}
+    aligned = align(data, ["CTUN.Alt", "GPS.Alt"], method="linear")
+    assert np.array_equal(aligned["_timestamp"], np.arange(10.0))
+    # GPS arrived out of order; it is sorted before interpolating
+    assert np.isnan(aligned["GPS.Alt"][0]) and np.allclose(aligned["GPS.Alt"][1:], aligned["CTUN.Alt"][1:])
+    sampled = resample(data, ["CTUN.Alt", "GPS.Alt"], rate=2.0)
+    assert np.allclose(sampled["_timestamp"], np.arange(0.5, 9.01, 0.5))
+    assert np.allclose(sampled["CTUN.Alt"], sampled["GPS.Alt"])
+
+    # Cross-message anomaly rules use the same as-of join
+    gpi = [{"alt": 50000 + 40000 * (t >= 5), "_timestamp": float(t)} for t in range(8)]
+    gps = [{"alt": 50000, "fix_type": 0 if t < 2 else 3, "_timestamp": t + 0.2} for t in range(8)]
+    events = detect_telemetry_anomalies({"messages": {"GLOBAL_POSITION_INT": gpi, "GPS_RAW_INT": gps}})
+    divergence = [e for e in events if e["type"] == "gps_altitude_divergence"]
+    assert [(e["start"], e["end"]) for e in divergence] == [(5.0, 7.0)] and divergence[0]["peak"] == 40.0
@@ -0,0 +1,40 @@
+from backend.app.anomalies import detect_telemetry_anomalies, merge_intervals
+import numpy as np
+
+def _parsed(messages):
+    return {"messages": messages}
+
+def test_merge_intervals_splits_on_gap():
+    times = np.arange(10, dtype=float)
+    mask = np.array([0, 1, 1, 0, 0, 0, 1, 0, 0, 0], dtype=bool)
+    intervals = merge_intervals(times, mask, times, gap=2.0)
+    assert [(i["start"], i["end"], i["samples"]) for i in intervals] == [(1.0, 2.0, 2), (6.0, 6.0, 1)]
+
+def test_detects_gps_fix_drop_and_sys_status_errors():
+    gps = [{"fix_type": f, "_timestamp": float(t)} for t, f in enumerate([0, 3, 3, 1, 1, 3, 3])]
+    sys_status = [{"errors_comm": 0, "errors_count1": e, "errors_count2": 0, "errors_count3": 0,
+                   "errors_count4": 0, "voltage_battery": 12600, "_timestamp": float(t)}
+                  for t, e in enumerate([0, 0, 2, 0])]
+    events = detect_telemetry_anomalies(_parsed({"GPS_RAW_INT": gps, "SYS_STATUS": sys_status}))
+    types = {e["type"]: e for e in events}
+    # The leading no-fix samples before the first 3D fix are not an anomaly
+    assert types["gps_fix_lost"]["start"] == 3.0
+    assert types["gps_fix_lost"]["end"] == 4.0
+    assert types["sys_status_error"]["start"] == 2.0
+    assert "battery_voltage_sag" not in types
+
+def test_detects_altitude_jump():
+    alts = [10000, 10100, 10200, 90000, 90100]
+    gpi = [{"lat": 0, "lon": 0, "relative_alt": a, "_timestamp": float(t)} for t, a in enumerate(alts)]
+    events = detect_telemetry_anomalies(_parsed({"GLOBAL_POSITION_INT": gpi}))
+    assert [e["type"] for e in events] == ["altitude_jump"]
+    assert events[0]["peak"] > 70
+
+def test_no_fix_positions_are_not_a_gps_jump():
+    # 0,0 until the first fix, a dropout mid-flight, then a real 2 km jump in one second
+    fixes = [(0, 0), (0, 0), (-353629904, 1491649392), (-353629910, 1491649400), (0, 0),
+             (-353629920, 1491649410), (-353449920, 1491649410)]
+    gpi = [{"lat": lat, "lon": lon, "relative_alt": 10000, "time_boot_ms": 1000 * t, "_timestamp": float(t)}
+           for t, (lat, lon) in enumerate(fixes)]
+    events = detect_telemetry_anomalies(_parsed({"GLOBAL_POSITION_INT": gpi}))
+    assert [(e["type"], e["start"]) for e in events] == [("gps_position_jump", 6.0)]
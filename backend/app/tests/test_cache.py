@@ -0,0 +1,50 @@
+from backend.app.cache import ResponseCache
+import numpy as np
+
+VOCAB = ["what", "was", "the", "max", "min", "altitude", "highest", "flight", "time", "how", "long"]
+
+def _encode(texts):
+    # Bag-of-words vectors, with "highest" as a synonym of "max"
+    vectors = []
+    for text in texts:
+        words = ["max" if w == "highest" else w for w in text.split()]
+        vectors.append([words.count(v) for v in VOCAB])
+    return np.array(vectors, dtype=np.float32)
+
+def test_exact_and_semantic_hits():
+    cache = ResponseCache(encode=_encode, similarity_threshold=0.9)
+    cache.put("log1", "What was the max altitude?", "63 m")
+    assert cache.get("log1", "  what was the MAX altitude ") == "63 m"
+    assert cache.get("log1", "what was the max altitude the") == "63 m"
+    # Same embedding neighbourhood but opposite meaning
+    assert cache.get("log1", "what was the min altitude") is None
+    assert cache.get("log2", "What was the max altitude?") is None
+    metrics = cache.metrics()
+    assert metrics["exact_hits"] == 1 and metrics["semantic_hits"] == 1 and metrics["misses"] == 2
+
+def test_ttl_lru_and_invalidation():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=10.0, clock=lambda: now[0])
+    cache.put("log1", "a", "1")
+    cache.put("log1", "b", "2")
+    cache.put("log1", "c", "3")
+    assert cache.get("log1", "a") is None
+    assert cache.get("log1", "b") == "2"
+    now[0] = 11.0
+    assert cache.get("log1", "b") is None
+    cache.put("log1", "d", "4")
+    assert cache.invalidate("log1") == 2
+    assert cache.get("log1", "d") is None
+
+def test_follow_ups_are_cached_per_conversation():
+    from backend.app.cache import history_key
+    cache = ResponseCache(encode=_encode, similarity_threshold=0.9)
+    first = [{"role": "user", "content": "What was the max altitude?"}, {"role": "assistant", "content": "63 m"}]
+    second = [{"role": "user", "content": "How long was the flight?"}, {"role": "assistant", "content": "5 min"}]
+    cache.put("log1", "and when", "At 120 s", history_key(first))
+    assert cache.get("log1", "and when", history_key(first)) == "At 120 s"
+    assert cache.get("log1", "and when", history_key(second)) is None
+    assert cache.get("log1", "and when") is None
+    # The flight log note added to the history does not change the conversation
+    assert history_key([{"role": "system", "content": "Flight log loaded"}] + first) == history_key(first)
+    assert history_key([{"role": "system", "content": "Flight log loaded"}]) == ""
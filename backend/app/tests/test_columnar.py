@@ -0,0 +1,36 @@
+import gzip
+import numpy as np
+import pytest
+from backend.app.columnar import ColumnarEncoder, select_columns, encode_raw, parse_range
+
+def _log():
+    return {"messages": {"ATTITUDE": [{"_timestamp": 1.7e9 + i * 0.1, "roll": 0.01 * i, "pitch": -0.02 * i}
+                                      for i in range(5)]}}
+
+def test_raw_columns_round_trip_at_aligned_offsets():
+    columns = select_columns(_log(), "ATTITUDE", ["roll"], dtype="float32")
+    body, layout = encode_raw(columns)
+    assert [c["name"] for c in layout] == ["_timestamp", "roll"]
+    assert all(c["offset"] % 8 == 0 for c in layout) and layout[1]["dtype"] == "float32"
+    t = np.frombuffer(body, "<f8", layout[0]["length"], layout[0]["offset"])
+    roll = np.frombuffer(body, "<f4", layout[1]["length"], layout[1]["offset"])
+    assert np.array_equal(t, 1.7e9 + np.arange(5) * 0.1) and np.allclose(roll, 0.01 * np.arange(5))
+
+    assert parse_range("bytes=8-15", 40) == (8, 15)
+    assert parse_range("bytes=-8", 40) == (32, 39) and parse_range("bytes=32-", 40) == (32, 39)
+    assert parse_range(None, 40) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=40-", 40)
+
+def test_encoder_caches_and_reports_missing_fields():
+    encoder = ColumnarEncoder()
+    first = encoder.encode("log", _log(), "ATTITUDE", compress=True)
+    assert encoder.encode("log", _log(), "ATTITUDE", compress=True) is first
+    body, layout = encode_raw(select_columns(_log(), "ATTITUDE"))
+    assert gzip.decompress(first["body"]) == body and first["layout"] == layout and first["rows"] == 5
+    encoder.invalidate("log")
+    assert encoder.encode("log", _log(), "ATTITUDE", compress=True) is not first
+    with pytest.raises(KeyError):
+        encoder.encode("log", _log(), "ATTITUDE", ["yaw"])
+    with pytest.raises(KeyError):
+        encoder.encode("log", _log(), "GPS")
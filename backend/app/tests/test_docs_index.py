@@ -0,0 +1,15 @@
+from backend.app.docs_index import load_logmetadata, DocsIndex, docs_vehicle
+
+def test_field_lookup_ranks_named_field_first():
+    index = DocsIndex(load_logmetadata())
+    results = index.search("what does Aspd mean in CTUN", vehicle_type="Fixed Wing", k=3)
+    assert results[0]["message"] == "CTUN" and results[0]["field"] == "Aspd"
+    assert index.name_matches("What is logged in CTUN?", "Fixed Wing")[0]["field"] is None
+    assert index.name_matches("how high did it fly?") == []
+
+def test_vehicle_type_selects_doc_set():
+    index = DocsIndex(load_logmetadata())
+    assert docs_vehicle("VTOL Quadrotor") == "plane" and docs_vehicle("Hexacopter") == "copter"
+    # SOAR (soaring) is only documented for Plane
+    assert any(r["message"] == "SOAR" for r in index.search("SOAR", vehicle_type="Fixed Wing"))
+    assert not any(r["message"] == "SOAR" for r in index.search("SOAR", vehicle_type="Quadcopter"))
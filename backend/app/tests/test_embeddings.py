@@ -9,4 +9,11 @@ def test_classify_query_type_anomaly():
     assert classify_query_type("Any errors or warnings?") == "anomaly_tool"
 
 def test_classify_query_type_unknown():
-    assert classify_query_type("Tell me a joke") == "unknown" 
\ No newline at end of file
+    assert classify_query_type("Tell me a joke") == "unknown"
+
+def test_classify_query_type_whole_words():
+    # "error" used to be a retrieval keyword, "min" matched "minute" and "land" matched "island"
+    assert classify_query_type("Any GPS errors during the flight?") == "anomaly_tool"
+    assert classify_query_type("Was there a battery failsafe?") == "anomaly_tool"
+    assert classify_query_type("Tell me about the island in 5 minutes") == "unknown"
+    assert classify_query_type("When did it land?") == "retrieval"
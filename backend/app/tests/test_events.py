@@ -0,0 +1,84 @@
+import asyncio
+import json
+import pytest
+from backend.app.events import EventBus
+
+class Client:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+
+    async def send(self, text: str) -> None:
+        if self.fail:
+            raise RuntimeError("socket closed")
+        await asyncio.sleep(self.delay)
+        self.received.append(json.loads(text))
+
+@pytest.mark.asyncio
+async def test_events_reach_only_their_topics():
+    bus = EventBus()
+    uploader, viewer, other = Client(), Client(), Client()
+    bus.connect(uploader.send, ["session:a"])
+    bus.connect(viewer.send, ["file:f1"])
+    bus.connect(other.send, ["session:b", "file:f2"])
+    # Subscribed through both topics, delivered once
+    assert bus.publish(["file:f1", "session:a"], {"type": "log_preview", "fileKey": "f1"}) == 2
+    await asyncio.sleep(0.01)
+    assert len(uploader.received) == 1 and len(viewer.received) == 1 and other.received == []
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_coalesced_progress_and_does_not_block_others():
+    bus = EventBus(max_queue=4)
+    slow, fast = Client(delay=0.05), Client()
+    bus.connect(slow.send, ["file:f"])
+    bus.connect(fast.send, ["file:f"])
+    await asyncio.sleep(0)
+    for step in range(1, 8):
+        bus.publish(["file:f"], {"type": "index_progress", "fileKey": "f", "step": step}, coalesce=True)
+    bus.publish(["file:f"], {"type": "embedding_status", "fileKey": "f", "message": "done"})
+    await asyncio.sleep(0.02)
+    # The fast client keeps up with everything while the slow one is still sending its first event
+    assert [e.get("step") for e in fast.received][-1] is None and len(fast.received) >= 2
+    await asyncio.sleep(0.2)
+    steps = [e["step"] for e in slow.received if e["type"] == "index_progress"]
+    assert steps[-1] == 7 and len(steps) < 7 and slow.received[-1]["message"] == "done"
+    assert bus.stats["coalesced"] > 0
+
+@pytest.mark.asyncio
+async def test_overflow_and_dead_sockets_are_removed():
+    bus = EventBus(max_queue=2)
+    stuck, dead = Client(delay=10), Client(fail=True)
+    bus.connect(stuck.send, ["file:f"])
+    bus.connect(dead.send, ["file:f"])
+    bus.publish(["file:f"], {"type": "log_preview", "fileKey": "f", "i": -1})
+    await asyncio.sleep(0.01)
+    assert bus.stats["dead"] == 1 and bus.metrics()["subscribers"] == 1
+    for i in range(5):
+        bus.publish(["file:f"], {"type": "log_preview", "fileKey": "f", "i": i})
+    await asyncio.sleep(0.01)
+    assert bus.metrics()["subscribers"] == 0 and bus.topics == {}
+    assert bus.stats["overflow"] >= 1 and bus.stats["dead"] == 1
+
+@pytest.mark.asyncio
+async def test_heartbeats_only_to_idle_subscribers():
+    bus = EventBus(heartbeat_s=0.0)
+    idle = Client()
+    bus.connect(idle.send, [])
+    bus.heartbeat()
+    bus.heartbeat()
+    await asyncio.sleep(0.01)
+    assert [e["type"] for e in idle.received] == ["heartbeat"]
+
+@pytest.mark.asyncio
+async def test_close_stops_heartbeats_and_disconnects_subscribers():
+    bus = EventBus(heartbeat_s=0.01)
+    stuck = Client(delay=10)
+    bus.connect(stuck.send, ["file:f"])
+    bus.publish(["file:f"], {"type": "log_preview", "fileKey": "f"})
+    bus.start()
+    heartbeats, writer = bus.heartbeat_task, next(iter(bus.subscribers)).task
+    await asyncio.sleep(0.03)
+    await bus.close()
+    assert heartbeats.cancelled() and writer.done() and bus.heartbeat_task is None
+    assert bus.metrics()["subscribers"] == 0 and bus.topics == {}
@@ -0,0 +1,46 @@
+import asyncio
+import time
+import pytest
+from backend.app.executors import BoundedExecutor, LoopLagMonitor
+
+@pytest.mark.asyncio
+async def test_blocking_calls_do_not_stall_the_loop():
+    pool = BoundedExecutor("test", workers=4, queue=4)
+    ticks = []
+
+    async def heartbeat():
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    results = await asyncio.gather(heartbeat(), *[pool.run(time.sleep, 0.1) for _ in range(4)])
+    assert results[1:] == [None] * 4
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.08
+    metrics = pool.metrics()
+    assert metrics["completed"] == 4 and metrics["active"] == 0 and metrics["waiting"] == 0
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_queue_bound_and_failures():
+    pool = BoundedExecutor("test", workers=1, queue=1)
+    tasks = [asyncio.ensure_future(pool.run(time.sleep, 0.05)) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    assert pool.stats["active"] == 2 and pool.stats["waiting"] == 2
+    await asyncio.gather(*tasks)
+    with pytest.raises(ZeroDivisionError):
+        await pool.run(lambda: 1 / 0)
+    assert pool.metrics()["failed"] == 1
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_sees_blocking_handler():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    task = monitor.task
+    await asyncio.sleep(0.05)
+    time.sleep(0.1)  # a handler blocking the loop
+    await asyncio.sleep(0.03)
+    await monitor.stop()
+    assert task.cancelled() and monitor.task is None
+    metrics = monitor.metrics()
+    assert metrics["samples"] >= 3 and metrics["max_ms"] >= 80 and metrics["p50_ms"] < 50
@@ -0,0 +1,39 @@
+from backend.app.facts import compute_flight_facts, answer_from_facts
+
+def _parsed():
+    gpi = [{"lat": 0, "lon": 0, "alt": 100000 + a, "relative_alt": a, "_timestamp": 100.0 + t}
+           for t, a in enumerate([0, 5000, 42000, 10000])]
+    heartbeats = [{"type": 1, "autopilot": 3, "base_mode": b, "custom_mode": m, "_timestamp": 100.0 + t}
+                  for t, (b, m) in enumerate([(81, 0), (209, 0), (209, 10), (81, 10)])]
+    heartbeats.insert(1, {"type": 6, "autopilot": 8, "base_mode": 0, "custom_mode": 0, "_timestamp": 100.5})
+    return {
+        "messages": {"GLOBAL_POSITION_INT": gpi, "HEARTBEAT": heartbeats},
+        "metadata": {"duration": 90.0, "first_timestamp": 100.0}
+    }
+
+def test_compute_flight_facts():
+    facts = compute_flight_facts(_parsed())
+    assert facts["max_altitude"]["value"] == 42.0
+    assert facts["max_altitude"]["timestamp"] == 102.0
+    assert facts["flight_duration"]["value"] == 90.0
+    # The GCS heartbeat is ignored
+    assert [e["event"] for e in facts["arming_events"]] == ["armed", "disarmed"]
+    assert [e["mode"] for e in facts["mode_timeline"]] == [0, 10]
+    assert [e["name"] for e in facts["mode_timeline"]] == ["MANUAL", "AUTO"]
+
+def test_answer_from_facts():
+    facts = compute_flight_facts(_parsed())
+    answer = answer_from_facts("What was the highest altitude?", facts, 100.0)
+    assert "42.00 m" in answer and "2.0 s" in answer
+    assert "1 min 30 s" in answer_from_facts("How long was the flight?", facts)
+    assert answer_from_facts("Were there any GPS glitches?", facts) is None
+
+def test_near_miss_questions_are_not_answered_from_facts():
+    facts = compute_flight_facts(_parsed())
+    assert answer_from_facts("When was the vehicle armed?", facts, 100.0).startswith("Arming events")
+    assert answer_from_facts("Which flight modes were used?", facts).startswith("Flight mode changes")
+    assert "42.00 m" in answer_from_facts("What was the max altitude reached in meters?", facts)
+    for question in ["How long did the battery sag last?", "Why did it fail to arm after the crash?",
+                     "What happened right after the mode change to AUTO?", "How long after takeoff did GPS drop?",
+                     "What was the highest altitude before the motors stopped?"]:
+        assert answer_from_facts(question, facts) is None, question
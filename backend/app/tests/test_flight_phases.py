@@ -0,0 +1,75 @@
+import numpy as np
+from pathlib import Path
+from backend.app.flight_phases import build_flight_phases, FlightIndex, scope_from_question
+from backend.app.mavlink_parser import MAVLinkParser
+
+SAMPLE_TLOG = Path(__file__).resolve().parents[3] / "src" / "assets" / "vtol.tlog"
+
+def _parsed():
+    # Quadcopter: on the ground until 10 s, climbs at 1 m/s to 20 m, cruises, descends and lands at 90 s
+    t = np.arange(0, 101, 1.0)
+    alt = np.interp(t, [0, 10, 30, 70, 90, 100], [0, 0, 20, 20, 0, 0])
+    gpi = [{"lat": 0, "lon": 0, "relative_alt": int(a * 1000), "_timestamp": s} for s, a in zip(t, alt)]
+    # STABILIZE, AUTO from 25 s, LAND from 75 s, disarmed at 95 s; every second, plus a GCS heartbeat
+    heartbeats = [{"type": 2, "autopilot": 3, "base_mode": 81 if s >= 95 else 209,
+                   "custom_mode": 9 if s >= 75 else 3 if s >= 25 else 0, "_timestamp": s} for s in t]
+    heartbeats.insert(1, {"type": 6, "autopilot": 8, "base_mode": 0, "custom_mode": 0, "_timestamp": 0.5})
+    return {"messages": {"GLOBAL_POSITION_INT": gpi, "HEARTBEAT": heartbeats}, "metadata": {"last_timestamp": 100.0}}
+
+def test_modes_and_phases():
+    flight = build_flight_phases(_parsed())
+    assert [(s["name"], s["start"], s["end"]) for s in flight["modes"]] == \
+        [("STABILIZE", 0.0, 25.0), ("AUTO", 25.0, 75.0), ("LAND", 75.0, 100.0)]
+    phases = [s["phase"] for s in flight["phases"]]
+    assert phases == ["armed", "takeoff", "climb", "cruise", "descent", "landing", "armed"]
+    takeoff = flight["phases"][1]
+    # Airborne above 1.5 m, takeoff over at 10 m
+    assert takeoff["start"] == 12.0 and takeoff["end"] == 20.0
+    # Nothing after disarming at 95 s
+    assert flight["phases"][-1]["end"] == 95.0
+
+def test_flight_index_lookups():
+    index = FlightIndex(build_flight_phases(_parsed()))
+    assert index.at(50.0) == {"phase": "cruise", "mode": "AUTO"}
+    assert index.intervals("mode:auto") == [(25.0, 75.0)]
+    assert [e[3] for e in index.overlapping(15.0, 26.0)] == ["STABILIZE", "takeoff", "climb", "AUTO"]
+    mask = index.mask([5.0, 15.0, 50.0, 99.0], "phase:takeoff")
+    assert mask.tolist() == [False, True, False, False]
+    assert not index.mask([1.0], "mode:QLOITER").any()
+
+def test_takeoff_phase_and_plane_takeoff_mode_are_separate_scopes():
+    parsed = _parsed()
+    # ArduPlane in TAKEOFF (custom_mode 13) until 40 s, then AUTO
+    for hb in parsed["messages"]["HEARTBEAT"]:
+        if hb["type"] == 2:
+            hb["type"], hb["custom_mode"] = 1, 13 if hb["_timestamp"] < 40 else 10
+    index = FlightIndex(build_flight_phases(parsed))
+    assert index.intervals("phase:takeoff") == [(12.0, 20.0)]
+    assert index.intervals("mode:takeoff") == [(0.0, 40.0)]
+    assert index.mask([30.0], "phase:takeoff").tolist() == [False]
+    assert index.mask([30.0], "mode:TAKEOFF").tolist() == [True]
+    # A bare label deliberately covers both kinds
+    assert index.intervals("takeoff") == [(0.0, 40.0)]
+    assert "phase:takeoff" in index.scopes() and "mode:takeoff" in index.scopes()
+    assert scope_from_question("Any vibration during takeoff?", index.scopes()) == "phase:takeoff"
+    assert scope_from_question("Any vibration in TAKEOFF mode?", index.scopes()) == "mode:TAKEOFF"
+
+def test_sample_log_modes_are_changes_only():
+    parsed = MAVLinkParser(SAMPLE_TLOG).parse()
+    assert [m["name"] for m in parsed["flight_modes"]] == ["QLOITER", "CIRCLE", "GUIDED", "QLAND"]
+    assert parsed["flight_phases"]["phases"][-1]["phase"] == "landing"
+
+def test_scope_from_question():
+    assert scope_from_question("Were there any vibration issues during takeoff?") == "phase:takeoff"
+    assert scope_from_question("What was the max speed while in AUTO?") == "mode:AUTO"
+    assert scope_from_question("Any GPS problems in alt hold mode?") == "mode:ALT_HOLD"
+    assert scope_from_question("What was the maximum altitude?") is None
+
+def test_scope_ignores_mode_words_in_plain_phrases():
+    assert scope_from_question("Explain in simple terms what happened") is None
+    assert scope_from_question("Was the vehicle in position during landing?") == "phase:landing"
+    assert scope_from_question("As a follow-up, any errors during follow-up checks?") is None
+    # Only scopes the log has, when its scopes are given
+    scopes = ["phase:cruise", "mode:qloiter"]
+    assert scope_from_question("Any errors in AUTO mode?", scopes=scopes) is None
+    assert scope_from_question("Any errors in AUTO mode or during cruise?", scopes=scopes) == "phase:cruise"
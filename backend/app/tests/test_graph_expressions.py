@@ -0,0 +1,57 @@
+import numpy as np
+from backend.app.graph_expressions import GraphEngine, parse_term, evaluate_term, lowpass, downsample_minmax
+
+def _log():
+    return {"messages": {
+        "CTUN": [{"_timestamp": float(i), "As": 10.0 + i, "E2T": 2.0} for i in range(10)],
+        "GPS": [{"_timestamp": i + 0.5, "I": i % 2, "Spd": float(i)} for i in range(10)],
+    }}
+
+def test_expressions_evaluate_vectorized():
+    data = _log()
+    t, y = evaluate_term(data, parse_term("CTUN.As*CTUN.E2T")[0])
+    assert np.allclose(y, (10.0 + np.arange(10)) * 2.0)
+    tree, axis = parse_term("sqrt(GPS[1].Spd**2):2")
+    t, y = evaluate_term(data, tree)
+    assert axis == 2 and np.allclose(t, [1.5, 3.5, 5.5, 7.5, 9.5]) and np.allclose(y, [1, 3, 5, 7, 9])
+    # Other message types are sampled as-of the first one's timestamps
+    t, y = evaluate_term(data, parse_term("CTUN.As-GPS.Spd")[0])
+    assert np.isnan(y[0]) and np.allclose(y[1:], 10.0 + np.arange(1, 10) - np.arange(0, 9))
+
+    x = np.random.default_rng(0).normal(size=5000)
+    expected, prev = np.empty_like(x), x[0]
+    for i, v in enumerate(x):
+        prev = 0.95 * prev + 0.05 * v
+        expected[i] = prev
+    assert np.allclose(lowpass(x, 0.95), expected)
+
+def _lowpass_scalar(x, alpha):
+    expected, prev = np.empty_like(x), x[0]
+    for i, v in enumerate(x):
+        prev = alpha * prev + (1 - alpha) * v
+        expected[i] = prev
+    return expected
+
+def test_lowpass_matches_the_scalar_recurrence_at_extreme_alphas():
+    x = np.random.default_rng(1).normal(size=10000)
+    assert np.allclose(lowpass(x, 0.999), _lowpass_scalar(x, 0.999))
+    # A small alpha gives short blocks with large alpha^-k; large samples must not overflow them
+    big = x * 1e10
+    y = lowpass(big, 0.05)
+    assert np.isfinite(y).all() and np.allclose(y, _lowpass_scalar(big, 0.05))
+
+def test_graph_series_cached_and_downsampled():
+    engine = GraphEngine({"Speed": {"description": "", "expressions": [["VFR_HUD.groundspeed"], ["GPS.Spd", "gravity(GPS)"]]}})
+    first = engine.series("log", _log(), "Speed", max_points=4)
+    assert first["expression"] == "GPS.Spd gravity(GPS)"
+    assert len(first["series"]) == 1 and len(first["series"][0]["t"]) <= 4
+    assert first["skipped"][0]["term"] == "gravity(GPS)"
+    assert engine.series("log", _log(), "Speed", max_points=4) is first
+    engine.invalidate("log")
+    assert engine.series("log", _log(), "Speed", max_points=4) is not first
+
+    t = np.arange(1000.0)
+    y = np.zeros(1000)
+    y[517] = 50.0
+    dt, dy = downsample_minmax(t, y, 100)
+    assert dy.max() == 50.0 and dt.size <= 100
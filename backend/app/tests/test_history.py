@@ -0,0 +1,38 @@
+import pytest
+from backend.app.history import ChatHistoryManager, estimate_tokens
+
+def _session(n):
+    history = [{"role": "system", "content": "Flight log loaded successfully. fileKey: old"}]
+    for i in range(n):
+        history.append({"role": "user", "content": f"Question {i} about the flight. " + "x" * 200})
+        history.append({"role": "assistant", "content": f"Answer {i}. " + "y" * 200})
+    history.append({"role": "system", "content": "Flight log loaded successfully. fileKey: new"})
+    return history
+
+@pytest.mark.asyncio
+async def test_compact_keeps_recent_turns_and_latest_context():
+    manager = ChatHistoryManager(token_budget=400, keep_recent=4)
+    compacted = await manager.compact(_session(10))
+    contexts = [t for t in compacted if "Flight log loaded successfully" in t["content"]]
+    assert contexts == [{"role": "system", "content": "Flight log loaded successfully. fileKey: new"}]
+    assert compacted[1]["content"].startswith("Summary of the earlier conversation")
+    assert compacted[-1]["content"].startswith("Answer 9.")
+    assert sum(estimate_tokens(t["content"]) for t in compacted) <= 600
+
+@pytest.mark.asyncio
+async def test_summary_rolls_forward_from_cache():
+    prompts = []
+    async def summarizer(prompt):
+        prompts.append(prompt)
+        return f"summary {len(prompts)}"
+
+    manager = ChatHistoryManager(token_budget=10000, keep_recent=2, summarizer=summarizer)
+    await manager.compact(_session(3))
+    await manager.wait_pending()
+    compacted = await manager.compact(_session(4))
+    await manager.wait_pending()
+    assert "summary 1" in compacted[1]["content"]
+    # The second summary only covers the newly evicted turns on top of the first one
+    assert "Summary so far: summary 1" in prompts[1]
+    assert "Question 0" not in prompts[1]
+    assert "summary 2" in (await manager.compact(_session(4)))[1]["content"]
@@ -0,0 +1,30 @@
+from backend.app import ingest
+from backend.app.ingest import discover_logs, run_batch, IngestRegistry
+
+def fake_ingest(path, file_key):
+    if path.endswith("bad.bin"):
+        raise ValueError("corrupt log")
+    return {"fileKey": file_key, "timings": {"parse": 0.01}}
+
+def test_batch_skips_ingested_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "FAISS_DIR", tmp_path / "faiss")
+    (tmp_path / "logs" / "old").mkdir(parents=True)
+    (tmp_path / "logs" / "a.tlog").write_bytes(b"flight a")
+    (tmp_path / "logs" / "old" / "copy_of_a.TLOG").write_bytes(b"flight a")
+    (tmp_path / "logs" / "b.bin").write_bytes(b"flight b")
+    (tmp_path / "logs" / "bad.bin").write_bytes(b"???")
+    (tmp_path / "logs" / "notes.txt").write_text("not a log")
+    paths = discover_logs([str(tmp_path / "logs")])
+    assert [p.name for p in paths] == ["a.tlog", "b.bin", "bad.bin", "copy_of_a.TLOG"]
+
+    registry = IngestRegistry(tmp_path / "ingested.json")
+    report = run_batch(paths, workers=2, registry=registry, ingest=fake_ingest)
+    assert (report["ingested"], report["skipped"], report["failed"]) == (2, 1, 1)
+    assert report["bytes"] == 16 and report["stage_s"]["parse"] > 0
+
+    # Indexed files are skipped on the next run, by content
+    (tmp_path / "faiss").mkdir()
+    for entry in registry.entries.values():
+        (tmp_path / "faiss" / f"{entry['fileKey']}.index").touch()
+    report = run_batch(paths, workers=1, registry=IngestRegistry(tmp_path / "ingested.json"), ingest=fake_ingest)
+    assert (report["ingested"], report["skipped"], report["failed"]) == (0, 3, 1)
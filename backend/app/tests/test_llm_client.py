@@ -0,0 +1,56 @@
+import pytest
+import asyncio
+from backend.app.llm_client import LLMClient, LLMLimits, LLMHTTPError, is_retryable
+
+class FlakyLLM:
+    """Stub model that answers 429 for the first `failures` calls, with a fixed latency."""
+    def __init__(self, failures=0, latency=0.01):
+        self.failures = failures
+        self.latency = latency
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.calls <= self.failures:
+                raise LLMHTTPError(429, "rate limited")
+            return f"answer to {prompt}"
+        finally:
+            self.concurrent -= 1
+
+def _client(llm, **kwargs):
+    return LLMClient(llm, limits=LLMLimits(max_concurrency=2, rate=1000, burst=1000), base_delay=0.001, **kwargs)
+
+def test_is_retryable():
+    assert is_retryable(LLMHTTPError(429))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(LLMHTTPError(400, "bad request"))
+    assert not is_retryable(ValueError("invalid prompt"))
+
+@pytest.mark.asyncio
+async def test_retries_rate_limited_calls():
+    llm = FlakyLLM(failures=2)
+    client = _client(llm)
+    assert await client.ainvoke("q") == "answer to q"
+    assert llm.calls == 3 and client.stats["retries"] == 2
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    client = _client(FlakyLLM(failures=10), max_retries=2)
+    with pytest.raises(LLMHTTPError):
+        await client.ainvoke("q")
+    assert client.stats["failures"] == 1
+
+@pytest.mark.asyncio
+async def test_coalesces_identical_prompts_and_limits_concurrency():
+    llm = FlakyLLM(latency=0.05)
+    client = _client(llm)
+    results = await asyncio.gather(*[client.ainvoke("same") for _ in range(5)], *[client.ainvoke(f"q{i}") for i in range(4)])
+    assert results[:5] == ["answer to same"] * 5
+    assert llm.calls == 5 and client.stats["coalesced"] == 4
+    assert llm.max_concurrent <= 2
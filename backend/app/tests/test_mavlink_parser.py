@@ -1,9 +1,61 @@
+import struct
 import pytest
 from backend.app.mavlink_parser import MAVLinkParser
 from pathlib import Path
 
+SAMPLE_TLOG = Path(__file__).resolve().parents[3] / "src" / "assets" / "vtol.tlog"
+
+
 # This test checks that the parser can be instantiated and handles missing files gracefully.
 def test_mavlink_parser_instantiation():
     parser = MAVLinkParser(Path("nonexistent.tlog"))
     with pytest.raises(Exception):
-        parser.parse() 
\ No newline at end of file
+        parser.parse() 
+
+
+def test_quick_scan_matches_full_parse():
+    parsed = MAVLinkParser(SAMPLE_TLOG).parse()
+    preview = MAVLinkParser(SAMPLE_TLOG).quick_scan()
+    assert preview["message_counts"] == {k: len(v) for k, v in parsed["messages"].items() if v}
+    assert preview["message_count"] == parsed["metadata"]["message_count"]
+    assert preview["vehicle_type"] == parsed["vehicle_type"]
+    assert (preview["first_timestamp"], preview["last_timestamp"]) == (parsed["metadata"]["first_timestamp"], parsed["metadata"]["last_timestamp"])
+
+
+def _dataflash(type_id, fmt, *values):
+    return b"\xa3\x95" + bytes([type_id]) + struct.pack("<" + fmt, *values)
+
+
+def test_quick_scan_dataflash(tmp_path):
+    fmt = lambda t, length, name, f, cols: _dataflash(128, "BB4s16s64s", t, length, name, f, cols)
+    data = fmt(128, 89, b"FMT", b"BBnNZ", b"Type,Length,Name,Format,Columns")
+    data += fmt(91, 75, b"MSG", b"QZ", b"TimeUS,Message") + fmt(92, 19, b"ATT", b"Qff", b"TimeUS,Roll,Pitch")
+    data += _dataflash(91, "Q64s", 1000000, b"ArduCopter V4.3.0")
+    data += b"".join(_dataflash(92, "Qff", 2000000 + i * 100000, 0.1, 0.2) for i in range(5))
+    data += b"\x00\x01\x02" + _dataflash(92, "Qff", 9000000, 0.1, 0.2)
+    path = tmp_path / "flight.bin"
+    path.write_bytes(data)
+
+    preview = MAVLinkParser(path).quick_scan()
+    assert preview["message_counts"] == {"FMT": 3, "MSG": 1, "ATT": 6}
+    assert preview["vehicle_type"] == "Quadcopter" and preview["skipped_bytes"] == 3
+    assert (preview["first_timestamp"], preview["duration"]) == (1.0, 8.0)
+    parsed = MAVLinkParser(path).parse()
+    assert len(parsed["messages"]["ATT"]) == 6 and parsed["vehicle_type"] == preview["vehicle_type"]
+
+
+@pytest.mark.parametrize("corrupt", [False, True])
+def test_fast_path_matches_pymavlink(tmp_path, corrupt):
+    data = SAMPLE_TLOG.read_bytes()
+    if corrupt:
+        # Garbage between records and a bad CRC send the fast path back to pymavlink
+        data = bytearray(data[:50000] + b"\x00garbage" + data[50000:])
+        data[1000] ^= 0xFF
+    path = tmp_path / "flight.tlog"
+    path.write_bytes(bytes(data))
+    reference = MAVLinkParser(path, fast_path=False).parse()
+    parsed = MAVLinkParser(path).parse()
+    assert parsed["messages"] == reference["messages"]
+    assert parsed["trajectory_data"] == reference["trajectory_data"] and parsed["facts"] == reference["facts"]
+    assert parsed["online_anomalies"] == reference["online_anomalies"]
+    assert parsed["columns"]["GLOBAL_POSITION_INT"]["lat"].tolist() == [m["lat"] for m in reference["messages"]["GLOBAL_POSITION_INT"]]
@@ -0,0 +1,47 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.app.metrics import MetricsRegistry, MetricsMiddleware, instrumented, registry, profiles
+
+def test_histogram_and_counter_rendering():
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        metrics.observe("stage_duration_seconds", seconds, {"stage": "parse"})
+    metrics.inc("llm_calls_total", {"outcome": "ok"}, 2)
+    metrics.add_collector(lambda: [("executor_active", "gauge", "Active jobs", [({"pool": 'c"pu'}, 3)])])
+    text = metrics.render()
+    assert 'uavlogviewer_stage_duration_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'uavlogviewer_stage_duration_seconds_bucket{stage="parse",le="1.0"} 2' in text
+    assert 'uavlogviewer_stage_duration_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'uavlogviewer_stage_duration_seconds_count{stage="parse"} 3' in text
+    assert 'uavlogviewer_llm_calls_total{outcome="ok"} 2' in text
+    assert 'uavlogviewer_executor_active{pool="c\\"pu"} 3' in text
+
+@pytest.mark.asyncio
+async def test_instrumented_counts_failures():
+    @instrumented("test.failing")
+    async def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await failing()
+    assert registry.snapshot("stage_duration_seconds")[(("stage", "test.failing"),)]["count"] == 1
+    assert 'uavlogviewer_stage_errors_total{stage="test.failing"} 1' in registry.render()
+
+def test_profiled_request():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, profiling=True)
+
+    @app.get("/work")
+    def work():
+        time.sleep(0.05)
+        return {"items": [str(i) for i in range(10000)]}
+
+    client = TestClient(app)
+    assert "x-profile-id" not in client.get("/work").headers
+    response = client.get("/work", headers={"X-Profile": "1"})
+    profile = profiles.get(response.headers["x-profile-id"])
+    assert profile["status"] == 200 and profile["elapsed_s"] >= 0.05
+    assert "work (test_metrics.py" in profile["folded"] and profile["allocations"]
+    assert 'route="/work"' in registry.render()
@@ -0,0 +1,28 @@
+from backend.app.online_detectors import EWMAZScoreDetector, CUSUMDetector, OnlineAnomalyMonitor
+import math
+
+def test_ewma_flags_spike_after_warmup():
+    detector = EWMAZScoreDetector(threshold=6.0, warmup=20)
+    flagged = [detector.update(math.sin(i / 5.0)) for i in range(100)]
+    assert all(f is None for f in flagged)
+    assert detector.update(50.0) is not None
+
+def test_cusum_flags_level_shift_once():
+    detector = CUSUMDetector(warmup=50, min_std=0.05)
+    values = [12.6 + 0.01 * ((i % 5) - 2) for i in range(200)] + [11.0] * 50
+    alarms = [i for i, v in enumerate(values) if detector.update(v) is not None]
+    assert len(alarms) == 1 and alarms[0] >= 200
+
+def test_monitor_merges_flags_into_events():
+    monitor = OnlineAnomalyMonitor([
+        {"name": "spike", "msg_type": "ATTITUDE", "fields": ["rollspeed"], "detector": "ewma",
+         "params": {"threshold": 6.0, "warmup": 10}, "severity": "warning"}
+    ])
+    for i in range(50):
+        monitor.observe("ATTITUDE", {"rollspeed": 0.01 * (i % 3)}, float(i))
+    monitor.observe("ATTITUDE", {"rollspeed": 5.0}, 50.0)
+    monitor.observe("ATTITUDE", {"rollspeed": 30.0}, 50.5)
+    monitor.observe("VFR_HUD", {"alt": 1.0}, 51.0)
+    events = monitor.events()
+    assert len(events) == 1
+    assert events[0]["start"] == 50.0 and events[0]["end"] == 50.5 and events[0]["samples"] == 2
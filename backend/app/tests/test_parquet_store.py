@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from backend.app.columns import message_columns
+
+pq = pytest.importorskip("pyarrow.parquet")
+from backend.app.parquet_store import export_parsed_log, load_parsed_log
+
+def _parsed():
+    trajectory = [[149.16, -35.36, 0.0, 1000.0], [149.17, -35.35, 5.5, 2000.0]]
+    return {
+        "messages": {
+            "ATTITUDE": [{"mavpackettype": "ATTITUDE", "roll": 0.1 * i, "_timestamp": 1.0 + i} for i in range(5)],
+            "GPS[1]": [{"Status": 3, "Spd": 2.5, "_timestamp": 1.5}],
+            "STATUSTEXT": [{"text": "ArduPlane", "_timestamp": 1.0}, {"text": 5, "_timestamp": 2.0}],
+        },
+        "metadata": {"file_name": "log.tlog", "trajectory_data": None, "currentTrajectory": trajectory},
+        "trajectory_data": {"GLOBAL_POSITION_INT": {"startAltitude": 6.0, "trajectory": trajectory, "timeTrajectory": {
+            1000.0: [149.16, -35.36, 6.0, 1000.0], 2000.0: [149.17, -35.35, 11.5, 2000.0]}}},
+        "vehicle_type": "Fixed Wing",
+        "facts": {"max_altitude": {"value": np.float64(11.5)}},
+        "params": {1: {"RATE": 2}, (0, "GPS"): "ok"},
+    }
+
+def test_export_round_trips_parsed_data(tmp_path):
+    data = _parsed()
+    directory = export_parsed_log("log", data, root=tmp_path)
+    stats = pq.ParquetFile(directory / "messages" / "msg_type=ATTITUDE" / "part-0.parquet").metadata.row_group(0)
+    assert stats.column(2).statistics.min == 1.0 and stats.column(2).statistics.max == 5.0
+
+    loaded = load_parsed_log("log", root=tmp_path)
+    assert loaded["messages"]["ATTITUDE"] == data["messages"]["ATTITUDE"]
+    assert loaded["messages"]["GPS[1]"] == data["messages"]["GPS[1]"]
+    # Mixed-type fields come back as text
+    assert [m["text"] for m in loaded["messages"]["STATUSTEXT"]] == ["ArduPlane", "5"]
+    assert loaded["trajectory_data"] == data["trajectory_data"]
+    assert loaded["metadata"]["currentTrajectory"] == data["trajectory_data"]["GLOBAL_POSITION_INT"]["trajectory"]
+    assert loaded["facts"]["max_altitude"]["value"] == 11.5 and loaded["vehicle_type"] == "Fixed Wing"
+    assert np.allclose(message_columns(loaded, "ATTITUDE")["roll"], 0.1 * np.arange(5))
+    # Non-str dict keys survive the JSON metadata
+    assert loaded["params"] == {1: {"RATE": 2}, (0, "GPS"): "ok"}
+
+def test_fields_mixing_int_and_float_come_back_as_float(tmp_path):
+    data = _parsed()
+    data["messages"]["VFR_HUD"] = [{"throttle": 40, "_timestamp": 1.0}, {"throttle": 42.5, "_timestamp": 2.0}]
+    export_parsed_log("log", data, root=tmp_path)
+    loaded = load_parsed_log("log", root=tmp_path)
+    # Documented lossy conversion: the values are kept, the int becomes a float
+    throttle = [m["throttle"] for m in loaded["messages"]["VFR_HUD"]]
+    assert throttle == [40.0, 42.5] and all(type(v) is float for v in throttle)
+    assert [type(m["Status"]) for m in loaded["messages"]["GPS[1]"]] == [int]
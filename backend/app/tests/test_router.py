@@ -0,0 +1,54 @@
+import numpy as np
+from backend.app.router import QueryRouter
+
+VOCAB = ["max", "altitude", "speed", "gps", "lost", "error", "home", "near", "hello", "joke"]
+PROTOTYPES = {
+    "facts": ["max altitude", "max speed"],
+    "anomaly": ["gps lost", "error"],
+    "region": ["near home"],
+    "chat": ["hello", "joke"],
+}
+
+def _encode(texts, calls=None):
+    if calls is not None:
+        calls.append(len(texts))
+    return np.array([[text.split().count(v) for v in VOCAB] for text in texts], dtype=np.float32)
+
+def test_routes_to_the_closest_prototypes():
+    calls = []
+    router = QueryRouter(encode=lambda texts: _encode(texts, calls), prototypes=PROTOTYPES, top_k=1)
+    decision = router.route("What was the MAX altitude?")
+    assert decision["route"] == "facts" and decision["confident"] and decision["source"] == "embedding"
+    assert router.route("Was the GPS lost?")["route"] == "anomaly"
+    assert router.route("tell me a joke")["route"] == "chat"
+    # Prototypes are embedded once, questions one at a time
+    assert calls == [7, 1, 1, 1]
+    router.route("What was the MAX altitude?")
+    assert calls == [7, 1, 1, 1]
+
+def test_ambiguous_and_unknown_questions_are_not_confident():
+    router = QueryRouter(encode=_encode, prototypes=PROTOTYPES, top_k=1)
+    ambiguous = router.route("gps lost near home")
+    assert not ambiguous["confident"] and ambiguous["confidence"] < router.min_margin
+    unknown = router.route("what is a quadplane")
+    assert not unknown["confident"] and unknown["similarity"] == 0.0
+    metrics = router.metrics()
+    assert metrics["decisions"] == 2 and metrics["low_confidence"] == 2
+
+def test_reuses_question_embeddings():
+    embedded = []
+    def embed(question):
+        embedded.append(question)
+        vector = _encode(["near home"])[0]
+        return vector / np.linalg.norm(vector)
+    router = QueryRouter(encode=_encode, embed=embed, prototypes=PROTOTYPES)
+    assert router.route("Was it close to the launch point?")["route"] == "region"
+    assert embedded == ["Was it close to the launch point?"]
+
+def test_keyword_decisions_are_never_confident():
+    calls = []
+    router = QueryRouter(encode=lambda texts: _encode(texts, calls), prototypes=PROTOTYPES)
+    decision = router.keyword_decision("Were there any GPS errors?")
+    assert decision["source"] == "keywords" and not decision["confident"]
+    # Does not embed anything, so it is cheap enough to run on the event loop
+    assert calls == []
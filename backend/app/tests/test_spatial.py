@@ -0,0 +1,49 @@
+import numpy as np
+from pathlib import Path
+from backend.app.anomalies import haversine
+from backend.app.mavlink_parser import MAVLinkParser
+from backend.app.spatial import TrackIndex, SpatialCatalog, region_from_question
+
+SAMPLE_TLOG = Path(__file__).resolve().parents[3] / "src" / "assets" / "vtol.tlog"
+
+def _out_and_back(lat0=-35.0, lon0=149.0):
+    # 0-100 s fly 1 km north at 10 m/s, 100-200 s back home
+    t = np.arange(0, 201, 1.0)
+    north_m = np.where(t <= 100, t * 10, (200 - t) * 10)
+    return TrackIndex(t, lat0 + north_m / 111320.0, np.full(t.size, lon0), north_m / 10)
+
+def test_radius_bbox_and_polygon_intervals():
+    track = _out_and_back()
+    near_home = track.intervals({"type": "radius", "center": "home", "radius_m": 50})
+    assert [(i["start"], i["end"]) for i in near_home] == [(0.0, 5.0), (195.0, 200.0)]
+    assert near_home[0]["min_distance_m"] == 0.0
+
+    far = track.intervals({"type": "bbox", "min_lat": -35.0 + 800 / 111320, "min_lon": 148.9,
+                           "max_lat": -34.9, "max_lon": 149.1})
+    assert [(i["start"], i["end"]) for i in far] == [(80.0, 120.0)] and far[0]["max_alt_m"] == 100.0
+
+    triangle = [[-35.001, 148.999], [-35.001, 149.001], [-34.9955, 149.0]]
+    inside = track.intervals({"type": "polygon", "points": triangle})
+    assert [(i["start"], i["end"]) for i in inside] == [(0.0, 50.0), (150.0, 200.0)]
+
+def test_grid_matches_brute_force_on_sample_log():
+    track = TrackIndex.from_parsed(MAVLinkParser(SAMPLE_TLOG).parse())
+    center = (track.lat[len(track.lat) // 2], track.lon[len(track.lon) // 2])
+    for radius_m in (30, 300, 3000):
+        idx, _ = track.match({"type": "radius", "lat": center[0], "lon": center[1], "radius_m": radius_m})
+        expected = np.flatnonzero(haversine(center[0], center[1], track.lat, track.lon) <= radius_m)
+        assert np.array_equal(idx, expected) and idx.size
+
+def test_catalog_skips_logs_outside_the_region(tmp_path):
+    catalog = SpatialCatalog(tmp_path)
+    _out_and_back().save(tmp_path / "canberra_track.npz")
+    _out_and_back(lat0=51.5, lon0=-0.1).save(tmp_path / "london_track.npz")
+    results = catalog.query({"type": "radius", "lat": -35.0, "lon": 149.0, "radius_m": 100})
+    assert [r["fileKey"] for r in results] == ["canberra"] and results[0]["total_s"] == 20.0
+    assert len(catalog.query({"type": "radius", "center": "home", "radius_m": 100})) == 2
+
+def test_region_from_question():
+    assert region_from_question("When was the vehicle within 50 m of home?") == {"type": "radius", "center": "home", "radius_m": 50.0}
+    assert region_from_question("Did it pass within 1.5 km of -35.36, 149.16?")["radius_m"] == 1500.0
+    assert region_from_question("Did it fly inside -35.37, 149.15 and -35.35, 149.17?")["type"] == "bbox"
+    assert region_from_question("What was the maximum altitude?") is None
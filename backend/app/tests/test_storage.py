@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import pytest
+from pathlib import Path
+from backend.app.storage import StorageManager, log_suffix, compression_available, compress_file
+from backend.app.mavlink_parser import MAVLinkParser
+
+SAMPLE_TLOG = Path(__file__).resolve().parents[3] / "src" / "assets" / "vtol.tlog"
+NOW = 1_000_000.0
+
+def _log(root: Path, key: str, mtime: float, upload=".tlog", index=True, parquet=False, size=1000):
+    files = []
+    if upload:
+        files.append(root / f"{key}{upload}")
+    if index:
+        files += [root / "faiss_indexes" / f"{key}{s}" for s in (".index", "_snippets.json", "_phases.json")]
+    if parquet:
+        files.append(root / "parquet" / key / "metadata.json")
+    for path in files:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        os.utime(path, (mtime, mtime))
+
+def _manager(root: Path, **kwargs) -> StorageManager:
+    return StorageManager(root, root / "faiss_indexes", root / "parquet", root / "ingested.json",
+                          root / "storage_access.json", **kwargs)
+
+def test_remove_deletes_every_artifact(tmp_path):
+    _log(tmp_path, "a", NOW, upload=".bin.zst", parquet=True)
+    _log(tmp_path, "b", NOW)
+    (tmp_path / "docs_index").mkdir()
+    (tmp_path / "ingested.json").write_text(json.dumps({"d1": {"fileKey": "a"}, "d2": {"fileKey": "b"}}))
+    storage = _manager(tmp_path)
+    assert sorted(storage.artifacts()["a"]) == ["index", "parquet", "upload"]
+
+    removed = storage.remove("a")
+    assert removed["files"] == 5 and removed["bytes"] == 5000
+    assert set(storage.artifacts()) == {"b"} and (tmp_path / "docs_index").exists()
+    assert list(json.loads((tmp_path / "ingested.json").read_text())) == ["d2"]
+
+def test_collect_orphans_expired_and_quota(tmp_path):
+    day = 86400.0
+    _log(tmp_path, "orphan", NOW - day, upload=None)
+    _log(tmp_path, "fresh_orphan", NOW - 60, upload=None)
+    _log(tmp_path, "old", NOW - 10 * day)
+    _log(tmp_path, "lru", NOW - 2 * day)
+    _log(tmp_path, "recent", NOW - day)
+    _log(tmp_path, "in_use", NOW - 20 * day)
+    _log(tmp_path, "ingested", NOW - day, upload=None)
+    (tmp_path / "ingested.json").write_text(json.dumps({"d": {"fileKey": "ingested"}}))
+    partial = tmp_path / "x.tlog.zst.tmp"
+    partial.write_bytes(b"x" * 10)
+    os.utime(partial, (NOW - day, NOW - day))
+    storage = _manager(tmp_path, max_age_s=5 * day, quota_bytes=14000)
+    storage.touch("recent", NOW - 60)
+
+    preview = storage.collect(protect=["in_use"], dry_run=True, now=NOW)
+    assert sorted(storage.artifacts()) == sorted(["orphan", "fresh_orphan", "old", "lru", "recent", "in_use",
+                                                  "ingested", "x"])
+    report = storage.collect(protect=["in_use"], now=NOW)
+    assert report["removed"] == preview["removed"]
+    reasons = {r["fileKey"]: r["reason"] for r in report["removed"]}
+    # 18000 bytes left after orphans and expiry: the least recently used log goes for the 14000 quota
+    assert reasons == {"x": "partial", "orphan": "orphan", "old": "expired", "lru": "quota"}
+    assert report["bytes_reclaimed"] == 10 + 3000 + 4000 + 4000
+    assert report["bytes_after"] == report["bytes_before"] - report["bytes_reclaimed"]
+    assert sorted(storage.artifacts()) == ["fresh_orphan", "in_use", "ingested", "recent"]
+
+def test_log_suffix():
+    assert log_suffix(Path("a.tlog.zst")) == ".tlog" and log_suffix(Path("a.BIN")) == ".bin"
+
+@pytest.mark.skipif(not compression_available(), reason="zstandard is not installed")
+@pytest.mark.parametrize("fast_path", [True, False])
+def test_compressed_log_parses_like_the_original(tmp_path, fast_path):
+    plain = tmp_path / "vtol.tlog"
+    shutil.copy(SAMPLE_TLOG, plain)
+    expected = MAVLinkParser(plain, fast_path=fast_path).parse()
+    compressed = compress_file(plain)
+    assert not plain.exists() and compressed.stat().st_size < SAMPLE_TLOG.stat().st_size
+    parsed = MAVLinkParser(compressed, fast_path=fast_path).parse()
+    assert parsed["messages"] == expected["messages"]
+    assert MAVLinkParser(compressed).quick_scan()["message_count"] == expected["metadata"]["message_count"]
@@ -23,4 +23,20 @@ def test_retrieve_snippets_success(mock_encode, mock_faiss):
 def test_detect_anomalies_filters(mock_file):
     result = detect_anomalies("fakekey")
     assert any(a["type"] == "sys_status_error" for a in result)
-    assert any("battery low" in a["description"].lower() for a in result) 
\ No newline at end of file
+    assert any("battery low" in a["description"].lower() for a in result)
+
+def test_scope_missing_from_the_log_leaves_results_unscoped(monkeypatch):
+    import backend.app.tools as tools
+    from backend.app.flight_phases import FlightIndex
+    report = [{"start": 50.0, "end": 51.0, "type": "gps_position_jump"}]
+    index = FlightIndex({"phases": [{"start": 0.0, "end": 20.0, "phase": "takeoff"}],
+                         "modes": [{"start": 0.0, "end": 100.0, "name": "AUTO"}]})
+    monkeypatch.setattr(tools, "load_anomaly_report", lambda fileKey: report)
+    monkeypatch.setattr(tools, "load_flight_index", lambda fileKey: index)
+    # "in simple terms" once scoped this to a SIMPLE mode the log never had, hiding every event
+    assert detect_anomalies("log", "mode:SIMPLE") == report
+    assert detect_anomalies("log", "phase:takeoff") == []
+    assert detect_anomalies("log", "mode:auto") == report
+    snippets = [{"text": "a", "_timestamp": 5.0}, {"text": "b", "_timestamp": 50.0}]
+    assert tools._phase_snippet_ids("log", snippets, "mode:SIMPLE") is None
+    assert tools._phase_snippet_ids("log", snippets, "phase:takeoff").tolist() == [0]
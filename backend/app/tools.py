@@ -1,25 +1,49 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 from pathlib import Path
 import json
 from .embeddings import model
+from .anomalies import load_anomaly_report
+from .spatial import catalog, region_from_question
+from .flight_phases import load_flight_index
+from .executors import run_blocking
+from .metrics import instrumented, timed
 import faiss
 
-def retrieve_snippets(fileKey: str, question: str, k: int = 10) -> List[Dict]:
-    """Retrieve relevant telemetry snippets using vector search."""
+@instrumented("retrieve_snippets")
+def retrieve_snippets(fileKey: str, question: str, k: int = 10, phase: Optional[str] = None) -> List[Dict]:
+    """Retrieve relevant telemetry snippets using vector search.
+
+    With a phase (a scope such as "phase:takeoff" or "mode:AUTO", see
+    flight_phases.scope_from_question) only snippets logged during it are
+    searched, unless the log has no such phase or mode.
+    """
     try:
         outdir = Path("uploads/faiss_indexes")
-        index = faiss.read_index(str(outdir / f"{fileKey}.index"))
-        with open(outdir / f"{fileKey}_snippets.json") as f:
-            snippets = json.load(f)
+        with timed("retrieve_snippets.load_index"):
+            index = faiss.read_index(str(outdir / f"{fileKey}.index"))
+            with open(outdir / f"{fileKey}_snippets.json") as f:
+                snippets = json.load(f)
         
         # Encode question and search
-        q_emb = model.encode([question]).astype("float32")
-        D, I = index.search(q_emb, k)
+        with timed("retrieve_snippets.encode"):
+            q_emb = model.encode([question]).astype("float32")
+        params = None
+        if phase:
+            with timed("retrieve_snippets.scope"):
+                ids = _phase_snippet_ids(fileKey, snippets, phase)
+            if ids is not None:
+                if not ids.size:
+                    return []
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+        with timed("retrieve_snippets.search"):
+            D, I = index.search(q_emb, k, params=params)
         
         # Format results
         results = []
         for i in I[0]:
+            if i < 0:
+                continue
             snippet = snippets[i]
             results.append({
                 "timestamp": snippet.get("time", ""),
@@ -30,9 +54,34 @@ def retrieve_snippets(fileKey: str, question: str, k: int = 10) -> List[Dict]:
     except Exception as e:
         return [{"error": f"Failed to retrieve snippets: {str(e)}"}]
 
-def detect_anomalies(fileKey: str) -> List[Dict]:
-    """Detect anomalies by scanning snippets for anomaly keywords, but filter out false positives."""
+def _phase_snippet_ids(fileKey: str, snippets: List[Dict], phase: str) -> Optional[np.ndarray]:
+    """Ids of the snippets logged during phase, or None when the log cannot be scoped."""
+    flight_index = load_flight_index(fileKey)
+    if flight_index is None or not snippets or "_timestamp" not in snippets[0]:
+        return None
+    # A phase or mode the log does not have is a misread question, not an empty scope
+    if not flight_index.has(phase):
+        return None
+    timestamps = np.array([s.get("_timestamp") or np.nan for s in snippets], dtype=np.float64)
+    return np.flatnonzero(flight_index.mask(timestamps, phase)).astype(np.int64)
+
+@instrumented("detect_anomalies")
+def detect_anomalies(fileKey: str, phase: Optional[str] = None) -> List[Dict]:
+    """Detect anomalies for a log.
+
+    Returns the events found by the vectorized rule engine at ingestion time when
+    available, otherwise scans snippets for anomaly keywords, filtering out false positives.
+    With a phase the log has, only rule engine events overlapping it are returned.
+    """
     try:
+        report = load_anomaly_report(fileKey)
+        if report is not None:
+            flight_index = load_flight_index(fileKey) if phase else None
+            if flight_index is None or not flight_index.has(phase):
+                return report
+            spans = flight_index.intervals(phase)
+            return [e for e in report if any(e["start"] <= end and e["end"] >= start for start, end in spans)]
+
         outdir = Path("uploads/faiss_indexes")
         with open(outdir / f"{fileKey}_snippets.json") as f:
             snippets = json.load(f)
@@ -65,4 +114,36 @@ def detect_anomalies(fileKey: str) -> List[Dict]:
                     continue  # If parsing fails, skip
         return anomalies
     except Exception as e:
-        return [{"error": f"Failed to detect anomalies: {str(e)}"}] 
\ No newline at end of file
+        return [{"error": f"Failed to detect anomalies: {str(e)}"}] 
+
+@instrumented("query_region")
+def query_region(fileKey: str, question: str) -> Dict[str, Any]:
+    """Time intervals the vehicle spent inside the region named in the question.
+
+    Returns an empty dict when the question names no region (see
+    spatial.region_from_question) or the log has no position fixes.
+    """
+    try:
+        region = region_from_question(question)
+        if region is None:
+            return {}
+        index = catalog.get(fileKey)
+        if index is None:
+            return {}
+        intervals = index.intervals(region)
+        return {"region": region, "home": index.home, "intervals": intervals,
+                "total_s": sum(i["duration_s"] for i in intervals)}
+    except Exception as e:
+        return {"error": f"Failed to query region: {str(e)}"}
+
+async def aretrieve_snippets(fileKey: str, question: str, k: int = 10, phase: Optional[str] = None) -> List[Dict]:
+    """Async retrieve_snippets: index read, encoding and search run in the model pool."""
+    return await run_blocking("model", retrieve_snippets, fileKey, question, k, phase)
+
+async def adetect_anomalies(fileKey: str, phase: Optional[str] = None) -> List[Dict]:
+    """Async detect_anomalies: report and snippet reads run in the io pool."""
+    return await run_blocking("io", detect_anomalies, fileKey, phase)
+
+async def aquery_region(fileKey: str, question: str) -> Dict[str, Any]:
+    """Async query_region: the track load and query run in the cpu pool."""
+    return await run_blocking("cpu", query_region, fileKey, question)
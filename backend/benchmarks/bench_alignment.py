@@ -0,0 +1,72 @@
+"""Benchmark the time alignment engine on million-row series.
+
+Two irregular, jittery series (as a long log's GPS and attitude streams would
+be) are aligned with app.alignment and, on a prefix, with the per-sample
+Python loop the anomaly checks and graph expressions would otherwise need.
+Run from the backend directory:
+
+    python -m benchmarks.bench_alignment --rows 1000000 4000000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from app.alignment import asof, nearest, interpolate, fixed_rate_clock
+
+def _series(rows: int, rate: float, seed: int):
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.5, 1.5, rows) / rate)
+    return t, np.sin(t / 10.0) + rng.normal(0, 0.01, rows)
+
+def _asof_loop(source_t, values, target_t):
+    out, j = [], -1
+    for t in target_t:
+        while j + 1 < len(source_t) and source_t[j + 1] <= t:
+            j += 1
+        out.append(values[j] if j >= 0 else float("nan"))
+    return np.array(out)
+
+def _timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def run_level(rows: int, loop_rows: int) -> dict:
+    source_t, values = _series(rows, rate=5.0, seed=0)
+    target_t, _ = _series(rows * 5, rate=25.0, seed=1)
+    clock = fixed_rate_clock(source_t[0], source_t[-1], 10.0)
+    result = {"rows": rows, "target_rows": int(target_t.size)}
+    for name, fn, target in (("asof", asof, target_t), ("nearest", nearest, target_t),
+                             ("linear", interpolate, target_t), ("resample_10hz", interpolate, clock)):
+        seconds, _ = _timed(fn, source_t, values, target)
+        result[f"{name}_ms"] = seconds * 1000
+        result[f"{name}_rows_per_s"] = target.size / seconds
+
+    prefix = target_t[:loop_rows]
+    loop_s, expected = _timed(_asof_loop, source_t, values, prefix, repeat=1)
+    vector_s, actual = _timed(asof, source_t, values, prefix)
+    assert np.array_equal(expected, actual, equal_nan=True)
+    result["loop_speedup"] = loop_s / vector_s
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000], help="Source rows (targets are 5x)")
+    parser.add_argument("--loop-rows", type=int, default=200_000, help="Target rows for the Python loop baseline")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run_level(rows, args.loop_rows) for rows in args.rows]
+    for r in results:
+        print(f"rows={r['rows']} targets={r['target_rows']} " + " ".join(
+            f"{m}={r[f'{m}_ms']:.0f}ms" for m in ("asof", "nearest", "linear", "resample_10hz")
+        ) + f" loop_speedup={r['loop_speedup']:.0f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
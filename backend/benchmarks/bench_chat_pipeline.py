@@ -0,0 +1,135 @@
+"""Benchmark FlightLogAgentOrchestrator.answer_question against a local stub LLM.
+
+Reports LLM calls per turn and p50/p95 turn latency for each kind of chat turn,
+for answer_question and for the streaming stream_answer (time to first token).
+No API key or network access is needed. Run from the backend directory:
+
+    python -m benchmarks.bench_chat_pipeline --turns 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from app.agents import FlightLogAgentOrchestrator
+
+class StubResponse:
+    def __init__(self, content: str):
+        self.content = content
+
+class StubLLM:
+    """Fake chat model with a fixed latency that answers every prompt shape the pipeline sends."""
+    def __init__(self, latency: float = 0.2, jitter: float = 0.05, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.rng = random.Random(seed)
+
+    def _reply(self, prompt: str) -> str:
+        routes = ["embedding", "tool:retrieve_snippets", "tool:detect_anomalies"]
+        route = routes[self.rng.randrange(len(routes))]
+        if '"route"' in prompt:
+            route = "answer" if route == "embedding" else route
+            return json.dumps({"route": route, "answer": "The maximum altitude was 63 m."})
+        return "The maximum altitude was 63 m, reached about two minutes into the flight."
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        return StubResponse(self._reply(str(prompt)))
+
+    async def astream(self, prompt, **kwargs):
+        # First token after a quarter of the latency, the rest spread over the remainder
+        self.calls += 1
+        tokens = (self._reply(str(prompt)) + " " + "and more detail " * 20).split(" ")
+        await asyncio.sleep(self.latency * 0.25)
+        for token in tokens:
+            await asyncio.sleep(self.latency * 0.75 / len(tokens))
+            yield StubResponse(token + " ")
+
+def build_orchestrator(llm: StubLLM, tool_latency: float) -> FlightLogAgentOrchestrator:
+    orchestrator = FlightLogAgentOrchestrator(api_key="stub")
+    orchestrator.llm = llm
+
+    def retrieve_snippets(fileKey, question, k=3, phase=None):
+        time.sleep(tool_latency)
+        return [{"timestamp": 608582, "msg_type": "GLOBAL_POSITION_INT", "text": "GPS position: lat=-353629904, lon=1491649392, alt=63350"}]
+
+    def detect_anomalies(fileKey, phase=None):
+        time.sleep(tool_latency)
+        return [{"timestamp": 1533737188.4, "type": "altitude_jump", "description": "Altitude changed faster than 30 m/s"}]
+
+    orchestrator.retrieve_snippets = retrieve_snippets
+    orchestrator.detect_anomalies = detect_anomalies
+    return orchestrator
+
+TURNS = {
+    # Keyword guess (router off): the LLM routes, only the guessed tool is prefetched
+    "flight_log": {"message": "What was the maximum altitude?", "fileKey": "bench",
+                   "route": {"route": "retrieval", "confidence": 0.0, "similarity": None, "confident": False, "source": "keywords"}},
+    # Routed by app.router with enough confidence to skip the LLM routing
+    "flight_log_routed": {"message": "What was the maximum altitude?", "fileKey": "bench",
+                          "route": {"route": "retrieval", "confidence": 0.2, "similarity": 0.7, "confident": True, "source": "embedding"}},
+    "embedding_snippet": {"message": "What was the maximum altitude?", "fileKey": "bench",
+                          "embedding_snippet": "[GLOBAL_POSITION_INT at 608582] GPS position: lat=-353629904, lon=1491649392, alt=63350"},
+    "general_chat": {"message": "What does a VTOL transition involve?", "fileKey": None},
+}
+
+async def run(turns: int, latency: float, tool_latency: float) -> dict:
+    results = {}
+    for name, kwargs in TURNS.items():
+        llm = StubLLM(latency=latency)
+        orchestrator = build_orchestrator(llm, tool_latency)
+        durations = []
+        for _ in range(turns):
+            start = time.perf_counter()
+            await orchestrator.answer_question(chatHistory=[], **kwargs)
+            durations.append(time.perf_counter() - start)
+        results[name] = {
+            "turns": turns,
+            "llm_calls_per_turn": llm.calls / turns,
+            "p50_ms": float(np.percentile(durations, 50) * 1000),
+            "p95_ms": float(np.percentile(durations, 95) * 1000),
+        }
+    for name, kwargs in TURNS.items():
+        llm = StubLLM(latency=latency)
+        orchestrator = build_orchestrator(llm, tool_latency)
+        first_token, durations = [], []
+        for _ in range(turns):
+            start = time.perf_counter()
+            seen_token = False
+            async for event in orchestrator.stream_answer(chatHistory=[], **kwargs):
+                if event["type"] == "token" and not seen_token:
+                    first_token.append(time.perf_counter() - start)
+                    seen_token = True
+            durations.append(time.perf_counter() - start)
+        results[f"{name}_stream"] = {
+            "turns": turns,
+            "llm_calls_per_turn": llm.calls / turns,
+            "p50_ms": float(np.percentile(durations, 50) * 1000),
+            "p95_ms": float(np.percentile(durations, 95) * 1000),
+            "first_token_p50_ms": float(np.percentile(first_token, 50) * 1000),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency per call (s)")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Simulated tool latency (s)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.turns, args.latency, args.tool_latency))
+    for name, r in results.items():
+        line = f"{name:25s} calls/turn={r['llm_calls_per_turn']:.2f} p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms"
+        if "first_token_p50_ms" in r:
+            line += f" first_token_p50={r['first_token_p50_ms']:.0f}ms"
+        print(line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
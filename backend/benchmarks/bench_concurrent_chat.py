@@ -0,0 +1,96 @@
+"""Load test concurrent chat turns with blocking work inline vs in the executor pools.
+
+Each simulated turn does what /api/chat does for a flight log question: an
+embedding lookup (blocking encode + faiss search) and then
+FlightLogAgentOrchestrator.answer_question with blocking tools and a stub LLM.
+"inline" runs the blocking calls on the event loop, as the handlers used to;
+"pooled" routes them through app.executors. A heartbeat task measures event
+loop lag, i.e. how long a /ws progress message would be delayed. Run from the
+backend directory:
+
+    python -m benchmarks.bench_concurrent_chat --clients 1 4 16 32
+"""
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from app.executors import run_blocking, executor_metrics, shutdown_executors
+from benchmarks.bench_chat_pipeline import StubLLM, build_orchestrator
+
+async def _heartbeat(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+def _inline(orchestrator):
+    async def aretrieve_snippets(fileKey, question, k=3, phase=None):
+        return orchestrator.retrieve_snippets(fileKey, question, k, phase)
+
+    async def adetect_anomalies(fileKey, phase=None):
+        return orchestrator.detect_anomalies(fileKey, phase)
+
+    orchestrator.aretrieve_snippets = aretrieve_snippets
+    orchestrator.adetect_anomalies = adetect_anomalies
+
+async def run_level(mode: str, clients: int, turns: int, latency: float, blocking: float) -> dict:
+    orchestrator = build_orchestrator(StubLLM(latency=latency), blocking)
+    if mode == "inline":
+        _inline(orchestrator)
+
+    def embedding_lookup(question):
+        time.sleep(blocking)
+        return None, 0.0
+
+    async def turn():
+        started = time.perf_counter()
+        if mode == "inline":
+            embedding_lookup("What was the maximum altitude?")
+        else:
+            await run_blocking("model", embedding_lookup, "What was the maximum altitude?")
+        await orchestrator.answer_question("What was the maximum altitude?", "bench", [])
+        return time.perf_counter() - started
+
+    async def client():
+        return [await turn() for _ in range(turns)]
+
+    lags, stop = [], asyncio.Event()
+    beat = asyncio.ensure_future(_heartbeat(lags, stop))
+    durations = [d for per_client in await asyncio.gather(*[client() for _ in range(clients)]) for d in per_client]
+    stop.set()
+    await beat
+    return {
+        "clients": clients,
+        "p50_ms": float(np.percentile(durations, 50) * 1000),
+        "p95_ms": float(np.percentile(durations, 95) * 1000),
+        "loop_lag_max_ms": float(max(lags) * 1000) if lags else 0.0,
+    }
+
+async def run(levels, turns: int, latency: float, blocking: float) -> dict:
+    results = {}
+    for mode in ("inline", "pooled"):
+        results[mode] = [await run_level(mode, c, turns, latency, blocking) for c in levels]
+    results["executors"] = executor_metrics()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--turns", type=int, default=5, help="Turns per client")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency per call (s)")
+    parser.add_argument("--blocking", type=float, default=0.05, help="Duration of each blocking call (s)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.clients, args.turns, args.latency, args.blocking))
+    shutdown_executors()
+    for mode in ("inline", "pooled"):
+        for r in results[mode]:
+            print(f"{mode:7s} clients={r['clients']:3d} p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms loop_lag_max={r['loop_lag_max_ms']:.0f}ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Decode throughput of MAVLinkParser with and without the fast path.
+
+Parses the log (src/assets/vtol.tlog, or a synthetic copy scaled with
+--scale, see benchmarks.synth_tlog) with fast_path=False (pymavlink
+recv_match, to_dict and the generic timestamp lookup) and fast_path=True
+(TlogDecoder, per-type extractors and columns filled while decoding), keeps
+the best of --repeat runs and prints messages/sec with the per-stage
+parse_timings. The reference run also reports the time columns.message_columns
+needs afterwards, which the fast path no longer spends. Run from the backend
+directory:
+
+    python -m benchmarks.bench_parser --scale 10 --repeat 3
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from app.columns import message_columns
+from app.mavlink_parser import MAVLinkParser
+from benchmarks.synth_tlog import synthetic_tlog
+
+def bench(path: Path, fast_path: bool, repeat: int) -> dict:
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parsed = MAVLinkParser(path, fast_path=fast_path).parse()
+        seconds = time.perf_counter() - started
+        if best is None or seconds < best:
+            best, result = seconds, parsed
+    messages = result["metadata"]["message_count"]
+    report = {"s": best, "messages": messages, "messages_per_s": messages / best,
+              "timings": result["metadata"]["parse_timings"]}
+    if not fast_path:
+        started = time.perf_counter()
+        for msg_type in result["messages"]:
+            message_columns(result, msg_type)
+        report["message_columns_s"] = time.perf_counter() - started
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Copies of the sample flight")
+    parser.add_argument("--path", type=Path, help="Benchmark this log instead of the sample")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant; the best is kept")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    # Corrupt-message warnings would dominate the timing on damaged logs
+    logging.getLogger("app.mavlink_parser").setLevel(logging.ERROR)
+
+    path = args.path or synthetic_tlog(args.scale)
+    results = {"file": str(path), "file_mb": path.stat().st_size / 1e6}
+    for name, fast_path in (("reference", False), ("fast_path", True)):
+        r = results[name] = bench(path, fast_path, args.repeat)
+        stages = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in r["timings"].items())
+        print(f"{name:10s} {r['s']:.2f}s {r['messages_per_s']:9.0f} msg/s  {stages}")
+    results["speedup"] = results["reference"]["s"] / results["fast_path"]["s"]
+    print(f"speedup {results['speedup']:.1f}x (plus {results['reference']['message_columns_s']:.2f}s of "
+          f"message_columns conversion saved)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark query routing accuracy and latency on a labelled question set.
+
+Routes every question of benchmarks/router_eval.json with app.router.QueryRouter
+(sentence embeddings against example questions) and, as baselines, with the
+keyword classifier app.embeddings.classify_query_type and the substring
+classifier it replaced. Reports accuracy, accuracy and coverage of the
+confident decisions (the ones that skip LLM routing) per confidence margin,
+per-route recall and routing latency.
+
+Calibrates ROUTER_MIN_SIMILARITY and ROUTER_MIN_MARGIN: picks the thresholds
+with the most confident decisions whose accuracy reaches --target-accuracy on
+half of the questions and reports how they do on the other half. Run from the
+backend directory before setting ROUTER_ENABLED=1:
+
+    python -m benchmarks.bench_router --margins 0 0.02 0.05 0.1 --target-accuracy 0.95
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from app.embeddings import model, classify_query_type
+from app.router import QueryRouter, ROUTES
+
+EVAL_SET = Path(__file__).resolve().parent / "router_eval.json"
+
+# The keyword classifiers only tell log lookups, anomaly checks and chat apart
+COARSE = {"facts": "retrieval", "retrieval": "retrieval", "region": "retrieval", "anomaly": "anomaly_tool", "chat": "unknown"}
+
+def _substring_classify(question: str) -> str:
+    """classify_query_type before whole-word matching ("error" in both lists, "min" in "minute")."""
+    q = question.lower()
+    retrieval = ["highest", "altitude", "duration", "when did", "maximum", "min", "max", "how long", "flight time",
+                 "temperature", "list all", "first instance", "rc signal", "gps", "error", "critical", "mid-flight",
+                 "battery", "speed", "distance", "takeoff", "land", "mode", "arm", "disarm"]
+    anomaly = ["anomaly", "anomalies", "error", "warning", "problem", "issue", "fail", "failsafe", "inconsistent",
+               "lost", "spike", "jump"]
+    if any(word in q for word in retrieval):
+        return "retrieval"
+    if any(word in q for word in anomaly):
+        return "anomaly_tool"
+    return "unknown"
+
+def calibrate(similarity: np.ndarray, margin: np.ndarray, correct: np.ndarray, target: float) -> dict:
+    """Thresholds with the highest coverage whose confident decisions reach the target accuracy."""
+    best = None
+    for min_similarity in np.arange(0.2, 0.81, 0.05):
+        for min_margin in np.arange(0.0, 0.201, 0.01):
+            confident = (similarity >= min_similarity) & (margin >= min_margin)
+            if not confident.any() or correct[confident].mean() < target:
+                continue
+            if best is None or confident.mean() > best["coverage"]:
+                best = {"min_similarity": round(float(min_similarity), 2), "min_margin": round(float(min_margin), 2),
+                        "coverage": float(confident.mean()), "confident_accuracy": float(correct[confident].mean())}
+    return best
+
+def run(margins: list, min_similarity: float, target_accuracy: float) -> dict:
+    cases = json.loads(EVAL_SET.read_text())
+    router = QueryRouter(encode=lambda texts: model.encode(texts), min_similarity=min_similarity)
+    started = time.perf_counter()
+    router.warm()
+    results = {"questions": len(cases), "prototype_embedding_ms": (time.perf_counter() - started) * 1000}
+
+    decisions, latencies = [], []
+    for case in cases:
+        started = time.perf_counter()
+        decisions.append(router.route(case["question"]))
+        latencies.append(time.perf_counter() - started)
+    labels = [case["route"] for case in cases]
+    correct = np.array([d["route"] == label for d, label in zip(decisions, labels)])
+    results["accuracy"] = float(correct.mean())
+    results["coarse_accuracy"] = float(np.mean([COARSE[d["route"]] == COARSE[label] for d, label in zip(decisions, labels)]))
+    results["latency_p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+    results["latency_p99_ms"] = float(np.percentile(latencies, 99) * 1000)
+    cached = []
+    for case in cases:
+        started = time.perf_counter()
+        router.route(case["question"])
+        cached.append(time.perf_counter() - started)
+    results["cached_latency_p50_ms"] = float(np.percentile(cached, 50) * 1000)
+
+    totals = Counter(labels)
+    hits = Counter(label for label, ok in zip(labels, correct) if ok)
+    results["recall"] = {route: hits[route] / totals[route] for route in ROUTES if totals[route]}
+    results["confusions"] = Counter(f"{label}->{d['route']}" for d, label in zip(decisions, labels) if d["route"] != label).most_common(10)
+
+    similarity = np.array([d["similarity"] for d in decisions])
+    margin = np.array([d["confidence"] for d in decisions])
+    results["margins"] = []
+    for threshold in margins:
+        confident = (similarity >= min_similarity) & (margin >= threshold)
+        results["margins"].append({
+            "min_margin": threshold,
+            "coverage": float(confident.mean()),
+            "confident_accuracy": float(correct[confident].mean()) if confident.any() else None,
+        })
+
+    # Calibrate on every other question, check on the rest
+    fit, held_out = slice(0, None, 2), slice(1, None, 2)
+    thresholds = calibrate(similarity[fit], margin[fit], correct[fit], target_accuracy)
+    if thresholds:
+        confident = (similarity[held_out] >= thresholds["min_similarity"]) & (margin[held_out] >= thresholds["min_margin"])
+        thresholds["held_out_coverage"] = float(confident.mean())
+        thresholds["held_out_accuracy"] = float(correct[held_out][confident].mean()) if confident.any() else None
+    results["calibration"] = thresholds
+
+    for name, classify in (("keywords", classify_query_type), ("substring_keywords", _substring_classify)):
+        results[f"{name}_coarse_accuracy"] = float(np.mean([classify(case["question"]) == COARSE[case["route"]] for case in cases]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.02, 0.05, 0.1],
+                        help="Confidence margins to report coverage and accuracy for")
+    parser.add_argument("--min-similarity", type=float, default=0.35)
+    parser.add_argument("--target-accuracy", type=float, default=0.95,
+                        help="Accuracy the confident decisions need when calibrating the thresholds")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    r = run(args.margins, args.min_similarity, args.target_accuracy)
+    print(f"questions={r['questions']} accuracy={r['accuracy']:.3f} coarse={r['coarse_accuracy']:.3f} "
+          f"keywords_coarse={r['keywords_coarse_accuracy']:.3f} substring_coarse={r['substring_keywords_coarse_accuracy']:.3f}")
+    print(f"latency p50={r['latency_p50_ms']:.1f}ms p99={r['latency_p99_ms']:.1f}ms cached_p50={r['cached_latency_p50_ms']:.2f}ms "
+          f"prototypes={r['prototype_embedding_ms']:.0f}ms")
+    print("recall: " + " ".join(f"{route}={value:.2f}" for route, value in r["recall"].items()))
+    for m in r["margins"]:
+        accuracy = "n/a" if m["confident_accuracy"] is None else f"{m['confident_accuracy']:.3f}"
+        print(f"min_margin={m['min_margin']:.2f} coverage={m['coverage']:.2f} confident_accuracy={accuracy}")
+    c = r["calibration"]
+    if c is None:
+        print(f"calibration: no thresholds reach accuracy {args.target_accuracy:.2f}; keep ROUTER_ENABLED=0")
+    else:
+        accuracy = "n/a" if c["held_out_accuracy"] is None else f"{c['held_out_accuracy']:.3f}"
+        print(f"calibration: ROUTER_MIN_SIMILARITY={c['min_similarity']:.2f} ROUTER_MIN_MARGIN={c['min_margin']:.2f} "
+              f"coverage={c['coverage']:.2f} held_out_coverage={c['held_out_coverage']:.2f} held_out_accuracy={accuracy}")
+    if r["confusions"]:
+        print("confusions: " + ", ".join(f"{pair} x{count}" for pair, count in r["confusions"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(r, f, indent=2)
+
+if __name__ == "__main__":
+    main()
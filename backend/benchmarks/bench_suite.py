@@ -0,0 +1,144 @@
+"""End-to-end benchmark suite over synthetic logs of increasing size.
+
+For each scale (copies of src/assets/vtol.tlog, see benchmarks.synth_tlog) it
+times MAVLinkParser.parse and quick_scan, build_snippets, create_embeddings (on a sample of
+the snippets, reported as a rate), save_faiss_index, retrieval, the anomaly
+rules and tools.detect_anomalies, then the chat pipeline against the stub
+LLM. Results are written as JSON and checked against regression thresholds
+(benchmarks/thresholds.json); --check exits non-zero on a regression. Run
+from the backend directory:
+
+    python -m benchmarks.bench_suite --scales 1 10 100 --output bench_results.json --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from app.mavlink_parser import parse_log, quick_scan_log
+from app.embeddings import build_snippets, create_embeddings, save_faiss_index, retrieve_relevant_snippets
+from app.anomalies import collect_anomalies, save_anomaly_report
+from app.tools import detect_anomalies
+from benchmarks import bench_chat_pipeline
+from benchmarks.synth_tlog import synthetic_tlog
+
+THRESHOLDS_PATH = Path(__file__).with_name("thresholds.json")
+FAISS_DIR = Path("uploads/faiss_indexes")
+QUESTIONS = ["What was the maximum altitude?", "When was the GPS signal lost?", "What was the battery voltage?"]
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+def bench_scale(scale: int, embed_sample: int) -> dict:
+    path = synthetic_tlog(scale)
+    size_mb = path.stat().st_size / 1e6
+    file_key = f"bench_x{scale}"
+    result = {"scale": scale, "file_mb": size_mb}
+
+    seconds, parsed_data = _timed(parse_log, path)
+    messages = parsed_data["metadata"]["message_count"]
+    result["parse"] = {"s": seconds, "messages": messages, "messages_per_s": messages / seconds, "mb_per_s": size_mb / seconds}
+
+    scan_s, _ = _timed(quick_scan_log, path)
+    result["quick_scan"] = {"s": scan_s, "mb_per_s": size_mb / scan_s, "speedup": seconds / scan_s}
+
+    seconds, snippets = _timed(build_snippets, parsed_data)
+    result["snippets"] = {"s": seconds, "snippets": len(snippets), "snippets_per_s": len(snippets) / seconds}
+
+    # Embedding every snippet of a large log takes hours on a CPU; time a sample and report the rate
+    sample = snippets[:: max(1, len(snippets) // embed_sample)][:embed_sample]
+    seconds, embeddings = _timed(create_embeddings, sample)
+    rate = len(sample) / seconds
+    result["embeddings"] = {"s": seconds, "sample": len(sample), "snippets_per_s": rate, "projected_s": len(snippets) / rate}
+
+    # Index as many vectors as the log has snippets (the sample repeated)
+    vectors = np.resize(embeddings, (len(snippets), embeddings.shape[1]))
+    seconds, _ = _timed(save_faiss_index, file_key, vectors, snippets)
+    result["faiss"] = {"s": seconds, "vectors": len(snippets)}
+
+    latencies = [_timed(retrieve_relevant_snippets, file_key, q)[0] for q in QUESTIONS * 3]
+    result["retrieval"] = {"p50_ms": float(np.percentile(latencies, 50) * 1000), "max_ms": float(max(latencies) * 1000)}
+
+    seconds, anomalies = _timed(collect_anomalies, parsed_data)
+    save_anomaly_report(file_key, anomalies)
+    tool_s, _ = _timed(detect_anomalies, file_key)
+    result["anomalies"] = {"s": seconds, "events": len(anomalies), "messages_per_s": messages / seconds,
+                           "tool_ms": tool_s * 1000}
+
+    for suffix in (".index", "_snippets.json", "_anomalies.json"):
+        (FAISS_DIR / f"{file_key}{suffix}").unlink(missing_ok=True)
+    return result
+
+def _lookup(value, keys: list, prefix: str) -> list:
+    if not keys:
+        return [(prefix, value)]
+    key, rest = keys[0], keys[1:]
+    if not isinstance(value, dict):
+        return []
+    matches = value.keys() if key == "*" else [key] if key in value else []
+    return [m for k in matches for m in _lookup(value[k], rest, f"{prefix}.{k}" if prefix else str(k))]
+
+def check_thresholds(results: dict, thresholds: dict) -> list:
+    """Metrics outside their {"min": ..., "max": ...} bounds.
+
+    Threshold keys are dotted paths into the results, with scales keyed by
+    scale ("scales.10.retrieval.p50_ms"); "*" matches every key at its level.
+    """
+    view = {**results, "scales": {str(r["scale"]): r for r in results["scales"]}}
+    regressions = []
+    for path, bound in thresholds.items():
+        for name, value in _lookup(view, path.split("."), ""):
+            if not isinstance(value, (int, float)):
+                continue
+            if "min" in bound and value < bound["min"] or "max" in bound and value > bound["max"]:
+                regressions.append({"metric": name, "value": value, **bound})
+    return regressions
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": sys.version.split()[0], "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "commit": commit}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="Copies of the sample flight (e.g. 1 10 100 1000)")
+    parser.add_argument("--embed-sample", type=int, default=2000, help="Snippets embedded per scale")
+    parser.add_argument("--chat-turns", type=int, default=10)
+    parser.add_argument("--thresholds", type=Path, default=THRESHOLDS_PATH)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a threshold is exceeded")
+    args = parser.parse_args()
+
+    results = {"environment": _environment(), "scales": []}
+    for scale in args.scales:
+        r = bench_scale(scale, args.embed_sample)
+        results["scales"].append(r)
+        print(f"x{scale:<5d} {r['file_mb']:7.1f}MB parse={r['parse']['s']:.1f}s ({r['parse']['messages_per_s']:.0f} msg/s) "
+              f"quick_scan={r['quick_scan']['s']:.2f}s snippets={r['snippets']['s']:.1f}s embed={r['embeddings']['snippets_per_s']:.0f}/s "
+              f"faiss={r['faiss']['s']:.2f}s retrieval_p50={r['retrieval']['p50_ms']:.0f}ms "
+              f"anomalies={r['anomalies']['s']:.2f}s")
+    results["chat"] = asyncio.run(bench_chat_pipeline.run(args.chat_turns, latency=0.05, tool_latency=0.01))
+    print("chat: " + " ".join(f"{name}={r['p50_ms']:.0f}ms" for name, r in results["chat"].items()))
+
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds.exists() else {}
+    results["regressions"] = check_thresholds(results, thresholds)
+    for r in results["regressions"]:
+        print(f"REGRESSION {r['metric']} = {r['value']:.4g} (bounds: {', '.join(f'{k} {v}' for k, v in r.items() if k in ('min', 'max'))})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.check and results["regressions"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
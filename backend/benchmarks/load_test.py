@@ -0,0 +1,255 @@
+"""HTTP load test of the FastAPI backend against the local stub LLM.
+
+Starts benchmarks.stub_llm_server and the app (uvicorn, with LLM_BASE_URL
+pointing at the stub) unless --url targets a running backend. It then opens
+websocket subscribers on /ws (each with its own session, all viewing the first
+uploaded log) and sends a mixed workload of uploads, chats,
+streamed chats and graph/column reads as an open-loop Poisson arrival process
+at --rps. The report gives throughput and p50/p95/p99 latency per endpoint,
+websocket deliveries, and the server's event loop lag (/api/executor-stats).
+Run from the backend directory:
+
+    python -m benchmarks.load_test --rps 20 --duration 60 --llm-latency 0.5 --llm-error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+import aiohttp
+import numpy as np
+
+SAMPLE_TLOG = Path(__file__).resolve().parents[2] / "src" / "assets" / "vtol.tlog"
+# Endpoint -> share of requests
+DEFAULT_MIX = {"chat": 0.45, "chat_stream": 0.25, "graph": 0.15, "columns": 0.1, "upload": 0.05}
+QUESTIONS = [
+    "What was the maximum altitude?",
+    "How long was the flight?",
+    "Were there any anomalies in this flight?",
+    "When was the GPS signal lost?",
+    "Summarize how the flight went.",
+    "Was the battery voltage stable?",
+    "How did the vehicle transition between flight modes?",
+    "What could explain the altitude changes during the mission?",
+]
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, timeout: float = 180.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as resp:
+                if resp.status < 500:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def _start_servers(args) -> list:
+    env = {**os.environ, "LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}"}
+    if args.no_response_cache:
+        env["RESPONSE_CACHE_ENTRIES"] = "0"
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_llm_server", "--port", str(args.llm_port),
+                             "--latency", str(args.llm_latency), "--error-rate", str(args.llm_error_rate)])
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+                            "--log-level", "warning"], env=env)
+    return [stub, app]
+
+class LoadTest:
+    def __init__(self, base_url: str, session: aiohttp.ClientSession, mix: dict, seed: int = 0):
+        self.base_url = base_url.rstrip("/")
+        self.session = session
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.file_keys: list = []
+        self.graphs: list = []
+        self.latencies = defaultdict(list)
+        self.first_byte = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sent = 0
+        self.ws = {"connected": 0, "failed": 0, "messages": 0, "disconnects": 0}
+        self.sessions: list = []
+
+    async def upload(self) -> str:
+        form = aiohttp.FormData()
+        form.add_field("file", SAMPLE_TLOG.read_bytes(), filename="vtol.tlog", content_type="application/octet-stream")
+        # Progress events go to the uploading session (a random subscriber) and the log's viewers
+        headers = {"X-Session-Id": self.rng.choice(self.sessions)} if self.sessions else {}
+        async with self.session.post(f"{self.base_url}/api/upload", data=form, headers=headers) as resp:
+            resp.raise_for_status()
+            file_key = (await resp.json())["fileKey"]
+        self.file_keys.append(file_key)
+        return file_key
+
+    def _chat_body(self) -> dict:
+        return {"message": self.rng.choice(QUESTIONS), "fileKey": self.rng.choice(self.file_keys), "chatHistory": []}
+
+    async def _request(self, kind: str) -> None:
+        started = time.perf_counter()
+        try:
+            if kind == "upload":
+                await self.upload()
+            elif kind == "chat":
+                async with self.session.post(f"{self.base_url}/api/chat", json=self._chat_body()) as resp:
+                    resp.raise_for_status()
+                    await resp.read()
+            elif kind == "chat_stream":
+                async with self.session.post(f"{self.base_url}/api/chat/stream", json=self._chat_body()) as resp:
+                    resp.raise_for_status()
+                    first = True
+                    async for _ in resp.content.iter_any():
+                        if first:
+                            self.first_byte[kind].append(time.perf_counter() - started)
+                            first = False
+            elif kind == "graph":
+                params = {"name": self.rng.choice(self.graphs), "max_points": 2000}
+                async with self.session.get(f"{self.base_url}/api/graphs/{self.rng.choice(self.file_keys)}", params=params) as resp:
+                    resp.raise_for_status()
+                    await resp.read()
+            elif kind == "columns":
+                url = f"{self.base_url}/api/columns/{self.rng.choice(self.file_keys)}/ATTITUDE"
+                async with self.session.get(url, headers={"Accept-Encoding": "gzip"}) as resp:
+                    resp.raise_for_status()
+                    await resp.read()
+        except Exception as e:
+            self.errors[kind] += 1
+            if self.errors[kind] <= 3:
+                print(f"{kind} failed: {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        self.latencies[kind].append(time.perf_counter() - started)
+
+    async def subscriber(self, stop: asyncio.Event, index: int) -> None:
+        session_id = f"load-{index}"
+        self.sessions.append(session_id)
+        params = {"session": session_id, **({"fileKey": self.file_keys[0]} if self.file_keys else {})}
+        try:
+            async with self.session.ws_connect(f"{self.base_url.replace('http', 'ws', 1)}/ws", params=params,
+                                               heartbeat=30) as ws:
+                self.ws["connected"] += 1
+                while not stop.is_set():
+                    try:
+                        msg = await asyncio.wait_for(ws.receive(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    if msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        self.ws["disconnects"] += 1
+                        return
+                    self.ws["messages"] += 1
+        except aiohttp.ClientError as e:
+            # e.g. a plain uvicorn install without a websocket library rejects the upgrade
+            self.ws["failed"] += 1
+            if self.ws["failed"] == 1:
+                print(f"websocket connect failed: {e}", file=sys.stderr)
+
+    async def run(self, rps: float, duration: float, max_inflight: int = 1000) -> float:
+        """Send requests as a Poisson process at rps for duration seconds; returns the elapsed time."""
+        kinds, weights = zip(*self.mix.items())
+        inflight = set()
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < duration:
+            next_at += self.rng.expovariate(rps)
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if len(inflight) >= max_inflight:
+                self.errors["client_overload"] += 1
+                continue
+            task = asyncio.ensure_future(self._request(self.rng.choices(kinds, weights)[0]))
+            self.sent += 1
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        if inflight:
+            await asyncio.wait(inflight)
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for kind in sorted(set(self.latencies) | set(self.errors)):
+            values = np.array(self.latencies.get(kind, [])) * 1000
+            endpoints[kind] = {
+                "ok": int(values.size),
+                "errors": self.errors.get(kind, 0),
+                "throughput_rps": values.size / elapsed,
+                **({f"p{q}_ms": float(np.percentile(values, q)) for q in (50, 95, 99)} if values.size else {}),
+            }
+            if self.first_byte.get(kind):
+                endpoints[kind]["first_byte_p50_ms"] = float(np.percentile(self.first_byte[kind], 50) * 1000)
+        total = sum(e["ok"] for e in endpoints.values())
+        return {"elapsed_s": elapsed, "throughput_rps": total / elapsed, "endpoints": endpoints, "websocket": dict(self.ws)}
+
+async def run(args) -> dict:
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=0)) as session:
+        await _wait_ready(session, f"{base_url}/api/cache-stats")
+        test = LoadTest(base_url, session, mix, args.seed)
+        for _ in range(max(1, args.setup_uploads)):
+            await test.upload()
+        async with session.get(f"{base_url}/api/graphs") as resp:
+            test.graphs = [g["name"] for g in await resp.json()]
+
+        stop = asyncio.Event()
+        subscribers = [asyncio.ensure_future(test.subscriber(stop, i)) for i in range(args.subscribers)]
+        elapsed = await test.run(args.rps, args.duration)
+        stop.set()
+        await asyncio.gather(*subscribers)
+
+        report = test.report(elapsed)
+        report["target_rps"] = args.rps
+        report["offered_rps"] = test.sent / args.duration
+        async with session.get(f"{base_url}/api/executor-stats") as resp:
+            report["server"] = await resp.json()
+        async with session.get(f"{base_url}/api/cache-stats") as resp:
+            report["response_cache"] = await resp.json()
+        if not args.url:
+            async with session.get(f"http://127.0.0.1:{args.llm_port}/stats") as resp:
+                report["stub_llm"] = await resp.json()
+            # Only clean up a server this harness started
+            await session.post(f"{base_url}/api/clear-history")
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Target a running backend instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the backend this harness starts")
+    parser.add_argument("--llm-port", type=int, default=8790)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Stub LLM seconds per completion")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of stub LLM calls failing with 429")
+    parser.add_argument("--no-response-cache", action="store_true", help="Start the backend with the response cache disabled")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--subscribers", type=int, default=20, help="Websocket /ws subscribers")
+    parser.add_argument("--setup-uploads", type=int, default=1, help="Logs uploaded before the load starts")
+    parser.add_argument("--mix", help=f"JSON endpoint weights (default: {json.dumps(DEFAULT_MIX)})")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    servers = [] if args.url else _start_servers(args)
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        for process in servers:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"target={args.rps} rps offered={report['offered_rps']:.1f} rps completed={report['throughput_rps']:.1f} rps "
+          f"over {report['elapsed_s']:.0f}s")
+    for kind, r in report["endpoints"].items():
+        latency = " ".join(f"{q}={r[f'{q}_ms']:.0f}ms" for q in ("p50", "p95", "p99") if f"{q}_ms" in r)
+        print(f"  {kind:12s} ok={r['ok']:5d} errors={r['errors']:4d} {r['throughput_rps']:.1f} rps {latency}")
+    lag = report["server"].get("event_loop", {})
+    print(f"  event loop lag p50={lag.get('p50_ms', 0):.1f}ms p99={lag.get('p99_ms', 0):.1f}ms max={lag.get('max_ms', 0):.0f}ms")
+    print(f"  websocket {report['websocket']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
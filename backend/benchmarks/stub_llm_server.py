@@ -0,0 +1,78 @@
+"""Local stand-in for the LLM provider, with configurable latency and failure rate.
+
+Speaks the protocol of app.llm_client.HTTPChatModel:
+    POST /v1/chat         {"prompt": ...} -> {"content": ...}
+    POST /v1/chat/stream  {"prompt": ...} -> JSON lines of {"content": ...}
+A fraction of requests (--error-rate) fail with 429 like a provider rate limit.
+Run from the backend directory:
+
+    python -m benchmarks.stub_llm_server --port 8090 --latency 0.3 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+from aiohttp import web
+
+def _reply(prompt: str) -> str:
+    if '"route"' in prompt:
+        route = random.choice(["answer", "tool:retrieve_snippets", "tool:detect_anomalies"])
+        return json.dumps({"route": route, "answer": "The maximum altitude was 63 m."})
+    if "Primary LLM response" in prompt:
+        return "route: embedding\nreason: stub decision"
+    return "The maximum altitude was 63 m, reached about two minutes into the flight."
+
+def create_app(latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0) -> web.Application:
+    stats = {"requests": 0, "rate_limited": 0}
+
+    async def _delay_or_fail():
+        stats["requests"] += 1
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+        if random.random() < error_rate:
+            stats["rate_limited"] += 1
+            raise web.HTTPTooManyRequests(text="Resource exhausted: rate limit (stub)")
+
+    async def chat(request: web.Request) -> web.Response:
+        body = await request.json()
+        await _delay_or_fail()
+        return web.json_response({"content": _reply(body.get("prompt", ""))})
+
+    async def chat_stream(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        # Time to first token is a fraction of the full latency
+        await asyncio.sleep(latency * 0.25)
+        if random.random() < error_rate:
+            stats["requests"] += 1
+            stats["rate_limited"] += 1
+            raise web.HTTPTooManyRequests(text="Resource exhausted: rate limit (stub)")
+        stats["requests"] += 1
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        tokens = _reply(body.get("prompt", "")).split(" ")
+        for token in tokens:
+            await asyncio.sleep(latency * 0.75 / len(tokens))
+            await resp.write((json.dumps({"content": token + " "}) + "\n").encode())
+        await resp.write_eof()
+        return resp
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat", chat)
+    app.router.add_post("/v1/chat/stream", chat_stream)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.jitter, args.error_rate), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
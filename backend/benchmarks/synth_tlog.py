@@ -0,0 +1,105 @@
+"""Generate large synthetic .tlog files by repeating a real flight.
+
+The source log is repeated back to back; every copy has its tlog record
+timestamps and its time_boot_ms/time_usec/time_unix_usec fields shifted past
+the end of the previous copy, so the result looks like one long, continuous
+flight to the parser and to rate-based checks. Run from the backend directory:
+
+    python -m benchmarks.synth_tlog --scale 100 --output /tmp/vtol_x100.tlog
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+os.environ.setdefault("MAVLINK20", "1")
+from pymavlink.dialects.v20 import ardupilotmega as mavlink
+
+SOURCE_TLOG = Path(__file__).resolve().parents[2] / "src" / "assets" / "vtol.tlog"
+DATA_DIR = Path(tempfile.gettempdir()) / "uavlogviewer_bench"
+# Fields shifted per copy, in their units per second
+TIME_FIELDS = {"time_boot_ms": 1e3, "time_usec": 1e6, "time_unix_usec": 1e6}
+
+def read_tlog(path: Path) -> List[Tuple[int, bytes]]:
+    """(timestamp in microseconds, raw MAVLink packet) records of a tlog."""
+    data = path.read_bytes()
+    records, i = [], 0
+    while i + 10 <= len(data):
+        timestamp = struct.unpack_from(">Q", data, i)[0]
+        magic, length = data[i + 8], data[i + 9]
+        if magic == 0xFE:
+            size = length + 8
+        elif magic == 0xFD:
+            size = length + 12 + (13 if data[i + 10] & 0x01 else 0)
+        else:
+            raise ValueError(f"Unexpected byte 0x{magic:02x} at offset {i + 8}")
+        records.append((timestamp, data[i + 8:i + 8 + size]))
+        i += 8 + size
+    return records
+
+def _shiftable(records: List[Tuple[int, bytes]]):
+    """Decoded messages that carry a time field, by record index."""
+    decoder = mavlink.MAVLink(None)
+    decoder.robust_parsing = True
+    shiftable = {}
+    for index, (_, packet) in enumerate(records):
+        try:
+            msg = decoder.decode(bytearray(packet))
+        except mavlink.MAVError:
+            continue
+        fields = [f for f in TIME_FIELDS if f in msg.get_fieldnames()]
+        if fields:
+            shiftable[index] = (msg, fields, {f: getattr(msg, f) for f in fields})
+    return shiftable
+
+def generate(source: Path, dest: Path, scale: int, gap_s: float = 1.0) -> Path:
+    """Write source repeated scale times to dest, each copy shifted in time."""
+    records = read_tlog(source)
+    shiftable = _shiftable(records)
+    span_s = (records[-1][0] - records[0][0]) / 1e6 + gap_s
+    encoder = mavlink.MAVLink(None)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        for copy in range(scale):
+            shift_s = copy * span_s
+            for index, (timestamp, packet) in enumerate(records):
+                if copy and index in shiftable:
+                    msg, fields, original = shiftable[index]
+                    for field in fields:
+                        if original[field]:  # 0 means "unknown"; leave it
+                            setattr(msg, field, int(original[field] + shift_s * TIME_FIELDS[field]))
+                    encoder.srcSystem, encoder.srcComponent = msg.get_srcSystem(), msg.get_srcComponent()
+                    encoder.seq = msg.get_seq()
+                    packet = msg.pack(encoder, force_mavlink1=packet[0] == 0xFE)
+                f.write(struct.pack(">Q", timestamp + int(shift_s * 1e6)))
+                f.write(packet)
+    os.replace(tmp, dest)
+    return dest
+
+def synthetic_tlog(scale: int, source: Path = SOURCE_TLOG, data_dir: Path = DATA_DIR) -> Path:
+    """Path of the source log scaled scale times, generated on first use."""
+    if scale == 1:
+        return source
+    dest = data_dir / f"{source.stem}_x{scale}.tlog"
+    if not dest.exists() or dest.stat().st_mtime < source.stat().st_mtime:
+        generate(source, dest, scale)
+    return dest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=10, help="Copies of the source flight")
+    parser.add_argument("--source", type=Path, default=SOURCE_TLOG)
+    parser.add_argument("--output", type=Path, help=f"Output path (default: {DATA_DIR}/<name>_x<scale>.tlog)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dest = args.output or DATA_DIR / f"{args.source.stem}_x{args.scale}.tlog"
+    generate(args.source, dest, args.scale)
+    print(f"Wrote {dest} ({dest.stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
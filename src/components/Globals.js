@@ -71,5 +71,7 @@ export const store = {
     currentTelemetryData: null,
     // File loading state
     dataLoaded: false,
-    currentFileKey: null
+    currentFileKey: null,
+    // Scopes backend websocket events to this tab (sent as X-Session-Id with uploads)
+    sessionId: Math.random().toString(36).slice(2) + Date.now().toString(36)
 }